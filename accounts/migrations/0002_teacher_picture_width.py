@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-16 23:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='teacher',
+            name='picture_width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.0.7 on 2026-10-16 23:20
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def backfill_versions(apps, schema_editor):
+    Model = apps.get_model('accounts', 'Teacher')
+    for instance in Model.objects.exclude(picture='').exclude(picture__isnull=True).iterator():
+        digest = hashlib.sha256()
+        try:
+            for chunk in instance.picture.chunks():
+                digest.update(chunk)
+        except (OSError, ValueError):
+            continue
+        Model.objects.filter(pk=instance.pk).update(picture_version=digest.hexdigest()[:16])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_teacher_picture_width'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='teacher',
+            name='picture_version',
+            field=models.CharField(blank=True, editable=False, max_length=16),
+        ),
+        migrations.RunPython(backfill_versions, migrations.RunPython.noop),
+    ]
@@ -63,6 +63,8 @@ class Teacher(models.Model):
     fullname = models.CharField(max_length=150)
     speciality = models.CharField(max_length=100)
     picture = models.ImageField(upload_to='profile_pics/', null=True, blank=True)
+    picture_width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    picture_version = models.CharField(max_length=16, blank=True, editable=False)
 
     def __str__(self) -> str:
         return self.fullname
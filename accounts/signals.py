@@ -0,0 +1,13 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from courses.images import generate_derivatives_on_commit, track_file_versions
+from .models import Teacher
+
+track_file_versions(Teacher, 'picture')
+
+
+@receiver(post_save, sender=Teacher)
+def generate_teacher_picture_derivatives(sender, instance, raw=False, **kwargs):
+    if not raw:
+        generate_derivatives_on_commit(instance.picture)
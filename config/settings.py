@@ -19,6 +19,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     # 3rd party libs
     'drf_yasg',
     'rest_framework',
@@ -110,6 +111,24 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Upload directories (relative to MEDIA_ROOT) that are only served through the access-checked
+# lesson file view. The front server must not expose them under MEDIA_URL either.
+PROTECTED_MEDIA_DIRS = ('lessons_pdfs/', 'lessons_presentations/')
+
+# Offload protected lesson files to the front server: None, 'nginx' (X-Accel-Redirect) or 'apache' (X-Sendfile).
+# With nginx, PROTECTED_MEDIA_ACCEL_PREFIX must be an internal location aliased to MEDIA_ROOT,
+# and the public media location must deny the protected directories:
+#
+#     location /protected-media/ {
+#         internal;
+#         alias /path/to/media/;
+#     }
+#     location ~ ^/media/(lessons_pdfs|lessons_presentations)/ {
+#         return 404;
+#     }
+PROTECTED_MEDIA_SERVER = None
+PROTECTED_MEDIA_ACCEL_PREFIX = '/protected-media/'
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'accounts.User'
@@ -146,6 +165,74 @@ SIMPLE_JWT = {
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=7),
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'catalog': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',  # For production, use Redis or Memcached
+        'LOCATION': 'catalog',
+    },
+}
+
+# Public course catalog response cache
+CATALOG_CACHE_ALIAS = 'catalog'
+CATALOG_CACHE_TIMEOUT = 60 * 60
+
+# Inlined (base64) image blobs, keyed by content hash
+IMAGE_BASE64_CACHE_ALIAS = 'default'
+IMAGE_BASE64_CACHE_TIMEOUT = 24 * 60 * 60
+
+# Versioned (?v=) media image URLs are immutable; the front server should send the same header for them
+MEDIA_IMAGE_CACHE_MAX_AGE = 365 * 24 * 60 * 60
+
+# Widths of the thumbnails generated for course and teacher images
+IMAGE_DERIVATIVE_WIDTHS = (160, 320, 640)
+
+# Write-behind buffer for lesson progress events, flushed by `manage.py flush_progress_buffer`
+PROGRESS_BUFFER_ENABLED = False
+PROGRESS_BUFFER_PATH = os.path.join(BASE_DIR, 'var', 'progress_buffer.sqlite3')
+PROGRESS_BUFFER_BATCH_SIZE = 1000
+
+CONTRACT_JOB_MAX_ATTEMPTS = 3
+# Seconds before the first retry of a failed contract job; doubles with every further attempt
+CONTRACT_JOB_RETRY_DELAY = 30
+CONTRACT_JOB_STALE_AFTER = 10 * 60
+
+# Warm headless LibreOffice listeners used for DOCX/PPTX -> PDF conversion.
+# Every process (each server worker) starts its own `size` listeners on OS-assigned ports
+# with private profiles; set 'base_port' only if a single process does all conversions.
+# Use courses.converters.FakeConverter where LibreOffice is not installed.
+OFFICE_CONVERTER = {
+    'BACKEND': 'courses.converters.SofficePoolConverter',
+    'OPTIONS': {
+        'size': 2,
+        'soffice': 'soffice',
+        'timeout': 60,
+    },
+}
+
+# Certificate pre-generation: worker count for generate_certificates and the post-submit hook
+CERTIFICATE_WORKERS = 2
+CERTIFICATE_PREGENERATE_ON_SUBMIT = False
+# Seconds after which a certificate claimed by a worker that died may be rendered by another
+CERTIFICATE_CLAIM_STALE_AFTER = 10 * 60
+
+# 'fast' draws certificate text onto a cached background image; 'pptx' converts every certificate
+CERTIFICATE_RENDERER = 'fast'
+CERTIFICATE_RENDER_CACHE_DIR = os.path.join(BASE_DIR, 'var', 'certificates')
+# Resolution of the background exported for the 'fast' renderer; its PDFs are raster images
+CERTIFICATE_RENDER_DPI = 300
+
+# FileFields pointing at content-addressed generated documents; gc_documents keeps what they reference
+GENERATED_DOCUMENT_FIELDS = (
+    'courses.Enrollment.contract_file',
+    'tests.TestEnrollment.certificate_file',
+)
+
+# Minimum trigram similarity for fuzzy title matches in course search
+COURSE_SEARCH_TRIGRAM_THRESHOLD = 0.3
+
 # Channel layers configuration for WebSockets
 CHANNEL_LAYERS = {
     'default': {
@@ -4,9 +4,12 @@ from .models import (
     Module,
     Lesson,
     Enrollment,
+    ContractJob,
     StudentCourseHistory,
     StudentLessonProgress,
+    StudentModuleProgress,
     ChatMessage,
+    StoredDocument,
 )
 
 
@@ -42,6 +45,14 @@ class EnrollmentAdmin(admin.ModelAdmin):
     ordering = ('-started_date',)
 
 
+@admin.register(ContractJob)
+class ContractJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'enrollment', 'status', 'attempts', 'available_at', 'created_at', 'finished_at')
+    search_fields = ('enrollment__user__username', 'enrollment__course__title')
+    list_filter = ('status',)
+    readonly_fields = ('attempts', 'started_at', 'finished_at')
+
+
 @admin.register(StudentCourseHistory)
 class StudentCourseHistoryAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'course', 'total_score', 'completed')
@@ -58,9 +69,24 @@ class StudentLessonProgressAdmin(admin.ModelAdmin):
     ordering = ('-student',)
 
 
+@admin.register(StudentModuleProgress)
+class StudentModuleProgressAdmin(admin.ModelAdmin):
+    list_display = ('id', 'student', 'module', 'course', 'completed_lessons', 'completed', 'completed_date')
+    search_fields = ('student__username', 'module__title', 'course__title')
+    list_filter = ('course', 'completed')
+    readonly_fields = ('completed_lessons', 'completed', 'completed_date')
+
+
 @admin.register(ChatMessage)
 class ChatMessageAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'module', 'message', 'date', 'type')
     search_fields = ('user__username', 'message')
     list_filter = ('module', 'type', 'date')
     ordering = ('-date',)
+
+
+@admin.register(StoredDocument)
+class StoredDocumentAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'size', 'created_at', 'last_stored_at')
+    search_fields = ('digest', 'name')
+    readonly_fields = ('digest', 'name', 'size', 'created_at', 'last_stored_at')
@@ -0,0 +1,126 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from rest_framework import status
+from rest_framework.response import Response
+
+CATALOG_VERSION_KEY = 'catalog:version'
+
+
+def get_catalog_cache():
+    return caches[getattr(settings, 'CATALOG_CACHE_ALIAS', 'default')]
+
+
+def get_catalog_version():
+    cache = get_catalog_cache()
+    cache.add(CATALOG_VERSION_KEY, 1, timeout=None)
+    return cache.get(CATALOG_VERSION_KEY, 1)
+
+
+def bump_catalog_version():
+    """
+    Invalidate every cached catalog response at once by moving to a new version.
+    """
+    cache = get_catalog_cache()
+    cache.add(CATALOG_VERSION_KEY, 1, timeout=None)
+    try:
+        return cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        # The key was evicted between add() and incr()
+        cache.set(CATALOG_VERSION_KEY, 1, timeout=None)
+        return 1
+
+
+def catalog_cache_key(*parts):
+    return ':'.join(['catalog', f'v{get_catalog_version()}', *map(str, parts)])
+
+
+class CatalogCacheMixin:
+    """
+    Cache successful GET responses of catalog views under the current catalog version.
+    """
+    catalog_cache_prefix = None
+
+    def get_catalog_cache_key(self, request):
+        prefix = self.catalog_cache_prefix or self.__class__.__name__
+        return catalog_cache_key(prefix, request.build_absolute_uri())
+
+    def get_cached_response(self, request, render):
+        cache = get_catalog_cache()
+        key = self.get_catalog_cache_key(request)
+
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+
+        response = render()
+        if response.status_code == status.HTTP_200_OK:
+            timeout = getattr(settings, 'CATALOG_CACHE_TIMEOUT', 60 * 60)
+            cache.set(key, response.data, timeout)
+        return response
+
+    def get_conditional_state(self):
+        """
+        Memoize the conditional GET validators when combined with ConditionalGetMixin.
+        """
+        cache = get_catalog_cache()
+        key = self.get_catalog_cache_key(self.request) + ':conditional'
+        state = cache.get(key)
+        if state is None:
+            state = super().get_conditional_state()
+            cache.set(key, state, getattr(settings, 'CATALOG_CACHE_TIMEOUT', 60 * 60))
+        return state
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(request, lambda: super(CatalogCacheMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(request, lambda: super(CatalogCacheMixin, self).retrieve(request, *args, **kwargs))
+
+
+class ConditionalGetMixin:
+    """
+    ETag / Last-Modified support for views over models with an ``updated_at`` field.
+    Unchanged resources are answered with 304 before any serialization happens.
+    """
+    modified_field = 'updated_at'
+
+    def get_conditional_state(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = getattr(self, 'lookup_url_kwarg', None) or getattr(self, 'lookup_field', None)
+
+        if lookup_url_kwarg and lookup_url_kwarg in self.kwargs:
+            last_modified = queryset.filter(
+                **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+            ).values_list(self.modified_field, flat=True).first()
+            if last_modified is None:
+                return None, None
+            version = last_modified.isoformat()
+        else:
+            state = queryset.aggregate(last_modified=Max(self.modified_field), count=Count('pk'))
+            last_modified = state['last_modified']
+            version = f"{state['count']}:{last_modified.isoformat() if last_modified else ''}"
+
+        digest = hashlib.md5(f'{self.request.build_absolute_uri()}:{version}'.encode()).hexdigest()
+        return f'"{digest}"', int(last_modified.timestamp()) if last_modified else None
+
+    def get(self, request, *args, **kwargs):
+        etag, last_modified = self.get_conditional_state()
+        if etag is None:
+            return super().get(request, *args, **kwargs)
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, no_cache=True)
+        return response
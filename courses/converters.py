@@ -0,0 +1,354 @@
+import atexit
+import hashlib
+import os
+import queue
+import shutil
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from contextlib import closing
+from io import BytesIO
+from pathlib import Path
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from PIL import Image
+
+DEFAULT_OFFICE_CONVERTER = {
+    'BACKEND': 'courses.converters.SofficePoolConverter',
+    'OPTIONS': {},
+}
+
+DOCUMENT_FAMILIES = {
+    '.doc': 'writer',
+    '.docx': 'writer',
+    '.odt': 'writer',
+    '.ppt': 'impress',
+    '.pptx': 'impress',
+    '.odp': 'impress',
+}
+
+# (document family, target extension) -> LibreOffice export filter
+EXPORT_FILTERS = {
+    ('writer', '.pdf'): 'writer_pdf_Export',
+    ('impress', '.pdf'): 'impress_pdf_Export',
+    ('impress', '.png'): 'impress_png_Export',
+}
+
+_converter = None
+_converter_pid = None
+_converter_lock = threading.Lock()
+
+
+class ConversionError(RuntimeError):
+    pass
+
+
+def get_converter():
+    """
+    Process-wide converter built from settings.OFFICE_CONVERTER, created on first use.
+    A forked child builds its own instead of sharing the parent's soffice processes.
+    """
+    global _converter, _converter_pid
+    if _converter is None or _converter_pid != os.getpid():
+        with _converter_lock:
+            if _converter is None or _converter_pid != os.getpid():
+                config = getattr(settings, 'OFFICE_CONVERTER', DEFAULT_OFFICE_CONVERTER)
+                _converter = import_string(config['BACKEND'])(**config.get('OPTIONS', {}))
+                _converter_pid = os.getpid()
+    return _converter
+
+
+def reset_converter():
+    global _converter
+    with _converter_lock:
+        # Only the process that started the converter may stop it
+        if _converter is not None and _converter_pid == os.getpid():
+            _converter.close()
+        _converter = None
+
+
+atexit.register(reset_converter)
+
+
+@receiver(setting_changed)
+def reset_converter_on_setting_change(sender, setting, **kwargs):
+    if setting == 'OFFICE_CONVERTER':
+        reset_converter()
+
+
+def _free_port(host):
+    with closing(socket.socket(socket.AF_INET, socket.SOCK_STREAM)) as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+
+def _export_filter(source_path, target_path):
+    source_extension = os.path.splitext(source_path)[1].lower()
+    target_extension = os.path.splitext(target_path)[1].lower()
+    try:
+        return EXPORT_FILTERS[DOCUMENT_FAMILIES.get(source_extension), target_extension]
+    except KeyError:
+        raise ConversionError(
+            f"Don't know how to convert {source_extension or 'extensionless'} files "
+            f"to {target_extension or 'that format'}."
+        )
+
+
+def convert_stream_to_pdf(stream, filename):
+    """
+    Convert an in-memory office document to PDF and return the PDF as a BytesIO.
+
+    Every call works in its own temporary directory, so concurrent jobs never share
+    input, output or LibreOffice lock files, and the directory is removed afterwards.
+    """
+    with tempfile.TemporaryDirectory(prefix='render-') as workspace:
+        source_path = os.path.join(workspace, filename)
+        target_path = os.path.join(workspace, os.path.splitext(filename)[0] + '.pdf')
+        with open(source_path, 'wb') as f:
+            shutil.copyfileobj(stream, f)
+
+        get_converter().convert(source_path, target_path)
+
+        with open(target_path, 'rb') as f:
+            return BytesIO(f.read())
+
+
+class BaseConverter:
+    def convert(self, source_path, target_path, filter_data=None):
+        """
+        Convert the office document at ``source_path`` into ``target_path``; the target's
+        extension selects the format (PDF, or PNG of the first slide of a presentation).
+        ``filter_data`` holds export filter options, e.g. {'PixelWidth': ..., 'PixelHeight': ...} for PNG.
+        Raises ConversionError on failure.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class FakeConverter(BaseConverter):
+    """
+    Writes a small deterministic PDF instead of converting, for tests and machines without LibreOffice.
+    """
+
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.conversions = []
+        self._lock = threading.Lock()
+
+    def convert(self, source_path, target_path, filter_data=None):
+        export_filter = _export_filter(source_path, target_path)
+        with open(source_path, 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        if self.delay:
+            time.sleep(self.delay)
+        if export_filter.endswith('_png_Export'):
+            # LibreOffice's own default is screen resolution; only FilterData makes it sharper
+            filter_data = filter_data or {}
+            size = (filter_data.get('PixelWidth', 1600), filter_data.get('PixelHeight', 900))
+            Image.new('RGB', size, 'white').save(target_path, 'PNG')
+        else:
+            with open(target_path, 'wb') as f:
+                f.write(b'%PDF-1.4\n% fake conversion of ' + digest.encode() + b'\n%%EOF\n')
+        with self._lock:
+            self.conversions.append((os.path.basename(source_path), digest))
+
+
+class SofficeListener:
+    """
+    One headless LibreOffice process accepting UNO connections on its own port and profile.
+
+    With ``port=None`` the OS picks a free port on every start, so listeners in different
+    processes never share a port.
+    """
+
+    def __init__(self, soffice, host, port, profile_dir, startup_timeout):
+        self.soffice = soffice
+        self.host = host
+        self.fixed_port = port
+        self.port = port
+        self.profile_dir = profile_dir
+        self.startup_timeout = startup_timeout
+        self.process = None
+        self.desktop = None
+
+    def start(self):
+        self.desktop = None
+        self.port = self.fixed_port or _free_port(self.host)
+        self.process = subprocess.Popen(
+            [
+                self.soffice, '--headless', '--invisible', '--nologo', '--nodefault', '--norestore', '--nolockcheck',
+                f'-env:UserInstallation={Path(self.profile_dir).resolve().as_uri()}',
+                f'--accept=socket,host={self.host},port={self.port};urp;StarOffice.ComponentContext',
+            ],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def stop(self):
+        self.desktop = None
+        if self.process is None:
+            return
+        if self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        self.process = None
+
+    def restart(self):
+        self.stop()
+        self.start()
+
+    def ensure_running(self):
+        if not self.alive():
+            self.restart()
+        if self.desktop is None:
+            self.desktop = self._connect()
+
+    def _connect(self):
+        # The UNO bindings ship with LibreOffice rather than on PyPI
+        import uno
+        from com.sun.star.connection import NoConnectException
+
+        local_context = uno.getComponentContext()
+        resolver = local_context.ServiceManager.createInstanceWithContext(
+            'com.sun.star.bridge.UnoUrlResolver', local_context
+        )
+        deadline = time.monotonic() + self.startup_timeout
+        while True:
+            try:
+                context = resolver.resolve(
+                    f'uno:socket,host={self.host},port={self.port};urp;StarOffice.ComponentContext'
+                )
+                break
+            except NoConnectException:
+                if time.monotonic() > deadline or not self.alive():
+                    raise ConversionError(f"soffice on port {self.port} did not start accepting connections.")
+                time.sleep(0.1)
+        return context.ServiceManager.createInstanceWithContext('com.sun.star.frame.Desktop', context)
+
+    @staticmethod
+    def _properties(**values):
+        from com.sun.star.beans import PropertyValue
+
+        properties = []
+        for name, value in values.items():
+            prop = PropertyValue()
+            prop.Name = name
+            prop.Value = value
+            properties.append(prop)
+        return tuple(properties)
+
+    def convert(self, source_path, target_path, filter_data=None):
+        import uno
+
+        document = self.desktop.loadComponentFromURL(
+            uno.systemPathToFileUrl(os.path.abspath(source_path)), '_blank', 0, self._properties(Hidden=True)
+        )
+        if document is None:
+            raise ConversionError(f"soffice could not open {os.path.basename(source_path)}.")
+        store_properties = {'FilterName': _export_filter(source_path, target_path)}
+        if filter_data:
+            store_properties['FilterData'] = uno.Any(
+                '[]com.sun.star.beans.PropertyValue', self._properties(**filter_data)
+            )
+        try:
+            document.storeToURL(
+                uno.systemPathToFileUrl(os.path.abspath(target_path)), self._properties(**store_properties)
+            )
+        finally:
+            document.close(True)
+
+
+class SofficePoolConverter(BaseConverter):
+    """
+    Keeps ``size`` warm soffice listeners and hands each conversion to an idle one.
+
+    A listener whose process died is restarted before use; a conversion that runs past
+    ``timeout`` seconds gets its listener killed and restarted, and raises ConversionError.
+
+    Every pool owns its soffice processes: each listener gets a fresh profile directory
+    under ``profile_root`` and, unless ``base_port`` is set, a port picked by the OS.
+    Only set ``base_port`` when a single process uses the converter.
+    """
+    listener_class = SofficeListener
+
+    def __init__(self, size=2, soffice='soffice', host='127.0.0.1', base_port=None, timeout=60,
+                 startup_timeout=30, profile_root=None):
+        self.timeout = timeout
+        profile_root = profile_root or os.path.join(tempfile.gettempdir(), 'soffice-profiles')
+        os.makedirs(profile_root, exist_ok=True)
+        # A second soffice on the same profile hands its work to the first one and exits
+        self._profile_dirs = [
+            tempfile.mkdtemp(prefix=f'{os.getpid()}-{i}-', dir=profile_root) for i in range(size)
+        ]
+        self._listeners = [
+            self.listener_class(
+                soffice, host, base_port + i if base_port else None, profile_dir, startup_timeout
+            )
+            for i, profile_dir in enumerate(self._profile_dirs)
+        ]
+        self._idle = queue.Queue()
+        for listener in self._listeners:
+            listener.start()
+            self._idle.put(listener)
+
+    def convert(self, source_path, target_path, filter_data=None):
+        _export_filter(source_path, target_path)
+        try:
+            listener = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise ConversionError("No office converter became available in time.")
+
+        try:
+            self._convert_with_timeout(listener, source_path, target_path, filter_data)
+        finally:
+            self._idle.put(listener)
+
+    def _convert_with_timeout(self, listener, source_path, target_path, filter_data=None):
+        outcome = {}
+
+        def work():
+            try:
+                listener.ensure_running()
+                listener.convert(source_path, target_path, filter_data)
+            except Exception as e:
+                outcome['error'] = e
+
+        worker = threading.Thread(target=work, daemon=True)
+        worker.start()
+        worker.join(self.timeout)
+
+        if worker.is_alive():
+            # Killing the process also unblocks the stuck UNO call in the worker thread
+            listener.restart()
+            raise ConversionError(f"Conversion of {os.path.basename(source_path)} timed out.")
+
+        error = outcome.get('error')
+        if error is not None:
+            if not listener.alive():
+                listener.restart()
+            else:
+                # The bridge may be broken even though the process survived
+                listener.desktop = None
+            if isinstance(error, ConversionError):
+                raise error
+            raise ConversionError(f"Error converting {os.path.basename(source_path)} to PDF: {error}") from error
+
+    def close(self):
+        for listener in self._listeners:
+            listener.stop()
+        for profile_dir in self._profile_dirs:
+            shutil.rmtree(profile_dir, ignore_errors=True)
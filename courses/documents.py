@@ -0,0 +1,137 @@
+import hashlib
+import re
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+from .models import StoredDocument
+
+DOCUMENTS_DIR = 'documents'
+
+# Parts of a PDF that differ on every render of the same document
+PDF_DATE = re.compile(rb'(/(?:CreationDate|ModDate)\s*)\((D:[^)]*)\)')
+PDF_ID = re.compile(rb'/ID\s*\[\s*<[0-9A-Fa-f]*>\s*<[0-9A-Fa-f]*>\s*\]')
+XMP_VOLATILE = re.compile(
+    rb'(<(xmp:CreateDate|xmp:ModifyDate|xmp:MetadataDate|xmpMM:DocumentID|xmpMM:InstanceID)>)([^<]*)(</\2>)'
+)
+FIXED_PDF_DATE = b'D:19700101000000Z'
+
+DEFAULT_GENERATED_DOCUMENT_FIELDS = (
+    'courses.Enrollment.contract_file',
+    'tests.TestEnrollment.certificate_file',
+)
+
+
+def document_name(digest, extension):
+    # Fan out by hash prefix so no single directory grows unbounded
+    return f'{DOCUMENTS_DIR}/{digest[:2]}/{digest}{extension}'
+
+
+def _fixed_pdf_date(match):
+    date = match.group(2)
+    fixed = FIXED_PDF_DATE[:len(date)]
+    # Pad outside the string so every byte offset in the xref table stays valid
+    return match.group(1) + b'(' + fixed + b')' + b' ' * (len(date) - len(fixed))
+
+
+def _zeroed_pdf_id(match):
+    return re.sub(rb'<([0-9A-Fa-f]*)>', lambda m: b'<' + b'0' * len(m.group(1)) + b'>', match.group(0))
+
+
+def _zeroed_xmp_value(match):
+    return match.group(1) + re.sub(rb'[0-9A-Za-z]', b'0', match.group(3)) + match.group(4)
+
+
+def normalize_pdf(content):
+    """
+    Replace the creation/modification dates and the file identifiers in ``content`` with
+    fixed values of the same length, so two renders of the same document hash alike.
+    """
+    content = PDF_DATE.sub(_fixed_pdf_date, content)
+    content = PDF_ID.sub(_zeroed_pdf_id, content)
+    return XMP_VOLATILE.sub(_zeroed_xmp_value, content)
+
+
+def _reference_fields():
+    for path in getattr(settings, 'GENERATED_DOCUMENT_FIELDS', DEFAULT_GENERATED_DOCUMENT_FIELDS):
+        app_label, model_name, field_name = path.split('.')
+        yield apps.get_model(app_label, model_name), field_name
+
+
+def store_document(content, extension='.pdf'):
+    """
+    Store ``content`` (bytes) under a name derived from its SHA-256 and return that name.
+    Identical content is written only once; PDFs are normalized first, so renders that
+    differ only in their timestamps count as identical.
+    """
+    if extension == '.pdf':
+        content = normalize_pdf(content)
+    digest = hashlib.sha256(content).hexdigest()
+    name = document_name(digest, extension)
+    if not default_storage.exists(name):
+        saved_name = default_storage.save(name, ContentFile(content))
+        if saved_name != name:
+            # Another worker stored the same bytes in the meantime
+            default_storage.delete(saved_name)
+
+    # Refreshes last_stored_at so the collector won't take a file that is about to be referenced again
+    StoredDocument.objects.update_or_create(digest=digest, defaults={'name': name, 'size': len(content)})
+    return name
+
+
+def attach_document(instance, field_name, content, extension='.pdf'):
+    """
+    Point ``instance.<field_name>`` at the stored copy of ``content`` and save just that field.
+    """
+    name = store_document(content, extension)
+    setattr(instance, field_name, name)
+    instance.save(update_fields=[field_name])
+    return name
+
+
+def referenced_names():
+    names = set()
+    for model, field_name in _reference_fields():
+        names.update(
+            model.objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+            .values_list(field_name, flat=True)
+        )
+    return names
+
+
+def _stored_files():
+    if not default_storage.exists(DOCUMENTS_DIR):
+        return
+    for directory in default_storage.listdir(DOCUMENTS_DIR)[0]:
+        for filename in default_storage.listdir(f'{DOCUMENTS_DIR}/{directory}')[1]:
+            yield f'{DOCUMENTS_DIR}/{directory}/{filename}'
+
+
+def collect_garbage(grace=timedelta(days=1), dry_run=False):
+    """
+    Delete stored documents that no row references any more. Anything stored within
+    ``grace`` is kept, since a row may be about to point at it. Returns the deleted names.
+    """
+    cutoff = timezone.now() - grace
+    live = referenced_names()
+    recorded = dict(StoredDocument.objects.values_list('name', 'last_stored_at'))
+
+    garbage = []
+    for name in _stored_files():
+        if name in live:
+            continue
+        # A worker that died between writing the file and recording it leaves no row; use the file's age
+        stored_at = recorded.get(name) or default_storage.get_modified_time(name)
+        if stored_at < cutoff:
+            garbage.append(name)
+
+    if not dry_run:
+        for name in garbage:
+            default_storage.delete(name)
+        stale = [name for name, stored_at in recorded.items() if name not in live and stored_at < cutoff]
+        StoredDocument.objects.filter(name__in=stale).delete()
+    return garbage
@@ -0,0 +1,210 @@
+import hashlib
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import DEFERRED
+from django.db.models.signals import post_init, post_save, pre_save
+from PIL import ExifTags, Image, ImageOps
+
+DEFAULT_IMAGE_DERIVATIVE_WIDTHS = (160, 320, 640)
+
+FORMAT_EXTENSIONS = {
+    'JPEG': 'jpg',
+    'PNG': 'png',
+    'WEBP': 'webp',
+}
+
+
+def get_derivative_widths():
+    return tuple(getattr(settings, 'IMAGE_DERIVATIVE_WIDTHS', DEFAULT_IMAGE_DERIVATIVE_WIDTHS))
+
+
+def _fallback_format(name):
+    return 'PNG' if os.path.splitext(name)[1].lower() == '.png' else 'JPEG'
+
+
+def derivative_name(name, width, image_format):
+    """
+    course_images/cover.jpg -> course_images/derivatives/cover_jpg_320w.webp
+
+    The source extension is kept so that cover.jpg and cover.png never share derivatives.
+    """
+    directory, filename = os.path.split(name)
+    stem, extension = os.path.splitext(filename)
+    if extension:
+        stem = f'{stem}_{extension[1:].lower()}'
+    return os.path.join(directory, 'derivatives', f'{stem}_{width}w.{FORMAT_EXTENSIONS[image_format]}').replace('\\', '/')
+
+
+def derivative_names(name, source_width=None):
+    """
+    Map every derivative format to {width: storage name}, without touching storage.
+    With ``source_width``, widths the source is too narrow for are left out (images are never upscaled).
+    """
+    fallback = _fallback_format(name)
+    widths = [width for width in get_derivative_widths() if source_width is None or width <= source_width]
+    return {
+        image_format: {width: derivative_name(name, width, image_format) for width in widths}
+        for image_format in (fallback, 'WEBP')
+    }
+
+
+def _encode(image, image_format):
+    if image_format == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    elif image.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+        image = image.convert('RGBA')
+
+    buffer = BytesIO()
+    if image_format == 'JPEG':
+        image.save(buffer, image_format, quality=85, optimize=True, progressive=True)
+    elif image_format == 'WEBP':
+        image.save(buffer, image_format, quality=80, method=4)
+    else:
+        image.save(buffer, image_format, optimize=True)
+    return buffer.getvalue()
+
+
+def width_field_name(field_file):
+    """
+    Name of the model field recording the displayed width of ``field_file`` (``image`` -> ``image_width``).
+    """
+    return f'{field_file.field.name}_width'
+
+
+def stored_width(field_file):
+    """
+    Source width recorded on the row, or None while its derivatives have not been generated.
+    """
+    return getattr(field_file.instance, width_field_name(field_file), None)
+
+
+def _record_width(field_file, width):
+    instance = field_file.instance
+    name = width_field_name(field_file)
+    if not hasattr(instance, name) or getattr(instance, name) == width:
+        return
+    # Only if the row still holds this file; a newer upload records its own width
+    type(instance)._default_manager.filter(pk=instance.pk, **{field_file.field.name: field_file.name}).update(
+        **{name: width}
+    )
+    setattr(instance, name, width)
+
+
+def generate_derivatives(field_file, overwrite=False):
+    """
+    Write fixed-width thumbnails in the original format and in WebP next to the uploaded image,
+    then record the source width on the row. Returns the storage names that were written.
+    """
+    if not field_file:
+        return []
+
+    storage = field_file.storage
+    with field_file.open('rb') as image_file:
+        # Only the header is read until we know some derivative is missing
+        source = Image.open(image_file)
+        width = _oriented_width(source)
+        pending = [
+            (image_format, derivative_width, name)
+            for image_format, names in derivative_names(field_file.name, width).items()
+            for derivative_width, name in names.items()
+            if overwrite or not storage.exists(name)
+        ]
+        if pending:
+            source.load()
+
+    written = []
+    if pending:
+        source = ImageOps.exif_transpose(source)
+        for image_format, derivative_width, name in pending:
+            image = source.copy()
+            if image.width > derivative_width:
+                image = image.resize(
+                    (derivative_width, max(1, round(image.height * derivative_width / image.width))), Image.LANCZOS
+                )
+            if storage.exists(name):
+                storage.delete(name)
+            written.append(storage.save(name, ContentFile(_encode(image, image_format))))
+    _record_width(field_file, width)
+    return written
+
+
+def generate_derivatives_on_commit(field_file):
+    """
+    Generate derivatives once the row holding ``field_file`` is committed. Unreadable uploads
+    are reported instead of failing the request; the backfill command can retry them.
+    """
+    if not field_file:
+        return
+
+    def generate():
+        try:
+            generate_derivatives(field_file)
+        except (OSError, ValueError) as e:
+            print(f"Error generating derivatives for {field_file.name}: {str(e)}")
+
+    transaction.on_commit(generate)
+
+
+def _oriented_width(image):
+    # EXIF orientations 5-8 rotate the image by 90 degrees, swapping width and height
+    orientation = image.getexif().get(ExifTags.Base.Orientation, 1)
+    return image.height if orientation in (5, 6, 7, 8) else image.width
+
+
+def file_version(field_file):
+    """
+    Short SHA-256 of the file's content for cache-busting ``?v=`` URLs, or '' if it cannot be read.
+    """
+    digest = hashlib.sha256()
+    try:
+        for chunk in field_file.chunks():
+            digest.update(chunk)
+    except (OSError, ValueError):
+        return ''
+    return digest.hexdigest()[:16]
+
+
+def track_file_versions(model, field_name):
+    """
+    Keep ``<field_name>_version`` on ``model`` in step with the file in ``field_name``.
+    The content is hashed when a save changes the file, so serializers never touch storage for it.
+    """
+    version_name = f'{field_name}_version'
+
+    def remember_name(sender, instance, **kwargs):
+        instance.__dict__.setdefault('_stored_file_names', {})[field_name] = instance.__dict__.get(field_name, DEFERRED)
+
+    def update_version(sender, instance, raw=False, **kwargs):
+        field_file = getattr(instance, field_name)
+        previous = instance._stored_file_names.get(field_name)
+        if raw or previous is DEFERRED:
+            return
+        if not field_file:
+            setattr(instance, version_name, '')
+        elif field_file.name != previous or not getattr(instance, version_name):
+            setattr(instance, version_name, file_version(field_file))
+
+    def forget_name(sender, instance, **kwargs):
+        instance._stored_file_names[field_name] = getattr(instance, field_name).name
+
+    uid = f'{model._meta.label}.{field_name}_version'
+    post_init.connect(remember_name, sender=model, weak=False, dispatch_uid=uid)
+    pre_save.connect(update_version, sender=model, weak=False, dispatch_uid=uid)
+    post_save.connect(forget_name, sender=model, weak=False, dispatch_uid=uid)
+
+
+def image_srcset(field_file, build_url):
+    """
+    srcset-style map of derivative URLs keyed by width descriptor, per format, built from the
+    width stored on the row without touching storage. Empty until the derivatives exist.
+    """
+    names = derivative_names(field_file.name, stored_width(field_file) or 0)
+    fallback = _fallback_format(field_file.name)
+    return {
+        'srcset': {f'{width}w': build_url(name) for width, name in names[fallback].items()},
+        'webp': {f'{width}w': build_url(name) for width, name in names['WEBP'].items()},
+    }
@@ -0,0 +1,72 @@
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from courses.models import ChatMessage, Course, Module
+
+
+class RollbackBenchmark(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Compare OFFSET and keyset pagination of module chat history at increasing depths (data is rolled back)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=50000)
+        parser.add_argument('--page-size', type=int, default=10)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._run(options['messages'], options['page_size'], options['repeat'])
+                raise RollbackBenchmark
+        except RollbackBenchmark:
+            pass
+
+    def _run(self, total, page_size, repeat):
+        User = get_user_model()
+        user = User.objects.create_user(username='benchmark-chat-user', email='benchmark-chat@example.com')
+        course = Course.objects.create(
+            title='Benchmark chat course', description='', short_description='', price=0, teacher=user
+        )
+        module = Module.objects.create(course=course, title='Benchmark chat module')
+
+        start = timezone.now()
+        messages = ChatMessage.objects.bulk_create(
+            [ChatMessage(module=module, user=user, message=f'message {i}', type=1) for i in range(total)],
+            batch_size=1000,
+        )
+        # auto_now_add stamps every row with the same time; spread them out like a real history
+        for index, message in enumerate(messages):
+            message.date = start + timedelta(seconds=index)
+        ChatMessage.objects.bulk_update(messages, ['date'], batch_size=1000)
+
+        queryset = ChatMessage.objects.filter(module=module, user=user).order_by('date', 'id')
+        self.stdout.write(f"{'depth':>10} {'offset ms':>12} {'keyset ms':>12}")
+
+        for depth in (0, total // 4, total // 2, total - page_size):
+            anchor = start + timedelta(seconds=depth - 1)
+
+            def offset_page():
+                queryset.count()
+                return list(queryset[depth:depth + page_size])
+
+            def keyset_page():
+                return list(queryset.filter(date__gt=anchor)[:page_size + 1])
+
+            self.stdout.write(
+                f"{depth:>10} {self._time(offset_page, repeat):>12.3f} {self._time(keyset_page, repeat):>12.3f}"
+            )
+
+    @staticmethod
+    def _time(func, repeat):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        return (time.perf_counter() - started) * 1000 / repeat
@@ -0,0 +1,62 @@
+import time
+from datetime import datetime
+from io import BytesIO
+
+from django.core.management.base import BaseCommand
+from docxtpl import DocxTemplate
+from pptx import Presentation
+
+from courses.template_registry import TemplateRegistry, template_registry
+from tests.services import CertificateService
+
+CONTRACT_TEMPLATE = 'courses/templates/contract.docx'
+
+
+class Command(BaseCommand):
+    help = "Compare template renders that load the file from disk every time with renders from the template registry."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        context = {
+            'contract_id': 1, 'day': datetime.now().day, 'month': datetime.now().strftime('%B'),
+            'student_name': 'benchmark', 'course_price': 100,
+        }
+        templates = [
+            ('contract.docx', CONTRACT_TEMPLATE, DocxTemplate, lambda doc: doc.render(context)),
+            ('certificate.pptx', CertificateService.TEMPLATE_PATH, Presentation, lambda prs: None),
+        ]
+
+        self.stdout.write(f"{'template':>18} {'cold ms':>10} {'warm ms':>10}")
+        for label, path, load, render in templates:
+            try:
+                resolved = template_registry.get(path).path
+            except FileNotFoundError:
+                self.stdout.write(f"{label:>18} {'missing':>10}")
+                continue
+
+            def cold():
+                # What every render used to do: read and parse the file from disk
+                self._render(load(resolved), render)
+
+            registry = TemplateRegistry()
+            clone = registry.docx if load is DocxTemplate else registry.presentation
+
+            def warm():
+                self._render(clone(path), render)
+
+            self.stdout.write(f"{label:>18} {self._time(cold, repeat):>10.3f} {self._time(warm, repeat):>10.3f}")
+
+    @staticmethod
+    def _render(document, render):
+        render(document)
+        document.save(BytesIO())
+
+    @staticmethod
+    def _time(func, repeat):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        return (time.perf_counter() - started) * 1000 / repeat
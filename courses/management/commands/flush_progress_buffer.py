@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from courses.progress_buffer import ProgressEventBuffer
+
+
+class Command(BaseCommand):
+    help = "Apply buffered lesson progress events to the database in coalesced batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--loop', action='store_true', help="Keep flushing until interrupted.")
+        parser.add_argument('--interval', type=float, default=1.0, help="Seconds to sleep when the buffer is empty.")
+
+    def handle(self, *args, **options):
+        buffer = ProgressEventBuffer()
+        while True:
+            flushed = buffer.drain(options['batch_size'])
+            if flushed:
+                self.stdout.write(f"Flushed {flushed} progress events.")
+                if failed := buffer.failed():
+                    self.stderr.write(f"{failed} rejected progress events are kept in progress_events_failed.")
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
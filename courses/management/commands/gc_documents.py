@@ -0,0 +1,22 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from courses.documents import collect_garbage
+
+
+class Command(BaseCommand):
+    help = "Delete generated documents (contracts, certificates) that no row references."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace-hours', type=float, default=24, help="Keep documents stored more recently than this."
+        )
+        parser.add_argument('--dry-run', action='store_true', help="Only list what would be deleted.")
+
+    def handle(self, *args, **options):
+        garbage = collect_garbage(grace=timedelta(hours=options['grace_hours']), dry_run=options['dry_run'])
+        for name in garbage:
+            self.stdout.write(name)
+        verb = "Would delete" if options['dry_run'] else "Deleted"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {len(garbage)} unreferenced documents."))
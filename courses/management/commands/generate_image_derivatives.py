@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from accounts.models import Teacher
+from courses.images import generate_derivatives
+from courses.models import Course
+
+
+class Command(BaseCommand):
+    help = "Generate missing thumbnails and WebP variants for course images and teacher pictures."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--overwrite', action='store_true', help="Regenerate derivatives that already exist.")
+
+    def handle(self, *args, **options):
+        sources = (
+            (Course.objects.exclude(image='').exclude(image__isnull=True).only('id', 'image'), 'image'),
+            (Teacher.objects.exclude(picture='').exclude(picture__isnull=True).only('id', 'picture'), 'picture'),
+        )
+
+        written = 0
+        for queryset, field in sources:
+            for instance in queryset.iterator():
+                try:
+                    written += len(generate_derivatives(getattr(instance, field), overwrite=options['overwrite']))
+                except (OSError, ValueError) as e:
+                    self.stderr.write(f"{queryset.model.__name__} {instance.pk}: {e}")
+
+        self.stdout.write(self.style.SUCCESS(f"Generated {written} image derivatives."))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from courses.services import CompletionRollupService
+
+
+class Command(BaseCommand):
+    help = "Recompute per-student module and course completion from lesson progress."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--course', type=int, action='append', dest='courses', help="Only rebuild this course (repeatable)."
+        )
+
+    def handle(self, *args, **options):
+        modules, courses = CompletionRollupService.rebuild(course_ids=options['courses'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {modules} module progress rows; {courses} completed student courses."
+        ))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from courses.services import StatsService
+
+
+class Command(BaseCommand):
+    help = "Recompute the platform counters behind the stats endpoint and fix any drift."
+
+    def handle(self, *args, **options):
+        drift = StatsService.recount()
+        if not drift:
+            self.stdout.write(self.style.SUCCESS("Counters are in sync."))
+            return
+        for name, delta in drift.items():
+            self.stdout.write(f"{name}: corrected by {delta:+d}")
+        self.stdout.write(self.style.SUCCESS("Counters reconciled."))
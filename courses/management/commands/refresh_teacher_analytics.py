@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from courses.services import TeacherAnalyticsService
+
+
+class Command(BaseCommand):
+    help = "Snapshot today's course funnel and module completion aggregates for the teacher dashboard."
+
+    def handle(self, *args, **options):
+        courses = TeacherAnalyticsService.refresh()
+        self.stdout.write(self.style.SUCCESS(f"Refreshed analytics for {courses} courses."))
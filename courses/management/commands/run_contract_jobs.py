@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from courses.services import ContractJobService
+
+
+class Command(BaseCommand):
+    help = "Generate enrollment contracts queued by course registration."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=None, help="Stop after this many jobs.")
+        parser.add_argument('--loop', action='store_true', help="Keep polling until interrupted.")
+        parser.add_argument('--interval', type=float, default=1.0, help="Seconds to sleep when the queue is empty.")
+
+    def handle(self, *args, **options):
+        while True:
+            for job in ContractJobService.run_pending(options['limit']):
+                self.stdout.write(f"Contract job {job.id}: {job.status}")
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
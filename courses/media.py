@@ -0,0 +1,129 @@
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import patch_cache_control
+from django.utils.http import http_date
+from django.views import static
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range_header(header, size):
+    """
+    Parse a single ``bytes=`` range into inclusive (start, end) offsets.
+    Returns None when the header should be ignored and the whole file served.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match or not any(match.groups()):
+        return None
+
+    start, end = match.groups()
+    if not start:
+        suffix = int(end)
+        if suffix == 0:
+            raise RangeNotSatisfiable
+        return max(size - suffix, 0), size - 1
+
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size:
+        raise RangeNotSatisfiable
+    if end < start:
+        return None
+    return start, end
+
+
+def _stream(field_file, start, length):
+    with field_file.open('rb') as f:
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(STREAM_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _offloaded_response(field_file, server):
+    response = HttpResponse()
+    if server == 'nginx':
+        prefix = getattr(settings, 'PROTECTED_MEDIA_ACCEL_PREFIX', '/protected-media/')
+        response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + field_file.name.lstrip('/')
+    else:
+        response['X-Sendfile'] = field_file.path
+    # Let the front server fill these in from the file itself
+    del response['Content-Type']
+    return response
+
+
+def serve_protected_file(request, field_file, attachment=False):
+    """
+    Serve a stored file with HTTP Range support, or hand it off to the front server
+    via X-Accel-Redirect / X-Sendfile when PROTECTED_MEDIA_SERVER is configured.
+    """
+    filename = os.path.basename(field_file.name)
+    disposition = 'attachment' if attachment else 'inline'
+
+    server = getattr(settings, 'PROTECTED_MEDIA_SERVER', None)
+    if server:
+        response = _offloaded_response(field_file, server)
+        response['Content-Disposition'] = f'{disposition}; filename="{filename}"'
+        return response
+
+    size = field_file.size
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    last_modified = http_date(field_file.storage.get_modified_time(field_file.name).timestamp())
+
+    byte_range = None
+    if_range = request.headers.get('If-Range')
+    if not if_range or if_range == last_modified:
+        try:
+            byte_range = parse_range_header(request.headers.get('Range'), size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    start, end = byte_range or (0, size - 1)
+    length = end - start + 1 if size else 0
+    response = StreamingHttpResponse(
+        _stream(field_file, start, length), status=206 if byte_range else 200, content_type=content_type
+    )
+    if byte_range:
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Content-Length'] = str(length)
+    response['Accept-Ranges'] = 'bytes'
+    response['Last-Modified'] = last_modified
+    response['Content-Disposition'] = f'{disposition}; filename="{filename}"'
+    return response
+
+
+def is_protected_media(path):
+    return any(path.startswith(prefix) for prefix in getattr(settings, 'PROTECTED_MEDIA_DIRS', ()))
+
+
+def serve_media(request, path, document_root=None, show_indexes=False):
+    """
+    django.views.static.serve for MEDIA_URL that lets clients keep versioned images
+    (``?v=`` URLs from Base64ImageWithURLField) for MEDIA_IMAGE_CACHE_MAX_AGE seconds.
+    A new version of the file gets a new URL, so the cached copy never goes stale.
+
+    Files under PROTECTED_MEDIA_DIRS are only reachable through serve_protected_file.
+    """
+    if is_protected_media(os.path.normpath(path).replace('\\', '/').lstrip('/')):
+        raise Http404("Protected files are not served from MEDIA_URL.")
+    response = static.serve(request, path, document_root=document_root, show_indexes=show_indexes)
+    content_type = response.get('Content-Type', '')
+    if response.status_code == 200 and 'v' in request.GET and content_type.startswith('image/'):
+        max_age = getattr(settings, 'MEDIA_IMAGE_CACHE_MAX_AGE', 365 * 24 * 60 * 60)
+        patch_cache_control(response, public=True, max_age=max_age, immutable=True)
+    return response
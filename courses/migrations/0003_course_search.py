@@ -0,0 +1,60 @@
+# Generated by Django 5.0.7 on 2026-10-16 20:37
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.contrib.postgres.operations import TrigramExtension
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+
+
+class PostgresOnlyAddIndex(migrations.AddIndex):
+    """
+    GIN indexes only exist on PostgreSQL; other backends keep the index in state only.
+    """
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+def populate_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Course = apps.get_model('courses', 'Course')
+    Course.objects.update(
+        search_vector=(
+            SearchVector('title', weight='A')
+            + SearchVector('short_description', weight='B')
+            + SearchVector('description', weight='C')
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0002_studentlessonprogress_completed_date_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='course',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        PostgresOnlyAddIndex(
+            model_name='course',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='course_search_vector_idx'),
+        ),
+        PostgresOnlyAddIndex(
+            model_name='course',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['title'], name='course_title_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.RunPython(populate_search_vector, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.7 on 2026-10-16 20:38
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0003_course_search'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['module', 'date', 'id'], name='chat_module_date_id_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.0.7 on 2026-10-16 20:41
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def seed_counters(apps, schema_editor):
+    Course = apps.get_model('courses', 'Course')
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    PlatformCounter = apps.get_model('courses', 'PlatformCounter')
+    PlatformCounter.objects.bulk_create([
+        PlatformCounter(name='courses', value=Course.objects.count()),
+        PlatformCounter(name='teachers', value=User.objects.filter(role='teacher').count()),
+        PlatformCounter(name='students', value=User.objects.filter(role='student').count()),
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0005_course_module_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlatformCounter',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Platform Counter',
+                'verbose_name_plural': 'Platform Counters',
+            },
+        ),
+        migrations.RunPython(seed_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.0.7 on 2026-10-16 20:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0007_studentmoduleprogress'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('enrolled_count', models.PositiveIntegerField(default=0)),
+                ('started_count', models.PositiveIntegerField(default=0)),
+                ('completed_count', models.PositiveIntegerField(default=0)),
+                ('pre_test_count', models.PositiveIntegerField(default=0)),
+                ('pre_test_average', models.FloatField(blank=True, null=True)),
+                ('post_test_count', models.PositiveIntegerField(default=0)),
+                ('post_test_average', models.FloatField(blank=True, null=True)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='courses.course')),
+            ],
+            options={
+                'verbose_name': 'Course Daily Stats',
+                'verbose_name_plural': 'Course Daily Stats',
+                'ordering': ['course', '-date'],
+                'unique_together': {('course', 'date')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ModuleDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('started_count', models.PositiveIntegerField(default=0)),
+                ('completed_count', models.PositiveIntegerField(default=0)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='module_daily_stats', to='courses.course')),
+                ('module', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='courses.module')),
+            ],
+            options={
+                'verbose_name': 'Module Daily Stats',
+                'verbose_name_plural': 'Module Daily Stats',
+                'ordering': ['module', '-date'],
+                'unique_together': {('module', 'date')},
+            },
+        ),
+    ]
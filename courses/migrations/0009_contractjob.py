@@ -0,0 +1,32 @@
+# Generated by Django 5.0.7 on 2026-10-16 20:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0008_daily_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContractJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], db_index=True, default='pending', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('enrollment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='contract_jobs', to='courses.enrollment')),
+            ],
+            options={
+                'verbose_name': 'Contract Job',
+                'verbose_name_plural': 'Contract Jobs',
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.7 on 2026-10-16 22:54
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0010_storeddocument'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contractjob',
+            name='available_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-16 23:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0011_contractjob_available_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='image_width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -1,6 +1,9 @@
 from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.conf import settings
 from tinymce.models import HTMLField
+from django.utils import timezone
 from django.utils.text import slugify
 from django.core.exceptions import ValidationError
 from django.core.validators import FileExtensionValidator
@@ -22,6 +25,8 @@ class Course(models.Model):
     description = HTMLField()
     short_description = models.TextField()
     image = models.ImageField(upload_to='course_images/', blank=True, null=True)
+    # Displayed width of ``image``, recorded once its derivatives exist so srcsets need no storage access
+    image_width = models.PositiveIntegerField(null=True, blank=True, editable=False)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     test_submission_count = models.IntegerField(default=0)
     test_question_count = models.IntegerField(default=0)
@@ -32,6 +37,8 @@ class Course(models.Model):
         limit_choices_to={'role': 'teacher'},
         related_name='courses'
     )
+    search_vector = SearchVectorField(null=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def save(self, *args, **kwargs):
         if not self.slug:
@@ -49,6 +56,10 @@ class Course(models.Model):
         ordering = ['title']
         verbose_name = 'Course'
         verbose_name_plural = 'Courses'
+        indexes = [
+            GinIndex(fields=['search_vector'], name='course_search_vector_idx'),
+            GinIndex(fields=['title'], name='course_title_trgm_idx', opclasses=['gin_trgm_ops']),
+        ]
 
 
 class Module(models.Model):
@@ -60,6 +71,7 @@ class Module(models.Model):
     title = models.CharField(max_length=255)
     description = HTMLField(blank=True, null=True)
     completed = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.title
@@ -182,6 +194,35 @@ class StudentLessonProgress(TimestampedModel):
         verbose_name_plural = 'Student Lesson Progresses'
 
 
+class StudentModuleProgress(models.Model):
+    student = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='module_progress'
+    )
+    course = models.ForeignKey(
+        Course,
+        on_delete=models.CASCADE,
+        related_name='module_progress'
+    )
+    module = models.ForeignKey(
+        Module,
+        on_delete=models.CASCADE,
+        related_name='student_progress'
+    )
+    completed_lessons = models.PositiveIntegerField(default=0)
+    completed = models.BooleanField(default=False)
+    completed_date = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.student.username} - {self.module.title}"
+
+    class Meta:
+        unique_together = ['student', 'module']
+        verbose_name = 'Student Module Progress'
+        verbose_name_plural = 'Student Module Progresses'
+
+
 class ChatMessage(models.Model):
     module = models.ForeignKey(
         Module,
@@ -210,3 +251,121 @@ class ChatMessage(models.Model):
     class Meta:
         verbose_name = 'Chat Message'
         verbose_name_plural = 'Chat Messages'
+        indexes = [
+            models.Index(fields=['module', 'date', 'id'], name='chat_module_date_id_idx'),
+        ]
+
+
+class PlatformCounter(models.Model):
+    COURSES = 'courses'
+    TEACHERS = 'teachers'
+    STUDENTS = 'students'
+
+    name = models.CharField(max_length=50, primary_key=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
+
+    class Meta:
+        verbose_name = 'Platform Counter'
+        verbose_name_plural = 'Platform Counters'
+
+
+class CourseDailyStats(models.Model):
+    course = models.ForeignKey(
+        Course,
+        on_delete=models.CASCADE,
+        related_name='daily_stats'
+    )
+    date = models.DateField()
+    enrolled_count = models.PositiveIntegerField(default=0)
+    started_count = models.PositiveIntegerField(default=0)
+    completed_count = models.PositiveIntegerField(default=0)
+    pre_test_count = models.PositiveIntegerField(default=0)
+    pre_test_average = models.FloatField(null=True, blank=True)
+    post_test_count = models.PositiveIntegerField(default=0)
+    post_test_average = models.FloatField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.course.title} - {self.date}"
+
+    class Meta:
+        unique_together = ['course', 'date']
+        ordering = ['course', '-date']
+        verbose_name = 'Course Daily Stats'
+        verbose_name_plural = 'Course Daily Stats'
+
+
+class ModuleDailyStats(models.Model):
+    course = models.ForeignKey(
+        Course,
+        on_delete=models.CASCADE,
+        related_name='module_daily_stats'
+    )
+    module = models.ForeignKey(
+        Module,
+        on_delete=models.CASCADE,
+        related_name='daily_stats'
+    )
+    date = models.DateField()
+    started_count = models.PositiveIntegerField(default=0)
+    completed_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.module.title} - {self.date}"
+
+    class Meta:
+        unique_together = ['module', 'date']
+        ordering = ['module', '-date']
+        verbose_name = 'Module Daily Stats'
+        verbose_name_plural = 'Module Daily Stats'
+
+
+class ContractJob(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    enrollment = models.ForeignKey(
+        Enrollment,
+        on_delete=models.CASCADE,
+        related_name='contract_jobs'
+    )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING, db_index=True)
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    available_at = models.DateTimeField(default=timezone.now, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Contract job {self.id} ({self.status})"
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = 'Contract Job'
+        verbose_name_plural = 'Contract Jobs'
+
+
+class StoredDocument(models.Model):
+    digest = models.CharField(max_length=64, unique=True)
+    name = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_stored_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        verbose_name = 'Stored Document'
+        verbose_name_plural = 'Stored Documents'
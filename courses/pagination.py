@@ -0,0 +1,15 @@
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination: no COUNT(*) and no OFFSET scan, so deep pages cost the same as the first one.
+    """
+    ordering = ('id',)
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class ChatCursorPagination(KeysetPagination):
+    # Served by the (module_id, date, id) index on ChatMessage
+    ordering = ('date', 'id')
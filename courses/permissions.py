@@ -0,0 +1,9 @@
+from rest_framework.permissions import BasePermission
+
+
+class IsTeacher(BasePermission):
+    message = "Only teachers can access this resource."
+
+    def has_permission(self, request, view):
+        user = request.user
+        return bool(user and user.is_authenticated and (user.role == 'teacher' or user.is_staff))
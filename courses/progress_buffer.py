@@ -0,0 +1,165 @@
+import os
+import sqlite3
+import threading
+from collections import defaultdict
+from contextlib import closing
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DataError, IntegrityError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+
+class ProgressEventBuffer:
+    """
+    Write-behind queue for lesson progress events, kept in a local SQLite file in WAL mode.
+
+    Requests only append to the file; ``flush`` applies the oldest events to
+    StudentLessonProgress in coalesced batches and deletes them once the database
+    transaction has committed. A crash between the two replays the batch, which is
+    harmless because applying an event only ever fills dates that are still empty.
+    Events the database rejects are moved to ``progress_events_failed`` so they cannot
+    block the queue.
+    """
+    _initialized_paths = set()
+    _initialize_lock = threading.Lock()
+
+    def __init__(self, path=None):
+        self.path = str(path or settings.PROGRESS_BUFFER_PATH)
+
+    @staticmethod
+    def enabled():
+        return getattr(settings, 'PROGRESS_BUFFER_ENABLED', False)
+
+    def _initialize(self):
+        # WAL mode is stored in the file itself, so the schema setup only has to run once per process
+        with self._initialize_lock:
+            if self.path in self._initialized_paths:
+                return
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with closing(sqlite3.connect(self.path, timeout=30)) as connection, connection:
+                connection.execute('PRAGMA journal_mode=WAL')
+                connection.execute(
+                    'CREATE TABLE IF NOT EXISTS progress_events ('
+                    'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                    'student_id TEXT NOT NULL, '
+                    'lesson_id INTEGER NOT NULL, '
+                    'type TEXT NOT NULL, '
+                    'timestamp TEXT NOT NULL)'
+                )
+                connection.execute(
+                    'CREATE TABLE IF NOT EXISTS progress_events_failed ('
+                    'id INTEGER PRIMARY KEY, '
+                    'student_id TEXT NOT NULL, '
+                    'lesson_id INTEGER NOT NULL, '
+                    'type TEXT NOT NULL, '
+                    'timestamp TEXT NOT NULL, '
+                    'error TEXT NOT NULL, '
+                    'failed_at TEXT NOT NULL)'
+                )
+            self._initialized_paths.add(self.path)
+
+    def _connect(self):
+        self._initialize()
+        return sqlite3.connect(self.path, timeout=30)
+
+    def append(self, student, events):
+        """
+        Durably queue events ({'lesson', 'type', optional 'timestamp'}) for ``student``.
+        """
+        now = timezone.now()
+        rows = [
+            (str(student.pk), event['lesson'], event['type'], (event.get('timestamp') or now).isoformat())
+            for event in events
+        ]
+        with closing(self._connect()) as connection, connection:
+            connection.executemany(
+                'INSERT INTO progress_events (student_id, lesson_id, type, timestamp) VALUES (?, ?, ?, ?)', rows
+            )
+        return len(rows)
+
+    def pending(self):
+        with closing(self._connect()) as connection:
+            return connection.execute('SELECT COUNT(*) FROM progress_events').fetchone()[0]
+
+    def failed(self):
+        with closing(self._connect()) as connection:
+            return connection.execute('SELECT COUNT(*) FROM progress_events_failed').fetchone()[0]
+
+    def flush(self, batch_size=None):
+        """
+        Apply one batch of the oldest events, for all students at once. Returns the number of events consumed.
+
+        If the database rejects the batch, it is retried student by student and then event by
+        event, and the events that still fail are moved to ``progress_events_failed``. Any other
+        error stops the flush and leaves the batch queued, to be replayed by the next one.
+        """
+        batch_size = batch_size or getattr(settings, 'PROGRESS_BUFFER_BATCH_SIZE', 1000)
+        with closing(self._connect()) as connection:
+            rows = connection.execute(
+                'SELECT id, student_id, lesson_id, type, timestamp FROM progress_events ORDER BY id LIMIT ?',
+                (batch_size,)
+            ).fetchall()
+            if not rows:
+                return 0
+
+            rows_by_student = defaultdict(list)
+            for row in rows:
+                rows_by_student[row[1]].append(row)
+
+            students = {
+                str(pk): student for pk, student in get_user_model().objects.in_bulk(list(rows_by_student)).items()
+            }
+            batches = [
+                (students[student_id], student_rows)
+                for student_id, student_rows in rows_by_student.items() if student_id in students
+            ]
+            consumed, failed = [], []
+            try:
+                failed = self._apply(batches)
+                # Events of students that no longer exist are dropped with the rest
+                consumed = rows
+            finally:
+                # Only forget events whose outcome has been committed
+                now = timezone.now().isoformat()
+                with connection:
+                    connection.executemany(
+                        'INSERT OR REPLACE INTO progress_events_failed '
+                        '(id, student_id, lesson_id, type, timestamp, error, failed_at) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                        [(*row, error, now) for row, error in failed]
+                    )
+                    connection.executemany('DELETE FROM progress_events WHERE id = ?', [(row[0],) for row in consumed])
+        return len(consumed)
+
+    @classmethod
+    def _apply(cls, batches):
+        """
+        Apply (student, rows) batches in one transaction, falling back to one student and then
+        one event at a time if the database rejects them. Returns the rejected (row, error) pairs.
+        """
+        from .services import StudentLessonProgressService
+
+        def events(rows):
+            return [{'lesson': row[2], 'type': row[3], 'timestamp': parse_datetime(row[4])} for row in rows]
+
+        if not batches:
+            return []
+        try:
+            StudentLessonProgressService.apply_batches([(student, events(rows)) for student, rows in batches])
+            return []
+        except (DataError, IntegrityError) as e:
+            if len(batches) > 1:
+                return [rejected for batch in batches for rejected in cls._apply([batch])]
+            student, rows = batches[0]
+            if len(rows) > 1:
+                return [rejected for row in rows for rejected in cls._apply([(student, [row])])]
+            return [(rows[0], str(e))]
+
+    def drain(self, batch_size=None):
+        total = 0
+        while consumed := self.flush(batch_size):
+            total += consumed
+        return total
@@ -1,20 +1,66 @@
 from rest_framework import serializers
-from .models import ChatMessage, Course, Enrollment, Lesson, Module, StudentLessonProgress
+from .models import ChatMessage, ContractJob, Course, Enrollment, Lesson, Module, StudentLessonProgress
 from django.conf import settings
-from urllib.parse import urljoin
+from django.core.cache import caches
+from urllib.parse import urljoin, urlsplit
 import base64
+import hashlib
 from django.core.files.base import ContentFile
+from django.urls import reverse
+from .images import image_srcset
+
+IMAGE_REPRESENTATION_MODES = ('url', 'base64', 'cached_base64')
+
+
+def _image_cache():
+    return caches[getattr(settings, 'IMAGE_BASE64_CACHE_ALIAS', 'default')]
+
+
+def _encode_image(field_file):
+    with field_file.open('rb') as image_file:
+        data = image_file.read()
+    return data, f"data:image/{field_file.name.split('.')[-1]};base64,{base64.b64encode(data).decode()}"
+
+
+def cached_base64_image(field_file, version):
+    """
+    Base64 data URI of ``field_file``, cached under the SHA-256 of its content.
+
+    ``version`` (size and mtime) maps the storage name to that hash, so an unchanged file
+    is neither read nor encoded again, and identical files share one cached blob.
+    """
+    cache = _image_cache()
+    timeout = getattr(settings, 'IMAGE_BASE64_CACHE_TIMEOUT', 24 * 60 * 60)
+    digest_key = 'image-digest:' + hashlib.sha256(f'{field_file.name}:{version}'.encode()).hexdigest()
+
+    digest = cache.get(digest_key)
+    if digest is not None:
+        encoded = cache.get(f'image-base64:{digest}')
+        if encoded is not None:
+            return encoded
+
+    data, encoded = _encode_image(field_file)
+    digest = hashlib.sha256(data).hexdigest()
+    cache.set_many({digest_key: digest, f'image-base64:{digest}': encoded}, timeout)
+    return encoded
+
 
 class Base64ImageField(serializers.ImageField):
     """
     Custom field for handling image uploads via base64 and providing URLs
     """
-    def to_representation(self, value):
+    def build_url(self, value, name):
         request = self.context.get('request')
-        full_url = urljoin(request.build_absolute_uri('/'), value.url) if request else f"{settings.MEDIA_URL}{value.name}"
+        url = value.storage.url(name)
+        return urljoin(request.build_absolute_uri('/'), url) if request else url
+
+    def to_representation(self, value):
+        if not value:
+            return None
         return {
-            "src": full_url
-        } if value else None
+            "src": self.build_url(value, value.name),
+            **image_srcset(value, lambda name: self.build_url(value, name)),
+        }
 
     def to_internal_value(self, data):
         """
@@ -29,6 +75,56 @@ class Base64ImageField(serializers.ImageField):
                 raise serializers.ValidationError("Invalid base64 image format.") from e
         return super().to_internal_value(data)
 
+
+def versioned_url(url, version):
+    """
+    Append ``v=<version>`` to ``url``, which may already carry a query string (e.g. a signed URL).
+    """
+    if not version:
+        return url
+    return f"{url}{'&' if urlsplit(url).query else '?'}v={version}"
+
+
+class Base64ImageWithURLField(Base64ImageField):
+    """
+    Image field whose representation depends on ``mode``:
+
+    - ``url``: only the URL, versioned with the content hash stored on the row
+      (``<field>_version``, see courses.images.track_file_versions) so it can be cached for long
+    - ``base64``: the URL plus the image inlined as a data URI, encoded on every call
+    - ``cached_base64``: like ``base64``, but the data URI comes from the cache
+
+    An ``image_mode`` in the serializer context overrides the field's mode.
+    With ``srcset`` the thumbnail URLs from courses.images are included too.
+    """
+    def __init__(self, *args, mode='base64', srcset=False, **kwargs):
+        if mode not in IMAGE_REPRESENTATION_MODES:
+            raise ValueError(f"Unknown image representation mode {mode!r}.")
+        self.mode = mode
+        self.srcset = srcset
+        super().__init__(*args, **kwargs)
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        mode = self.context.get('image_mode') or self.mode
+        # Rows saved before versions were tracked get a plain URL rather than a storage lookup
+        version = getattr(value.instance, f'{value.field.name}_version', '')
+        representation = {"src": versioned_url(self.build_url(value, value.name), version)}
+        try:
+            if mode == 'base64':
+                representation["base64"] = _encode_image(value)[1]
+            elif mode == 'cached_base64':
+                if not version:
+                    modified = value.storage.get_modified_time(value.name)
+                    version = f'{value.size}:{modified.timestamp()}'
+                representation["base64"] = cached_base64_image(value, version)
+        except OSError as e:
+            raise serializers.ValidationError("Error processing image.") from e
+        if self.srcset:
+            representation.update(image_srcset(value, lambda name: self.build_url(value, name)))
+        return representation
+
 class BaseCourseSerializer(serializers.ModelSerializer):
     image = Base64ImageField()
 
@@ -49,12 +145,22 @@ class CourseWithAccessSerializer(BaseCourseSerializer):
         fields = BaseCourseSerializer.Meta.fields + ['has_access']
 
     def get_has_access(self, obj):
+        # CourseListView annotates the flag for the whole page in the same query
+        if hasattr(obj, 'user_has_access'):
+            return obj.user_has_access
         user = self.context['request'].user
         if user.is_authenticated:
             return Enrollment.objects.filter(course=obj, user=user, has_access=True).exists()
         return False
 
 
+class CourseSearchResultSerializer(CourseWithAccessSerializer):
+    rank = serializers.FloatField(read_only=True)
+
+    class Meta(CourseWithAccessSerializer.Meta):
+        fields = CourseWithAccessSerializer.Meta.fields + ['rank']
+
+
 class CourseDetailSerializer(BaseCourseSerializer):
     class Meta(BaseCourseSerializer.Meta):
         fields = BaseCourseSerializer.Meta.fields + ['description', 'test_question_count']
@@ -72,7 +178,27 @@ class ModuleSummarySerializer(serializers.ModelSerializer):
         fields = ['id', 'title']
 
 
-class LessonDetailSerializer(serializers.ModelSerializer):
+class LessonFileURLMixin:
+    """
+    Point ``pdf`` and ``presentation`` at the access-checked LessonFileView instead of MEDIA_URL.
+    """
+    def _file_url(self, obj, field):
+        if not getattr(obj, field):
+            return None
+        url = reverse('lesson_file', args=[obj.id, field])
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+    def get_pdf(self, obj):
+        return self._file_url(obj, 'pdf')
+
+    def get_presentation(self, obj):
+        return self._file_url(obj, 'presentation')
+
+
+class LessonDetailSerializer(LessonFileURLMixin, serializers.ModelSerializer):
+    pdf = serializers.SerializerMethodField()
+    presentation = serializers.SerializerMethodField()
     completed_date = serializers.DateTimeField(source='student_progress.completed_date', read_only=True)
     started_date = serializers.DateTimeField(source='student_progress.started_date', read_only=True)
 
@@ -84,18 +210,83 @@ class LessonDetailSerializer(serializers.ModelSerializer):
         ]
 
 
-class LessonSerializer(serializers.ModelSerializer):
+class LessonSerializer(LessonFileURLMixin, serializers.ModelSerializer):
+    pdf = serializers.SerializerMethodField()
+    presentation = serializers.SerializerMethodField()
+
     class Meta:
         model = Lesson
         fields = ['id', 'title', 'description', 'pdf', 'video_url', 'presentation']
 
 
+class OptionalDescriptionMixin:
+    """
+    Drop the heavy HTML description unless the view asked for it via context['include_descriptions'].
+    """
+    def get_fields(self):
+        fields = super().get_fields()
+        if not self.context.get('include_descriptions'):
+            fields.pop('description', None)
+        return fields
+
+
+class OutlineLessonSerializer(OptionalDescriptionMixin, LessonFileURLMixin, serializers.ModelSerializer):
+    pdf = serializers.SerializerMethodField()
+    presentation = serializers.SerializerMethodField()
+    started_date = serializers.SerializerMethodField()
+    completed_date = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Lesson
+        fields = ['id', 'title', 'description', 'pdf', 'video_url', 'presentation', 'started_date', 'completed_date']
+
+    def _progress_date(self, obj, field):
+        progress = getattr(obj, 'my_progress', None)
+        value = getattr(progress[0], field) if progress else None
+        return serializers.DateTimeField().to_representation(value) if value else None
+
+    def get_started_date(self, obj):
+        return self._progress_date(obj, 'started_date')
+
+    def get_completed_date(self, obj):
+        return self._progress_date(obj, 'completed_date')
+
+
+class OutlineModuleSerializer(OptionalDescriptionMixin, serializers.ModelSerializer):
+    lessons = OutlineLessonSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Module
+        fields = ['id', 'title', 'description', 'lessons']
+
+
+class CourseOutlineSerializer(OptionalDescriptionMixin, BaseCourseSerializer):
+    modules = OutlineModuleSerializer(many=True, read_only=True)
+
+    class Meta(BaseCourseSerializer.Meta):
+        fields = BaseCourseSerializer.Meta.fields + ['description', 'modules']
+
+
 class EnrollmentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Enrollment
         fields = ['contract_file', 'course', 'user', 'has_access', 'completed', 'started_date', 'completed_date']
 
 
+class ContractJobSerializer(serializers.ModelSerializer):
+    contract_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ContractJob
+        fields = ['id', 'status', 'contract_url', 'error', 'created_at', 'finished_at']
+
+    def get_contract_url(self, obj):
+        contract_file = obj.enrollment.contract_file
+        if obj.status != ContractJob.DONE or not contract_file:
+            return None
+        return self.context['request'].build_absolute_uri(contract_file.url)
+
+
 class ReplyToSerializer(serializers.ModelSerializer):
     class Meta:
         model = ChatMessage
@@ -121,3 +312,9 @@ class StudentLessonProgressSerializer(serializers.ModelSerializer):
     class Meta:
         model = StudentLessonProgress
         fields = ['lesson', 'student', 'started_date', 'completed_date']
+
+
+class LessonProgressEventSerializer(serializers.Serializer):
+    lesson = serializers.IntegerField()
+    type = serializers.ChoiceField(choices=['start', 'finish'])
+    timestamp = serializers.DateTimeField(required=False)
@@ -1,29 +1,37 @@
-import subprocess
+from collections import Counter
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramSimilarity
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from django.core.exceptions import ValidationError
-from django.db import transaction
-from .models import Course, Enrollment, Lesson, Module, StudentLessonProgress, ChatMessage
+from django.db import connection, transaction
+from django.db.models import (
+    Avg, Case, Count, F, FilteredRelation, FloatField, Max, OuterRef, Prefetch, Q, Subquery, Sum, Value, When
+)
+from django.db.models.functions import Cast, Coalesce
+from .models import (
+    ContractJob, Course, CourseDailyStats, Enrollment, Lesson, Module, ModuleDailyStats, PlatformCounter,
+    StudentCourseHistory, StudentLessonProgress, StudentModuleProgress, ChatMessage
+)
+from .converters import ConversionError
+from .documents import attach_document
 from .utils import generate_contract, convert_docx_to_pdf
-from django.core.files.base import ContentFile
 
 
 class ContractService:
     @staticmethod
-    @transaction.atomic
     def create_contract(enrollment, user, course):
+        # Rendering and conversion can take seconds, so no transaction is held around them
         if enrollment.contract_file:
             return enrollment.contract_file.name
         
         try:
             contract_file_stream = generate_contract(enrollment, user, course)
             pdf_file_stream = convert_docx_to_pdf(contract_file_stream)
-            contract_filename = f'contract_{enrollment.id}.pdf'
-            enrollment.contract_file.save(contract_filename, ContentFile(pdf_file_stream.read()))
-            enrollment.save()
-            return contract_filename
+            return attach_document(enrollment, 'contract_file', pdf_file_stream.read())
         
-        except subprocess.CalledProcessError as e:
+        except ConversionError as e:
             print(f"Error converting DOCX to PDF: {str(e)}")
             raise ValidationError("Failed to generate contract PDF.")
         
@@ -48,52 +56,801 @@ class EnrollmentService:
             return enrollment, None, "User already enrolled"
         
         enrollment = Enrollment.objects.create(user=user, course=course)
-        contract_filename = ContractService.create_contract(enrollment, user, course)
-        return enrollment, contract_filename, "User successfully enrolled"
+        job = ContractJobService.enqueue(enrollment)
+        return enrollment, job, "User successfully enrolled"
+
+
+class ContractJobService:
+    """
+    Database-backed queue for contract generation, consumed by the run_contract_jobs worker.
+    """
+
+    @staticmethod
+    def enqueue(enrollment):
+        return ContractJob.objects.create(enrollment=enrollment)
+
+    @staticmethod
+    def _claimable():
+        stale_after = getattr(settings, 'CONTRACT_JOB_STALE_AFTER', 10 * 60)
+        now = timezone.now()
+        # Running jobs that have not finished in time belong to a worker that died
+        stale = Q(status=ContractJob.RUNNING, started_at__lt=now - timedelta(seconds=stale_after))
+        return ContractJob.objects.filter(Q(status=ContractJob.PENDING, available_at__lte=now) | stale)
+
+    @staticmethod
+    def claim():
+        """
+        Atomically take the oldest claimable job. Several workers can poll concurrently:
+        the conditional UPDATE lets exactly one of them move a job to running.
+        """
+        max_attempts = getattr(settings, 'CONTRACT_JOB_MAX_ATTEMPTS', 3)
+        ContractJobService._claimable().filter(attempts__gte=max_attempts).update(
+            status=ContractJob.FAILED, finished_at=timezone.now(), error="Gave up after too many attempts."
+        )
+
+        for job_id in ContractJobService._claimable().values_list('id', flat=True)[:10]:
+            claimed = ContractJobService._claimable().filter(id=job_id).update(
+                status=ContractJob.RUNNING, started_at=timezone.now(), attempts=F('attempts') + 1
+            )
+            if claimed:
+                return ContractJob.objects.select_related('enrollment__user', 'enrollment__course').get(id=job_id)
+        return None
+
+    @staticmethod
+    def retry_delay(attempts):
+        """
+        Exponential backoff: CONTRACT_JOB_RETRY_DELAY seconds after the first failure, doubling each time.
+        """
+        return timedelta(seconds=getattr(settings, 'CONTRACT_JOB_RETRY_DELAY', 30) * 2 ** max(attempts - 1, 0))
+
+    @staticmethod
+    def run(job):
+        enrollment = job.enrollment
+        try:
+            ContractService.create_contract(enrollment, enrollment.user, enrollment.course)
+        except ValidationError as e:
+            job.finished_at = timezone.now()
+            max_attempts = getattr(settings, 'CONTRACT_JOB_MAX_ATTEMPTS', 3)
+            job.status = ContractJob.PENDING if job.attempts < max_attempts else ContractJob.FAILED
+            job.error = '; '.join(e.messages)
+            # Back off from the end of the attempt, so a slow conversion does not shorten the delay
+            job.available_at = job.finished_at + ContractJobService.retry_delay(job.attempts)
+        else:
+            job.finished_at = timezone.now()
+            job.status = ContractJob.DONE
+            job.error = ''
+        job.save(update_fields=['status', 'error', 'available_at', 'finished_at'])
+        return job
+
+    @staticmethod
+    def run_pending(limit=None):
+        """
+        Run claimable jobs until none are left (or ``limit`` jobs ran). Returns the jobs processed.
+        """
+        processed = []
+        while limit is None or len(processed) < limit:
+            job = ContractJobService.claim()
+            if job is None:
+                break
+            processed.append(ContractJobService.run(job))
+        return processed
+
+
+class LessonAccessService:
+    @staticmethod
+    def can_access(user, lesson):
+        course = lesson.module.course
+        if user.is_staff or course.teacher_id == user.pk:
+            return True
+        return Enrollment.objects.filter(user=user, course=course, has_access=True).exists()
 
 
 class StudentLessonProgressService:
+    START_SQL = """
+        INSERT INTO {progress} (student_id, lesson_id, course_id, created_at, updated_at, started_date, completed_date)
+        SELECT %s, lesson.id, module.course_id, %s, %s, %s, NULL
+        FROM {lesson} lesson INNER JOIN {module} module ON module.id = lesson.module_id
+        WHERE lesson.id = %s
+        ON CONFLICT (student_id, lesson_id) DO UPDATE
+        SET started_date = EXCLUDED.started_date, updated_at = EXCLUDED.updated_at
+        WHERE {progress}.started_date IS NULL
+        RETURNING id, (SELECT title FROM {lesson} WHERE id = lesson_id)
+    """
+    FINISH_SQL = """
+        INSERT INTO {progress} (student_id, lesson_id, course_id, created_at, updated_at, started_date, completed_date)
+        SELECT %s, lesson.id, module.course_id, %s, %s, %s, %s
+        FROM {lesson} lesson INNER JOIN {module} module ON module.id = lesson.module_id
+        WHERE lesson.id = %s
+        ON CONFLICT (student_id, lesson_id) DO UPDATE
+        SET completed_date = EXCLUDED.completed_date,
+            started_date = COALESCE({progress}.started_date, EXCLUDED.started_date),
+            updated_at = EXCLUDED.updated_at
+        WHERE {progress}.completed_date IS NULL
+        RETURNING id, (SELECT title FROM {lesson} WHERE id = lesson_id)
+    """
+
     @staticmethod
-    @transaction.atomic
     def start_lesson(student, lesson_id):
-        lesson = get_object_or_404(Lesson, id=lesson_id)
-        progress, created = StudentLessonProgress.objects.get_or_create(student=student, lesson=lesson)
-        
-        if progress.started_date:
-            return None 
-        
-        progress.started_date = timezone.now()
-        progress.save()
-        return progress
+        """
+        Start a lesson with a single INSERT ... ON CONFLICT DO UPDATE statement.
+        Returns (progress, lesson_title); progress is None if the lesson was already started.
+        """
+        now = timezone.now()
+        student_id, db_now = StudentLessonProgressService._db_params(student, now)
+        row = StudentLessonProgressService._upsert(
+            StudentLessonProgressService.START_SQL, [student_id, db_now, db_now, db_now, lesson_id]
+        )
+        return StudentLessonProgressService._result(student, lesson_id, row, started_date=now)
 
     @staticmethod
-    @transaction.atomic
     def finish_lesson(student, lesson_id):
-        progress = StudentLessonProgress.objects.select_for_update().get(student=student, lesson_id=lesson_id)
-        
-        if progress.completed_date:
-            return None 
-        
-        progress.completed_date = timezone.now()
-        progress.save()
-        return progress
+        """
+        Finish a lesson (starting it too if needed) with a single upsert statement.
+        Returns (progress, lesson_title); progress is None if the lesson was already completed.
+        The completion rollups are updated once the upsert has committed.
+        """
+        now = timezone.now()
+        student_id, db_now = StudentLessonProgressService._db_params(student, now)
+        row = StudentLessonProgressService._upsert(
+            StudentLessonProgressService.FINISH_SQL, [student_id, db_now, db_now, db_now, db_now, lesson_id]
+        )
+        if row is not None:
+            CompletionRollupService.lessons_completed_on_commit(student, [lesson_id], now)
+        return StudentLessonProgressService._result(student, lesson_id, row, completed_date=now)
+
+    @staticmethod
+    def _db_params(student, now):
+        # Let the model fields adapt the UUID and datetime for the current backend
+        meta = StudentLessonProgress._meta
+        return (
+            meta.get_field('student').get_db_prep_value(student.pk, connection),
+            meta.get_field('started_date').get_db_prep_value(now, connection),
+        )
+
+    @staticmethod
+    def _upsert(sql, params):
+        quote = connection.ops.quote_name
+        sql = sql.format(
+            progress=quote(StudentLessonProgress._meta.db_table),
+            lesson=quote(Lesson._meta.db_table),
+            module=quote(Module._meta.db_table),
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchone()
+
+    @staticmethod
+    def _result(student, lesson_id, row, **dates):
+        if row is None:
+            # Nothing was written: either the lesson does not exist or the date is already set
+            lesson_title = Lesson.objects.filter(id=lesson_id).values_list('title', flat=True).first()
+            if lesson_title is None:
+                raise Lesson.DoesNotExist
+            return None, lesson_title
+
+        progress_id, lesson_title = row
+        return StudentLessonProgress(id=progress_id, student=student, lesson_id=lesson_id, **dates), lesson_title
+
+    START = 'start'
+    FINISH = 'finish'
+
+    START_MANY_SQL = """
+        INSERT INTO {progress} (student_id, lesson_id, course_id, created_at, updated_at, started_date)
+        VALUES {rows}
+        ON CONFLICT (student_id, lesson_id) DO UPDATE
+        SET started_date = EXCLUDED.started_date, updated_at = EXCLUDED.updated_at
+        WHERE {progress}.started_date IS NULL
+        RETURNING student_id, lesson_id
+    """
+    FINISH_MANY_SQL = """
+        INSERT INTO {progress} (student_id, lesson_id, course_id, created_at, updated_at, started_date, completed_date)
+        VALUES {rows}
+        ON CONFLICT (student_id, lesson_id) DO UPDATE
+        SET completed_date = EXCLUDED.completed_date,
+            started_date = COALESCE({progress}.started_date, EXCLUDED.started_date),
+            updated_at = EXCLUDED.updated_at
+        WHERE {progress}.completed_date IS NULL
+        RETURNING student_id, lesson_id
+    """
+
+    @staticmethod
+    def apply_events(student, events):
+        """
+        Apply a batch of start/finish events for one student. Returns a status per event, in input order.
+        """
+        return StudentLessonProgressService.apply_batches([(student, events)])[0]
+
+    @staticmethod
+    @transaction.atomic
+    def apply_batches(batches):
+        """
+        Apply the start/finish events of several students, given as (student, events) pairs,
+        with one lesson lookup and at most two guarded bulk upserts for all of them.
+        Returns the statuses of each batch, in input order.
+
+        Like START_SQL and FINISH_SQL, the upserts only fill dates that are still empty and
+        return the rows they changed, so overlapping batches never both complete a lesson.
+        Only those lessons reach each student's completion rollups, once the batch has committed.
+        """
+        lesson_ids = {event['lesson'] for _, events in batches for event in events}
+        lesson_courses = dict(
+            Lesson.objects.filter(id__in=lesson_ids).values_list('id', 'module__course_id')
+        )
+
+        # Per (student, lesson): the type of its first event, the date it starts at and the date it finishes at
+        now = timezone.now()
+        plans = {}
+        for student, events in batches:
+            for event in events:
+                if event['lesson'] not in lesson_courses:
+                    continue
+                timestamp = min(event.get('timestamp') or now, now)
+                plan = plans.setdefault(
+                    (student.pk, event['lesson']), {'first': event['type'], 'started': timestamp, 'completed': None}
+                )
+                if event['type'] == StudentLessonProgressService.FINISH and plan['completed'] is None:
+                    plan['completed'] = timestamp
+
+        started = StudentLessonProgressService._bulk_upsert(
+            StudentLessonProgressService.START_MANY_SQL,
+            [
+                (student_id, lesson_id, lesson_courses[lesson_id], now, now, plan['started'])
+                for (student_id, lesson_id), plan in plans.items()
+                if plan['first'] == StudentLessonProgressService.START
+            ],
+        )
+        completed = StudentLessonProgressService._bulk_upsert(
+            StudentLessonProgressService.FINISH_MANY_SQL,
+            [
+                (student_id, lesson_id, lesson_courses[lesson_id], now, now, plan['started'], plan['completed'])
+                for (student_id, lesson_id), plan in plans.items() if plan['completed'] is not None
+            ],
+        )
+
+        results = []
+        seen = set()
+        reported = set()
+        for student, events in batches:
+            statuses = []
+            newly_completed = []
+            for event in events:
+                key = (student.pk, event['lesson'])
+                if event['lesson'] not in lesson_courses:
+                    statuses.append('lesson_not_found')
+                    continue
+                if event['type'] == StudentLessonProgressService.START:
+                    # Only the lesson's first event can have started it
+                    status = 'started' if key in started and key not in seen else 'already_started'
+                elif key in completed and key not in reported:
+                    status = 'completed'
+                    reported.add(key)
+                    newly_completed.append(event['lesson'])
+                else:
+                    status = 'already_completed'
+                statuses.append(status)
+                seen.add(key)
+            CompletionRollupService.lessons_completed_on_commit(student, newly_completed, now)
+            results.append(statuses)
+        return results
+
+    @staticmethod
+    def _bulk_upsert(sql, rows):
+        """
+        Run a multi-row upsert of (student_id, lesson_id, course_id, dates...) rows and
+        return the (student_id, lesson_id) pairs of the rows it actually wrote.
+        """
+        if not rows:
+            return set()
+        student_field = StudentLessonProgress._meta.get_field('student')
+        date_field = StudentLessonProgress._meta.get_field('started_date')
+        row_sql = '(' + ', '.join(['%s'] * len(rows[0])) + ')'
+        progress = connection.ops.quote_name(StudentLessonProgress._meta.db_table)
+        changed = set()
+        batch_size = max(connection.ops.bulk_batch_size([None] * len(rows[0]), rows), 1)
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            params = []
+            for student_id, lesson_id, course_id, *dates in batch:
+                params += [student_field.get_db_prep_value(student_id, connection), lesson_id, course_id]
+                params += [date_field.get_db_prep_value(date, connection) for date in dates]
+            with connection.cursor() as cursor:
+                cursor.execute(sql.format(progress=progress, rows=', '.join([row_sql] * len(batch))), params)
+                changed.update(
+                    (student_field.target_field.to_python(student_id), lesson_id)
+                    for student_id, lesson_id in cursor.fetchall()
+                )
+        return changed
+
+    @staticmethod
+    def get_snapshot(student, module_id=None, course_id=None):
+        """
+        Started/completed dates for every lesson of a module or course plus completion
+        percentages, from a single LEFT JOIN over the student's own StudentLessonProgress rows.
+        """
+        lessons = Lesson.objects.all()
+        if module_id:
+            lessons = lessons.filter(module_id=module_id)
+        if course_id:
+            lessons = lessons.filter(module__course_id=course_id)
+
+        # The student condition goes into the JOIN itself, so other students' rows are never read;
+        # (student, lesson) is unique, so each lesson joins at most one row and needs no grouping
+        rows = list(
+            lessons.annotate(
+                own_progress=FilteredRelation('student_progress', condition=Q(student_progress__student=student)),
+                lesson_started_date=F('own_progress__started_date'),
+                lesson_completed_date=F('own_progress__completed_date'),
+            ).values(
+                'id', 'module_id', 'title', 'lesson_started_date', 'lesson_completed_date'
+            ).order_by('module__title', 'title')
+        )
+
+        modules = {}
+        for row in rows:
+            totals = modules.setdefault(
+                row['module_id'], {'module': row['module_id'], 'total_lessons': 0, 'completed_lessons': 0}
+            )
+            totals['total_lessons'] += 1
+            totals['completed_lessons'] += row['lesson_completed_date'] is not None
+        for totals in modules.values():
+            totals['completion_percentage'] = StudentLessonProgressService._percentage(
+                totals['completed_lessons'], totals['total_lessons']
+            )
+
+        completed = sum(1 for row in rows if row['lesson_completed_date'])
+        return {
+            'total_lessons': len(rows),
+            'started_lessons': sum(1 for row in rows if row['lesson_started_date']),
+            'completed_lessons': completed,
+            'completion_percentage': StudentLessonProgressService._percentage(completed, len(rows)),
+            'modules': list(modules.values()),
+            'lessons': [
+                {
+                    'lesson': row['id'],
+                    'module': row['module_id'],
+                    'title': row['title'],
+                    'started_date': row['lesson_started_date'],
+                    'completed_date': row['lesson_completed_date'],
+                }
+                for row in rows
+            ],
+        }
+
+    @staticmethod
+    def _percentage(part, total):
+        return round(part * 100 / total, 2) if total else 0
+
+
+class CompletionRollupService:
+    """
+    Keeps StudentModuleProgress, Enrollment.completed and StudentCourseHistory.completed
+    in step with finished lessons without rescanning StudentLessonProgress.
+    """
+
+    @staticmethod
+    def lessons_completed_on_commit(student, lesson_ids, completed_date=None):
+        """
+        Run lessons_completed after the progress write commits, outside its round trip.
+        A crash in between leaves rollups behind until rebuild_completion_rollups runs.
+        """
+        if lesson_ids:
+            transaction.on_commit(
+                lambda: CompletionRollupService.lessons_completed(student, lesson_ids, completed_date)
+            )
+
+    @staticmethod
+    @transaction.atomic
+    def lessons_completed(student, lesson_ids, completed_date=None):
+        """
+        Record lessons that have just transitioned to completed for ``student``.
+        Callers must only pass lessons whose completed_date was newly set.
+        """
+        if not lesson_ids:
+            return
+        completed_date = completed_date or timezone.now()
+
+        newly_completed = Counter()
+        module_courses = {}
+        lessons = Lesson.objects.filter(id__in=lesson_ids).values_list('module_id', 'module__course_id')
+        for module_id, course_id in lessons:
+            newly_completed[module_id] += 1
+            module_courses[module_id] = course_id
+
+        StudentModuleProgress.objects.bulk_create(
+            [
+                StudentModuleProgress(student=student, module_id=module_id, course_id=course_id)
+                for module_id, course_id in module_courses.items()
+            ],
+            ignore_conflicts=True,
+        )
+        StudentModuleProgress.objects.filter(student=student, module_id__in=newly_completed).update(
+            completed_lessons=F('completed_lessons') + Case(
+                *[When(module_id=module_id, then=Value(delta)) for module_id, delta in newly_completed.items()],
+                default=Value(0)
+            )
+        )
+
+        totals = CompletionRollupService._lesson_totals(module_courses)
+        finished_modules = [
+            module_id
+            for module_id, completed_lessons in StudentModuleProgress.objects.filter(
+                student=student, module_id__in=module_courses, completed=False
+            ).values_list('module_id', 'completed_lessons')
+            if completed_lessons >= totals.get(module_id, 0)
+        ]
+        if finished_modules:
+            StudentModuleProgress.objects.filter(student=student, module_id__in=finished_modules).update(
+                completed=True, completed_date=completed_date
+            )
+
+        course_ids = set(module_courses.values())
+        course_totals = dict(
+            Lesson.objects.filter(module__course_id__in=course_ids).values_list(
+                'module__course_id'
+            ).annotate(Count('id'))
+        )
+        course_completed = dict(
+            StudentModuleProgress.objects.filter(student=student, course_id__in=course_ids).values_list(
+                'course_id'
+            ).annotate(Sum('completed_lessons'))
+        )
+        finished_courses = [
+            course_id for course_id in course_ids
+            if course_completed.get(course_id, 0) >= course_totals.get(course_id, 0)
+        ]
+        CompletionRollupService._mark_courses_completed(student.pk, finished_courses, completed_date)
+
+    @staticmethod
+    def _lesson_totals(module_ids):
+        return dict(Lesson.objects.filter(module_id__in=module_ids).values_list('module_id').annotate(Count('id')))
+
+    @staticmethod
+    def _mark_courses_completed(student_id, course_ids, completed_date):
+        if not course_ids:
+            return
+        # A course completed once keeps its original completion date if it is reopened and finished again
+        Enrollment.objects.filter(user_id=student_id, course_id__in=course_ids, completed=False).update(
+            completed=True, completed_date=Coalesce('completed_date', Value(completed_date))
+        )
+        existing = set(
+            StudentCourseHistory.objects.filter(user_id=student_id, course_id__in=course_ids).values_list(
+                'course_id', flat=True
+            )
+        )
+        StudentCourseHistory.objects.filter(user_id=student_id, course_id__in=existing).update(completed=True)
+        StudentCourseHistory.objects.bulk_create([
+            StudentCourseHistory(user_id=student_id, course_id=course_id, completed=True)
+            for course_id in course_ids if course_id not in existing
+        ])
+
+    @staticmethod
+    @transaction.atomic
+    def module_lessons_changed(module_id, recount=False):
+        """
+        Bring one module's rollups and its course's completion flags back in step after a lesson
+        was added to it, or removed from it (``recount``), with a few set-based UPDATEs.
+        """
+        course_id = Module.objects.filter(id=module_id).values_list('course_id', flat=True).first()
+        if course_id is None:
+            return
+
+        rollups = StudentModuleProgress.objects.filter(module_id=module_id)
+        if recount:
+            completed = StudentLessonProgress.objects.filter(
+                student_id=OuterRef('student_id'), lesson__module_id=module_id, completed_date__isnull=False
+            ).order_by().values('student_id').annotate(count=Count('id')).values('count')
+            rollups.update(completed_lessons=Coalesce(Subquery(completed), 0))
+
+        total = Lesson.objects.filter(module_id=module_id).count()
+        rollups.filter(completed=True, completed_lessons__lt=total).update(completed=False, completed_date=None)
+        rollups.filter(completed=False, completed_lessons__gte=total).update(
+            completed=True, completed_date=timezone.now()
+        )
+        CompletionRollupService.course_lessons_changed(course_id)
+
+    @staticmethod
+    @transaction.atomic
+    def course_lessons_changed(course_id):
+        """
+        Re-evaluate Enrollment.completed and StudentCourseHistory.completed for one course
+        against its current lesson total. Existing Enrollment.completed_date values are kept.
+        """
+        total = Lesson.objects.filter(module__course_id=course_id).count()
+        finished = StudentModuleProgress.objects.filter(course_id=course_id).values('student_id').annotate(
+            done=Sum('completed_lessons')
+        ).filter(done__gte=total).values('student_id')
+
+        Enrollment.objects.filter(course_id=course_id, completed=True).exclude(user_id__in=finished).update(
+            completed=False
+        )
+        StudentCourseHistory.objects.filter(course_id=course_id, completed=True).exclude(
+            user_id__in=finished
+        ).update(completed=False)
+
+        Enrollment.objects.filter(course_id=course_id, completed=False, user_id__in=finished).update(
+            completed=True, completed_date=Coalesce('completed_date', Value(timezone.now()))
+        )
+        StudentCourseHistory.objects.filter(course_id=course_id, completed=False, user_id__in=finished).update(
+            completed=True
+        )
+        StudentCourseHistory.objects.bulk_create([
+            StudentCourseHistory(user_id=student_id, course_id=course_id, completed=True)
+            for student_id in StudentModuleProgress.objects.filter(
+                course_id=course_id, student_id__in=finished
+            ).exclude(
+                student_id__in=StudentCourseHistory.objects.filter(course_id=course_id).values('user_id')
+            ).values_list('student_id', flat=True).distinct()
+        ])
+
+    @staticmethod
+    @transaction.atomic
+    def rebuild(course_ids=None):
+        """
+        Recompute every rollup (optionally only for some courses) from StudentLessonProgress.
+        """
+        progress = StudentLessonProgress.objects.filter(completed_date__isnull=False)
+        lessons = Lesson.objects.all()
+        rollups = StudentModuleProgress.objects.all()
+        enrollments = Enrollment.objects.all()
+        histories = StudentCourseHistory.objects.all()
+        if course_ids is not None:
+            progress = progress.filter(lesson__module__course_id__in=course_ids)
+            lessons = lessons.filter(module__course_id__in=course_ids)
+            rollups = rollups.filter(course_id__in=course_ids)
+            enrollments = enrollments.filter(course_id__in=course_ids)
+            histories = histories.filter(course_id__in=course_ids)
+
+        module_totals = dict(lessons.values_list('module_id').annotate(Count('id')))
+        course_totals = dict(lessons.values_list('module__course_id').annotate(Count('id')))
+
+        rows = progress.values('student_id', 'lesson__module_id', 'lesson__module__course_id').annotate(
+            completed_lessons=Count('id'), last_completed=Max('completed_date')
+        )
+        module_progress = []
+        course_completed = Counter()
+        course_last_completed = {}
+        for row in rows:
+            key = (row['student_id'], row['lesson__module__course_id'])
+            module_completed = row['completed_lessons'] >= module_totals.get(row['lesson__module_id'], 0)
+            module_progress.append(StudentModuleProgress(
+                student_id=row['student_id'],
+                module_id=row['lesson__module_id'],
+                course_id=row['lesson__module__course_id'],
+                completed_lessons=row['completed_lessons'],
+                completed=module_completed,
+                completed_date=row['last_completed'] if module_completed else None,
+            ))
+            course_completed[key] += row['completed_lessons']
+            course_last_completed[key] = max(
+                course_last_completed.get(key, row['last_completed']), row['last_completed']
+            )
+
+        rollups.delete()
+        StudentModuleProgress.objects.bulk_create(module_progress, batch_size=1000)
+
+        enrollments.update(completed=False)
+        histories.update(completed=False)
+        finished = [key for key, completed in course_completed.items() if completed >= course_totals.get(key[1], 0)]
+        for student_id, course_id in finished:
+            CompletionRollupService._mark_courses_completed(
+                student_id, [course_id], course_last_completed[(student_id, course_id)]
+            )
+        return len(module_progress), len(finished)
+
+
+class TeacherAnalyticsService:
+    """
+    Daily aggregate snapshots of every course funnel. Only refresh() touches the source tables;
+    the teacher dashboard reads CourseDailyStats and ModuleDailyStats alone.
+    """
+    PRE_TEST = 1
+    POST_TEST = 2
+
+    @staticmethod
+    @transaction.atomic
+    def refresh(date=None):
+        from tests.models import TestEnrollment
+        date = date or timezone.localdate()
+
+        enrolled = dict(Enrollment.objects.values_list('course_id').annotate(Count('id')))
+        completed = dict(
+            Enrollment.objects.filter(completed=True).values_list('course_id').annotate(Count('id'))
+        )
+        started = dict(
+            StudentLessonProgress.objects.values_list('course_id').annotate(Count('student_id', distinct=True))
+        )
+        scores = {
+            (row['course_id'], row['type']): row
+            for row in TestEnrollment.objects.filter(finished=True, total_questions__gt=0).values(
+                'course_id', 'type'
+            ).annotate(
+                takers=Count('id'),
+                average=Avg(Cast('correct_answers', FloatField()) * 100 / F('total_questions')),
+            )
+        }
+
+        course_stats = []
+        for course_id in Course.objects.values_list('id', flat=True):
+            pre = scores.get((course_id, TeacherAnalyticsService.PRE_TEST), {})
+            post = scores.get((course_id, TeacherAnalyticsService.POST_TEST), {})
+            course_stats.append(CourseDailyStats(
+                course_id=course_id,
+                date=date,
+                enrolled_count=enrolled.get(course_id, 0),
+                started_count=started.get(course_id, 0),
+                completed_count=completed.get(course_id, 0),
+                pre_test_count=pre.get('takers', 0),
+                pre_test_average=pre.get('average'),
+                post_test_count=post.get('takers', 0),
+                post_test_average=post.get('average'),
+            ))
+        CourseDailyStats.objects.bulk_create(
+            course_stats,
+            update_conflicts=True,
+            unique_fields=['course', 'date'],
+            update_fields=[
+                'enrolled_count', 'started_count', 'completed_count', 'pre_test_count', 'pre_test_average',
+                'post_test_count', 'post_test_average',
+            ],
+            batch_size=1000,
+        )
+
+        module_started = dict(
+            StudentLessonProgress.objects.values_list('lesson__module_id').annotate(
+                Count('student_id', distinct=True)
+            )
+        )
+        module_completed = dict(
+            StudentModuleProgress.objects.filter(completed=True).values_list('module_id').annotate(Count('id'))
+        )
+        ModuleDailyStats.objects.bulk_create(
+            [
+                ModuleDailyStats(
+                    module_id=module_id,
+                    course_id=course_id,
+                    date=date,
+                    started_count=module_started.get(module_id, 0),
+                    completed_count=module_completed.get(module_id, 0),
+                )
+                for module_id, course_id in Module.objects.values_list('id', 'course_id')
+            ],
+            update_conflicts=True,
+            unique_fields=['module', 'date'],
+            update_fields=['course', 'started_count', 'completed_count'],
+            batch_size=1000,
+        )
+        return len(course_stats)
+
+    @staticmethod
+    def get_dashboard(teacher, days=1):
+        """
+        The latest snapshot of each of the teacher's courses, with per-module completion
+        and up to ``days`` days of funnel history.
+        """
+        stats = CourseDailyStats.objects.filter(course__teacher=teacher)
+        latest = stats.aggregate(latest=Max('date'))['latest']
+        if latest is None:
+            return {'date': None, 'courses': []}
+
+        since = latest - timedelta(days=max(days, 1) - 1)
+        history = {}
+        for row in stats.filter(date__gte=since).select_related('course').order_by('course__title', '-date'):
+            history.setdefault(row.course_id, []).append(row)
+
+        modules = {}
+        for row in ModuleDailyStats.objects.filter(course__teacher=teacher, date=latest).select_related('module'):
+            modules.setdefault(row.course_id, []).append({
+                'module': row.module_id,
+                'title': row.module.title,
+                'started_count': row.started_count,
+                'completed_count': row.completed_count,
+            })
+
+        courses = []
+        for course_id, rows in history.items():
+            current = rows[0]
+            courses.append({
+                'course': course_id,
+                'title': current.course.title,
+                'date': current.date,
+                'enrolled_count': current.enrolled_count,
+                'started_count': current.started_count,
+                'completed_count': current.completed_count,
+                'pre_test': {'count': current.pre_test_count, 'average': current.pre_test_average},
+                'post_test': {'count': current.post_test_count, 'average': current.post_test_average},
+                'modules': sorted(modules.get(course_id, []), key=lambda module: module['title']),
+                'history': [
+                    {
+                        'date': row.date,
+                        'enrolled_count': row.enrolled_count,
+                        'started_count': row.started_count,
+                        'completed_count': row.completed_count,
+                    }
+                    for row in rows
+                ],
+            })
+        return {'date': latest, 'courses': courses}
+
+
+class CourseOutlineService:
+    @staticmethod
+    def get_queryset(student, include_descriptions=False):
+        """
+        Course -> modules -> lessons -> the student's progress, loaded in four queries.
+        """
+        lessons = Lesson.objects.prefetch_related(
+            Prefetch(
+                'student_progress',
+                queryset=StudentLessonProgress.objects.filter(student=student).only(
+                    'id', 'lesson_id', 'started_date', 'completed_date'
+                ),
+                to_attr='my_progress'
+            )
+        )
+        modules = Module.objects.all()
+        courses = Course.objects.all()
+
+        if not include_descriptions:
+            lessons = lessons.defer('description')
+            modules = modules.defer('description')
+            courses = courses.defer('description')
+
+        return courses.defer('search_vector').prefetch_related(
+            Prefetch('modules', queryset=modules.prefetch_related(Prefetch('lessons', queryset=lessons)))
+        )
 
 
 class StatsService:
+    ROLE_COUNTERS = {
+        'teacher': PlatformCounter.TEACHERS,
+        'student': PlatformCounter.STUDENTS,
+    }
+
     @staticmethod
     def get_statistics():
-        from django.contrib.auth import get_user_model
-        User = get_user_model()
-        courses_count = Course.objects.count()
-        teachers_count = User.objects.filter(role='teacher').count() or 0
-        students_count = User.objects.filter(role='student').count() or 0
+        counters = dict(PlatformCounter.objects.values_list('name', 'value'))
 
         return {
-            'courses_count': courses_count,
-            'teachers_count': teachers_count,
-            'students_count': students_count,
+            'courses_count': counters.get(PlatformCounter.COURSES, 0),
+            'teachers_count': counters.get(PlatformCounter.TEACHERS, 0),
+            'students_count': counters.get(PlatformCounter.STUDENTS, 0),
+        }
+
+    @staticmethod
+    def increment(name, delta=1):
+        if not name or not delta:
+            return
+        updated = PlatformCounter.objects.filter(name=name).update(value=F('value') + delta)
+        if not updated:
+            PlatformCounter.objects.get_or_create(name=name)
+            PlatformCounter.objects.filter(name=name).update(value=F('value') + delta)
+
+    @staticmethod
+    def role_counter(role):
+        return StatsService.ROLE_COUNTERS.get(role)
+
+    @staticmethod
+    def recount():
+        """
+        Recompute every counter from the source tables and return the drift that was fixed.
+        """
+        from django.contrib.auth import get_user_model
+        User = get_user_model()
+        actual = {
+            PlatformCounter.COURSES: Course.objects.count(),
+            PlatformCounter.TEACHERS: User.objects.filter(role='teacher').count(),
+            PlatformCounter.STUDENTS: User.objects.filter(role='student').count(),
         }
 
+        drift = {}
+        with transaction.atomic():
+            stored = dict(PlatformCounter.objects.select_for_update().values_list('name', 'value'))
+            for name, value in actual.items():
+                if stored.get(name) != value:
+                    drift[name] = value - stored.get(name, 0)
+                    PlatformCounter.objects.update_or_create(name=name, defaults={'value': value})
+        return drift
+
 
 class ChatService:
     @staticmethod
@@ -111,3 +868,62 @@ class ChatService:
             type=data.get('type', 1),
             reply=reply_message
         )
+
+
+class CourseSearchService:
+    """
+    Ranked course search: full-text plus trigram matching on PostgreSQL,
+    weighted substring matching on other backends (SQLite in tests).
+    """
+    TITLE_WEIGHT = 1.0
+    SHORT_DESCRIPTION_WEIGHT = 0.4
+    DESCRIPTION_WEIGHT = 0.2
+
+    @staticmethod
+    def search_vector():
+        return (
+            SearchVector('title', weight='A')
+            + SearchVector('short_description', weight='B')
+            + SearchVector('description', weight='C')
+        )
+
+    @staticmethod
+    def update_search_vector(course_ids):
+        if connection.vendor != 'postgresql':
+            return
+        Course.objects.filter(id__in=course_ids).update(search_vector=CourseSearchService.search_vector())
+
+    @staticmethod
+    def search(queryset, query):
+        query = query.strip()
+        if not query:
+            return queryset.none()
+        if connection.vendor == 'postgresql':
+            return CourseSearchService._search_postgres(queryset, query)
+        return CourseSearchService._search_fallback(queryset, query)
+
+    @staticmethod
+    def _search_postgres(queryset, query):
+        search_query = SearchQuery(query, search_type='websearch')
+        threshold = getattr(settings, 'COURSE_SEARCH_TRIGRAM_THRESHOLD', 0.3)
+        return queryset.annotate(
+            rank=SearchRank(F('search_vector'), search_query) + TrigramSimilarity('title', query),
+            similarity=TrigramSimilarity('title', query),
+        ).filter(
+            Q(search_vector=search_query) | Q(similarity__gt=threshold)
+        ).order_by('-rank', 'title')
+
+    @staticmethod
+    def _search_fallback(queryset, query):
+        rank = Value(0.0, output_field=FloatField())
+        matches = Q()
+        for term in query.split():
+            for field, weight in (
+                ('title', CourseSearchService.TITLE_WEIGHT),
+                ('short_description', CourseSearchService.SHORT_DESCRIPTION_WEIGHT),
+                ('description', CourseSearchService.DESCRIPTION_WEIGHT),
+            ):
+                lookup = Q(**{f'{field}__icontains': term})
+                matches |= lookup
+                rank = rank + Case(When(lookup, then=Value(weight)), default=Value(0.0), output_field=FloatField())
+        return queryset.filter(matches).annotate(rank=rank).order_by('-rank', 'title')
@@ -0,0 +1,94 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import DEFERRED, QuerySet
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from .cache import bump_catalog_version
+from .images import generate_derivatives_on_commit
+from .models import Course, Lesson, Module, PlatformCounter
+from .services import CompletionRollupService, CourseSearchService, StatsService
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+@receiver(post_save, sender=Module)
+@receiver(post_delete, sender=Module)
+@receiver(post_save, sender=Lesson)
+@receiver(post_delete, sender=Lesson)
+def invalidate_catalog_cache(sender, **kwargs):
+    # Bumping before commit would let a concurrent reader cache uncommitted data under the new version
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver(post_save, sender=Course)
+def update_course_search_vector(sender, instance, **kwargs):
+    CourseSearchService.update_search_vector([instance.id])
+
+
+@receiver(post_save, sender=Course)
+def generate_course_image_derivatives(sender, instance, raw=False, **kwargs):
+    if not raw and instance.image:
+        generate_derivatives_on_commit(instance.image)
+        # Cached catalog pages carry the srcset, which needs the width recorded by the derivatives
+        transaction.on_commit(bump_catalog_version)
+
+
+@receiver(post_save, sender=Course)
+def count_created_course(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        StatsService.increment(PlatformCounter.COURSES)
+
+
+@receiver(post_delete, sender=Course)
+def count_deleted_course(sender, instance, **kwargs):
+    StatsService.increment(PlatformCounter.COURSES, -1)
+
+
+@receiver(post_init, sender=settings.AUTH_USER_MODEL)
+def remember_user_role(sender, instance, **kwargs):
+    instance._counted_role = instance.__dict__.get('role', DEFERRED)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def count_saved_user(sender, instance, created, raw=False, **kwargs):
+    previous = None if created else instance._counted_role
+    if raw or previous is DEFERRED:
+        return
+    if previous != instance.role:
+        StatsService.increment(StatsService.role_counter(previous), -1)
+        StatsService.increment(StatsService.role_counter(instance.role))
+    instance._counted_role = instance.role
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def count_deleted_user(sender, instance, **kwargs):
+    StatsService.increment(StatsService.role_counter(instance.__dict__.get('role')), -1)
+
+
+@receiver(post_save, sender=Lesson)
+def update_rollups_for_new_lesson(sender, instance, created, raw=False, **kwargs):
+    # A new lesson can turn completed modules and courses back into incomplete ones
+    if created and not raw:
+        module_id = instance.module_id
+        transaction.on_commit(lambda: CompletionRollupService.module_lessons_changed(module_id))
+
+
+def _deleted_directly(model, origin):
+    # Cascades from a module or course delete are handled by the receiver of that delete
+    origin_model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return origin is None or origin_model is model
+
+
+@receiver(post_delete, sender=Lesson)
+def update_rollups_for_deleted_lesson(sender, instance, origin=None, **kwargs):
+    if _deleted_directly(Lesson, origin):
+        module_id = instance.module_id
+        transaction.on_commit(lambda: CompletionRollupService.module_lessons_changed(module_id, recount=True))
+
+
+@receiver(post_delete, sender=Module)
+def update_rollups_for_deleted_module(sender, instance, origin=None, **kwargs):
+    if _deleted_directly(Module, origin):
+        course_id = instance.course_id
+        transaction.on_commit(lambda: CompletionRollupService.course_lessons_changed(course_id))
@@ -0,0 +1,110 @@
+import os
+import threading
+from collections import namedtuple
+from io import BytesIO
+
+from django.conf import settings
+from docxtpl import DocxTemplate
+from jinja2 import Environment
+from pptx import Presentation
+
+# ``cache`` holds derived data (patched XML, compiled Jinja templates) for this version of the file
+TemplateEntry = namedtuple('TemplateEntry', 'path data mtime_ns size cache')
+
+
+class CachingEnvironment(Environment):
+    """
+    Jinja environment that compiles each distinct template source only once.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._compiled = {}
+
+    def from_string(self, source, globals=None, template_class=None):
+        if globals is not None or template_class is not None:
+            return super().from_string(source, globals, template_class)
+        template = self._compiled.get(source)
+        if template is None:
+            template = self._compiled[source] = super().from_string(source)
+        return template
+
+
+class CachedDocxTemplate(DocxTemplate):
+    """
+    DocxTemplate that shares XML patching and Jinja compilation with every other render of
+    the same template version. Only the per-render work (context rendering, re-parsing the
+    result) is repeated.
+    """
+
+    def __init__(self, template_file, cache):
+        super().__init__(template_file)
+        self._cache = cache
+
+    def patch_xml(self, src_xml):
+        patched = self._cache.setdefault('patched_xml', {})
+        if src_xml not in patched:
+            patched[src_xml] = super().patch_xml(src_xml)
+        return patched[src_xml]
+
+    def render(self, context, jinja_env=None, autoescape=False):
+        if jinja_env is None:
+            jinja_env = self._cache.get(('jinja_env', autoescape))
+            if jinja_env is None:
+                jinja_env = self._cache.setdefault(('jinja_env', autoescape), CachingEnvironment(autoescape=autoescape))
+        return super().render(context, jinja_env, autoescape)
+
+
+class TemplateRegistry:
+    """
+    In-memory cache of document templates.
+
+    Relative paths are resolved from BASE_DIR, so rendering doesn't depend on the working
+    directory. A template's bytes are read once and re-read only when the file's mtime or
+    size changes; every render parses its own copy from memory, so concurrent renders
+    never share a mutable document.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def resolve(path):
+        return os.path.normpath(os.path.join(settings.BASE_DIR, path))
+
+    def get(self, path):
+        """
+        Return the current TemplateEntry for ``path``. Raises FileNotFoundError if it doesn't exist.
+        """
+        resolved = self.resolve(path)
+        stat = os.stat(resolved)
+        entry = self._entries.get(resolved)
+        if entry is not None and (entry.mtime_ns, entry.size) == (stat.st_mtime_ns, stat.st_size):
+            return entry
+
+        with self._lock:
+            entry = self._entries.get(resolved)
+            if entry is None or (entry.mtime_ns, entry.size) != (stat.st_mtime_ns, stat.st_size):
+                with open(resolved, 'rb') as f:
+                    data = f.read()
+                entry = TemplateEntry(resolved, data, stat.st_mtime_ns, stat.st_size, {})
+                self._entries[resolved] = entry
+        return entry
+
+    def open(self, path):
+        return BytesIO(self.get(path).data)
+
+    def docx(self, path):
+        entry = self.get(path)
+        return CachedDocxTemplate(BytesIO(entry.data), entry.cache)
+
+    def presentation(self, path):
+        return Presentation(self.open(path))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+template_registry = TemplateRegistry()
@@ -1,3 +1,1404 @@
-from django.test import TestCase
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.http import Http404
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.urls import reverse
+from docxtpl import DocxTemplate
+from PIL import Image
+from pptx import Presentation
+from rest_framework.test import APIClient
+
+from .cache import get_catalog_cache, get_catalog_version
+from .converters import ConversionError, FakeConverter, SofficeListener, SofficePoolConverter, get_converter
+from .documents import attach_document, store_document
+from .images import derivative_name, derivative_names
+from .media import serve_media
+from tests.models import TestEnrollment
+from tests.utils import generate_certificate
+from .models import (
+    ChatMessage, ContractJob, Course, CourseDailyStats, Enrollment, Lesson, Module, PlatformCounter,
+    StoredDocument, StudentCourseHistory, StudentLessonProgress, StudentModuleProgress
+)
+from .progress_buffer import ProgressEventBuffer
+from .services import ContractJobService, StatsService, StudentLessonProgressService, TeacherAnalyticsService
+from .template_registry import TemplateRegistry
+from .utils import convert_docx_to_pdf
+
+User = get_user_model()
+
+
+class CourseTestMixin:
+    def setUp(self):
+        self.teacher = User.objects.create_user(
+            username='teacher', email='teacher@example.com', password='password', role=User.TEACHER
+        )
+        self.student = User.objects.create_user(
+            username='student', email='student@example.com', password='password'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def make_image(self, name='cover.jpg', size=(1200, 800)):
+        image_format = 'PNG' if name.endswith('.png') else 'JPEG'
+        buffer = BytesIO()
+        Image.new('RGB', size, 'navy').save(buffer, image_format)
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type=f'image/{image_format.lower()}')
+
+    def create_course(self, title, **kwargs):
+        kwargs.setdefault('description', f'<p>{title}</p>')
+        kwargs.setdefault('short_description', title)
+        kwargs.setdefault('price', 100)
+        return Course.objects.create(title=title, teacher=self.teacher, **kwargs)
+
+
+class CourseListViewTests(CourseTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.courses = [self.create_course(f'Course {i}') for i in range(10)]
+        Enrollment.objects.create(user=self.student, course=self.courses[0], has_access=True)
+        Enrollment.objects.create(user=self.student, course=self.courses[1], has_access=False)
+
+    def test_has_access_resolved_per_user(self):
+        response = self.client.get(reverse('course_list'))
+
+        self.assertEqual(response.status_code, 200)
+        access = {item['id']: item['has_access'] for item in response.data['results']}
+        self.assertTrue(access[self.courses[0].id])
+        self.assertFalse(access[self.courses[1].id])
+        self.assertFalse(access[self.courses[2].id])
+
+    def test_query_count_does_not_grow_with_page_size(self):
+        # One COUNT for the paginator and one SELECT carrying the access flags
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('course_list'))
+
+        self.assertEqual(len(response.data['results']), 10)
+
+
+class CatalogCacheTests(CourseTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        get_catalog_cache().clear()
+        self.course = self.create_course('Python')
+
+    def test_repeated_requests_are_served_from_cache(self):
+        self.client.get(reverse('courses_all'))
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('courses_all'))
+
+        self.assertEqual(response.data['count'], 1)
+
+    def test_content_changes_bump_catalog_version(self):
+        version = get_catalog_version()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            module = Module.objects.create(course=self.course, title='Basics')
+        self.assertEqual(get_catalog_version(), version + 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Lesson.objects.create(module=module, title='Variables', description='...')
+        self.assertEqual(get_catalog_version(), version + 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            module.delete()
+        self.assertGreater(get_catalog_version(), version + 2)
+
+    def test_catalog_version_is_bumped_only_after_commit(self):
+        version = get_catalog_version()
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            Module.objects.create(course=self.course, title='Basics')
+            self.assertEqual(get_catalog_version(), version)
+
+        self.assertEqual(len(callbacks), 1)
+        callbacks[0]()
+        self.assertEqual(get_catalog_version(), version + 1)
+
+    def test_cached_pages_are_never_stale(self):
+        self.client.get(reverse('course_detail', args=[self.course.id]))
+
+        self.course.title = 'Advanced Python'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.course.save()
+
+        response = self.client.get(reverse('course_detail', args=[self.course.id]))
+        self.assertEqual(response.data['title'], 'Advanced Python')
+
+
+class CourseSearchViewTests(CourseTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.django = self.create_course('Django for beginners', short_description='Build web apps')
+        self.web = self.create_course('Web design', short_description='Layouts', description='<p>Uses Django templates</p>')
+        self.create_course('Photography', short_description='Cameras')
+
+    def test_results_are_ranked_across_text_fields(self):
+        response = self.client.get(reverse('course_search'), {'q': 'django'})
+
+        self.assertEqual(response.status_code, 200)
+        ids = [item['id'] for item in response.data['results']]
+        self.assertEqual(ids, [self.django.id, self.web.id])
+        self.assertGreater(response.data['results'][0]['rank'], response.data['results'][1]['rank'])
+
+    def test_empty_query_returns_nothing(self):
+        response = self.client.get(reverse('course_search'), {'q': ' '})
+
+        self.assertEqual(response.data['count'], 0)
+
+
+class ChatListViewTests(CourseTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.module = Module.objects.create(course=self.create_course('Python'), title='Basics')
+        start = timezone.now()
+        messages = ChatMessage.objects.bulk_create(
+            [ChatMessage(module=self.module, user=self.student, message=str(i), type=1) for i in range(60)]
+        )
+        for index, message in enumerate(messages):
+            message.date = start + timedelta(minutes=index)
+        ChatMessage.objects.bulk_update(messages, ['date'])
+
+    def test_deep_pages_use_keyset_queries(self):
+        url = f"{reverse('chat-list', args=[self.module.id])}?page_size=5"
+        received = []
+        query_counts = set()
+
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            received += [item['message'] for item in response.data['results']]
+            query_counts.add(len(queries))
+            sql = ' '.join(query['sql'] for query in queries).upper()
+            self.assertNotIn('COUNT(', sql)
+            self.assertNotIn('OFFSET', sql)
+            url = response.data['next']
+
+        self.assertEqual(received, [str(i) for i in range(60)])
+        self.assertEqual(len(query_counts), 1)
+
+
+class CourseOutlineViewTests(CourseTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.course = self.create_course('Python')
+        self.lessons = []
+        for module_index in range(3):
+            module = Module.objects.create(course=self.course, title=f'Module {module_index}')
+            for lesson_index in range(4):
+                self.lessons.append(
+                    Lesson.objects.create(module=module, title=f'Lesson {lesson_index}', description='<p>Long</p>')
+                )
+        self.progress = StudentLessonProgress.objects.create(
+            student=self.student, course=self.course, lesson=self.lessons[0],
+            started_date=timezone.now(), completed_date=timezone.now()
+        )
+        other = User.objects.create_user(username='other', email='other@example.com')
+        StudentLessonProgress.objects.create(
+            student=other, course=self.course, lesson=self.lessons[1], started_date=timezone.now()
+        )
+
+    def test_outline_is_loaded_in_fixed_number_of_queries(self):
+        # course, modules, lessons and the caller's progress
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('course_outline', args=[self.course.id]))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['modules']), 3)
+        self.assertEqual(sum(len(module['lessons']) for module in response.data['modules']), 12)
+
+    def test_progress_dates_belong_to_caller(self):
+        response = self.client.get(reverse('course_outline', args=[self.course.id]))
+
+        lessons = {lesson['id']: lesson for module in response.data['modules'] for lesson in module['lessons']}
+        self.assertIsNotNone(lessons[self.lessons[0].id]['completed_date'])
+        self.assertIsNone(lessons[self.lessons[1].id]['started_date'])
+
+    def test_descriptions_are_optional(self):
+        response = self.client.get(reverse('course_outline', args=[self.course.id]))
+        self.assertNotIn('description', response.data)
+        self.assertNotIn('description', response.data['modules'][0]['lessons'][0])
+
+        response = self.client.get(reverse('course_outline', args=[self.course.id]), {'include_descriptions': 'true'})
+        self.assertEqual(response.data['modules'][0]['lessons'][0]['description'], '<p>Long</p>')
+
+
+class ConditionalGetTests(CourseTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        get_catalog_cache().clear()
+        self.course = self.create_course('Python')
+        self.module = Module.objects.create(course=self.course, title='Basics')
+        self.lesson = Lesson.objects.create(module=self.module, title='Variables', description='...')
+
+    def test_unchanged_lesson_returns_not_modified(self):
+        url = reverse('lesson_detail', args=[self.lesson.id])
+        etag = self.client.get(url)['ETag']
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.lesson.title = 'Loops'
+        self.lesson.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_course_detail_honours_if_modified_since(self):
+        url = reverse('course_detail', args=[self.course.id])
+        last_modified = self.client.get(url)['Last-Modified']
+
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_list_etag_changes_when_a_row_is_deleted(self):
+        url = reverse('lesson_list_by_module')
+        other = Lesson.objects.create(module=self.module, title='Functions', description='...')
+        etag = self.client.get(url, {'module_id': self.module.id})['ETag']
+
+        self.assertEqual(self.client.get(url, {'module_id': self.module.id}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        other.delete()
+        self.assertEqual(self.client.get(url, {'module_id': self.module.id}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class StatsCounterTests(CourseTestMixin, TestCase):
+    def test_counters_follow_users_and_courses(self):
+        course = self.create_course('Python')
+        User.objects.create_user(username='second', email='second@example.com')
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('stats'))
+        self.assertEqual(response.data, {'courses_count': 1, 'teachers_count': 1, 'students_count': 2})
+
+        self.student.role = User.TEACHER
+        self.student.save()
+        course.delete()
+        self.assertEqual(
+            StatsService.get_statistics(), {'courses_count': 0, 'teachers_count': 2, 'students_count': 1}
+        )
+
+    def test_reconcile_command_fixes_drift(self):
+        self.create_course('Python')
+        PlatformCounter.objects.filter(name=PlatformCounter.STUDENTS).update(value=42)
+
+        call_command('reconcile_stats_counters', stdout=StringIO())
+
+        self.assertEqual(
+            StatsService.get_statistics(), {'courses_count': 1, 'teachers_count': 1, 'students_count': 1}
+        )
+
+
+class ImageDerivativeTests(CourseTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        get_catalog_cache().clear()
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def create_course_with_image(self, title='Python', **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.create_course(title, image=self.make_image(**kwargs))
+
+    def test_thumbnails_are_generated_on_save(self):
+        course = self.create_course_with_image()
+
+        for image_format, names in derivative_names(course.image.name).items():
+            for width, name in names.items():
+                self.assertTrue(course.image.storage.exists(name))
+                with course.image.storage.open(name) as derivative:
+                    image = Image.open(derivative)
+                    self.assertEqual(image.format, image_format)
+                    self.assertEqual(image.width, width)
+
+    def test_thumbnails_are_generated_only_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            course = self.create_course('Python', image=self.make_image())
+
+        name = derivative_names(course.image.name)['WEBP'][160]
+        self.assertFalse(course.image.storage.exists(name))
+        for callback in callbacks:
+            callback()
+        self.assertTrue(course.image.storage.exists(name))
+
+    def test_sources_with_the_same_stem_get_separate_derivatives(self):
+        jpeg = self.create_course_with_image('Python', name='cover.jpg')
+        png = self.create_course_with_image('Django', name='cover.png')
+
+        self.assertNotEqual(
+            derivative_names(jpeg.image.name)['WEBP'][160], derivative_names(png.image.name)['WEBP'][160]
+        )
+
+    def test_narrow_images_are_not_labelled_with_larger_widths(self):
+        course = self.create_course_with_image(size=(400, 300))
+
+        image = self.client.get(reverse('courses_all')).data['results'][0]['image']
+
+        self.assertEqual(set(image['srcset']), {'160w', '320w'})
+        self.assertFalse(course.image.storage.exists(derivative_name(course.image.name, 640, 'WEBP')))
+
+    def test_unreadable_upload_does_not_fail_the_save(self):
+        upload = SimpleUploadedFile('cover.jpg', b'not an image', content_type='image/jpeg')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            course = self.create_course('Python', image=upload)
+
+        self.assertTrue(Course.objects.filter(id=course.id).exists())
+        self.assertEqual(derivative_names(course.image.name, 0)['WEBP'], {})
+
+    def test_serializer_exposes_srcset(self):
+        self.create_course_with_image()
+
+        image = self.client.get(reverse('courses_all')).data['results'][0]['image']
+
+        self.assertEqual(set(image['srcset']), {'160w', '320w', '640w'})
+        self.assertTrue(image['webp']['320w'].endswith('_jpg_320w.webp'))
+
+    def test_srcset_is_built_from_the_recorded_width_without_storage_access(self):
+        course = self.create_course_with_image(size=(400, 300))
+        self.assertEqual(Course.objects.get(id=course.id).image_width, 400)
+
+        with mock.patch.object(FileSystemStorage, 'open', side_effect=AssertionError('storage read')), \
+                mock.patch.object(FileSystemStorage, 'exists', side_effect=AssertionError('storage read')):
+            image = self.client.get(reverse('courses_all')).data['results'][0]['image']
+
+        self.assertEqual(set(image['srcset']), {'160w', '320w'})
+
+    def test_srcset_is_empty_until_derivatives_exist(self):
+        with self.captureOnCommitCallbacks():
+            self.create_course('Python', image=self.make_image())
+
+        image = self.client.get(reverse('courses_all')).data['results'][0]['image']
+
+        self.assertEqual((image['srcset'], image['webp']), ({}, {}))
+
+    def test_backfill_command_records_missing_widths(self):
+        course = self.create_course_with_image()
+        Course.objects.filter(id=course.id).update(image_width=None)
+
+        call_command('generate_image_derivatives', stdout=StringIO())
+
+        self.assertEqual(Course.objects.get(id=course.id).image_width, 1200)
+
+    def test_backfill_command_regenerates_missing_derivatives(self):
+        course = self.create_course_with_image()
+        missing = derivative_names(course.image.name)['WEBP'][160]
+        course.image.storage.delete(missing)
+
+        call_command('generate_image_derivatives', stdout=StringIO())
+
+        self.assertTrue(course.image.storage.exists(missing))
+
+
+class LessonFileViewTests(CourseTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.content = bytes(range(256)) * 40
+        self.course = self.create_course('Python')
+        module = Module.objects.create(course=self.course, title='Basics')
+        self.lesson = Lesson.objects.create(
+            module=module, title='Variables', description='...',
+            pdf=SimpleUploadedFile('slides.pdf', self.content, content_type='application/pdf')
+        )
+        self.url = reverse('lesson_file', args=[self.lesson.id, 'pdf'])
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def test_requires_enrollment_with_access(self):
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+        Enrollment.objects.create(user=self.student, course=self.course, has_access=True)
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+
+    def test_byte_ranges(self):
+        Enrollment.objects.create(user=self.student, course=self.course, has_access=True)
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(self.content)}')
+        self.assertEqual(b''.join(response.streaming_content), self.content[100:200])
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-10')
+        self.assertEqual(b''.join(response.streaming_content), self.content[-10:])
+
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={len(self.content)}-')
+        self.assertEqual(response.status_code, 416)
+
+    @override_settings(PROTECTED_MEDIA_SERVER='nginx')
+    def test_offloads_to_front_server(self):
+        Enrollment.objects.create(user=self.student, course=self.course, has_access=True)
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.lesson.pdf.name}')
+        self.assertEqual(response.content, b'')
+
+    def test_serializers_link_to_the_protected_view(self):
+        Enrollment.objects.create(user=self.student, course=self.course, has_access=True)
+        expected = f'http://testserver{self.url}'
+
+        lesson = self.client.get(reverse('lesson_detail', args=[self.lesson.id])).data
+        self.assertEqual(lesson['pdf'], expected)
+        self.assertIsNone(lesson['presentation'])
+
+        lessons = self.client.get(reverse('lesson_list_by_module'), {'module_id': self.lesson.module_id}).data
+        self.assertEqual(lessons['results'][0]['pdf'], expected)
+
+        outline = self.client.get(reverse('course_outline', args=[self.course.id])).data
+        self.assertEqual(outline['modules'][0]['lessons'][0]['pdf'], expected)
+
+    def test_protected_files_are_not_served_from_media_url(self):
+        request = RequestFactory().get(f'/media/{self.lesson.pdf.name}')
+
+        with self.assertRaises(Http404):
+            serve_media(request, self.lesson.pdf.name, document_root=self.media_root)
+        with self.assertRaises(Http404):
+            serve_media(request, f'course_images/../{self.lesson.pdf.name}', document_root=self.media_root)
+
+
+class LessonProgressSnapshotViewTests(CourseTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.course = self.create_course('Python')
+        self.modules = [Module.objects.create(course=self.course, title=f'Module {i}') for i in range(2)]
+        self.lessons = [
+            Lesson.objects.create(module=module, title=f'Lesson {i}', description='...')
+            for module in self.modules for i in range(4)
+        ]
+        now = timezone.now()
+        StudentLessonProgress.objects.create(
+            student=self.student, course=self.course, lesson=self.lessons[0], started_date=now, completed_date=now
+        )
+        StudentLessonProgress.objects.create(
+            student=self.student, course=self.course, lesson=self.lessons[1], started_date=now
+        )
+        other = User.objects.create_user(username='other', email='other@example.com')
+        StudentLessonProgress.objects.create(
+            student=other, course=self.course, lesson=self.lessons[2], started_date=now, completed_date=now
+        )
+
+    def test_module_snapshot_in_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('lesson_progress_snapshot'), {'module_id': self.modules[0].id})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total_lessons'], 4)
+        self.assertEqual(response.data['started_lessons'], 2)
+        self.assertEqual(response.data['completed_lessons'], 1)
+        self.assertEqual(response.data['completion_percentage'], 25)
+        lessons = {lesson['lesson']: lesson for lesson in response.data['lessons']}
+        self.assertIsNone(lessons[self.lessons[1].id]['completed_date'])
+        self.assertIsNone(lessons[self.lessons[2].id]['started_date'])
+
+    def test_snapshot_joins_only_the_students_own_progress(self):
+        now = timezone.now()
+        for i in range(3):
+            classmate = User.objects.create_user(username=f'classmate{i}', email=f'classmate{i}@example.com')
+            StudentLessonProgress.objects.bulk_create([
+                StudentLessonProgress(student=classmate, course=self.course, lesson=lesson, started_date=now)
+                for lesson in self.lessons
+            ])
+
+        with CaptureQueriesContext(connection) as queries:
+            snapshot = StudentLessonProgressService.get_snapshot(self.student, course_id=self.course.id)
+
+        self.assertEqual(snapshot['started_lessons'], 2)
+        sql = queries.captured_queries[0]['sql']
+        join = sql[sql.index('LEFT OUTER JOIN'):sql.index('WHERE')]
+        self.assertIn('student_id', join)
+        self.assertNotIn('GROUP BY', sql)
+
+    def test_course_snapshot_breaks_down_per_module(self):
+        response = self.client.get(reverse('lesson_progress_snapshot'), {'course_id': self.course.id})
+
+        self.assertEqual(response.data['total_lessons'], 8)
+        self.assertEqual(response.data['completion_percentage'], 12.5)
+        self.assertEqual(
+            {module['module']: module['completion_percentage'] for module in response.data['modules']},
+            {self.modules[0].id: 25, self.modules[1].id: 0},
+        )
+
+    def test_requires_scope(self):
+        self.assertEqual(self.client.get(reverse('lesson_progress_snapshot')).status_code, 400)
+
+    def test_rejects_non_integer_ids(self):
+        for params in ({'module_id': 'abc'}, {'course_id': '1.5'}, {'module_id': self.modules[0].id, 'course_id': 'x'}):
+            response = self.client.get(reverse('lesson_progress_snapshot'), params)
+            self.assertEqual(response.status_code, 400, params)
+
+
+class LessonProgressEventsViewTests(CourseTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.course = self.create_course('Python')
+        module = Module.objects.create(course=self.course, title='Basics')
+        self.lessons = [Lesson.objects.create(module=module, title=f'Lesson {i}', description='...') for i in range(30)]
+
+    def post_events(self, events):
+        return self.client.post(reverse('lesson_progress_events'), {'events': events}, format='json')
+
+    def test_events_are_applied_with_a_status_each(self):
+        StudentLessonProgress.objects.create(
+            student=self.student, course=self.course, lesson=self.lessons[0], started_date=timezone.now()
+        )
+        started_at = timezone.now() - timedelta(hours=1)
+
+        response = self.post_events([
+            {'lesson': self.lessons[0].id, 'type': 'start'},
+            {'lesson': self.lessons[1].id, 'type': 'start', 'timestamp': started_at.isoformat()},
+            {'lesson': self.lessons[1].id, 'type': 'finish'},
+            {'lesson': self.lessons[1].id, 'type': 'finish'},
+            {'lesson': self.lessons[2].id, 'type': 'finish'},
+            {'lesson': 0, 'type': 'start'},
+            {'lesson': self.lessons[3].id, 'type': 'pause'},
+        ])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [result['status'] for result in response.data['results']],
+            ['already_started', 'started', 'completed', 'already_completed', 'completed', 'lesson_not_found', 'invalid'],
+        )
+        progress = StudentLessonProgress.objects.get(student=self.student, lesson=self.lessons[1])
+        self.assertEqual(progress.started_date, started_at)
+        self.assertIsNotNone(progress.completed_date)
+        self.assertEqual(progress.course, self.course)
+        self.assertIsNotNone(StudentLessonProgress.objects.get(lesson=self.lessons[2]).started_date)
+
+    def test_query_count_is_independent_of_batch_size(self):
+        counts = []
+        for lessons in (self.lessons[:3], self.lessons[3:]):
+            events = [{'lesson': lesson.id, 'type': kind} for lesson in lessons for kind in ('start', 'finish')]
+            with CaptureQueriesContext(connection) as queries:
+                self.post_events(events)
+            counts.append(len(queries))
+
+        self.assertEqual(counts[0], counts[1])
+        self.assertEqual(StudentLessonProgress.objects.filter(completed_date__isnull=False).count(), 30)
+
+
+class StudentLessonProgressUpsertTests(CourseTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.course = self.create_course('Python')
+        module = Module.objects.create(course=self.course, title='Basics')
+        self.lesson = Lesson.objects.create(module=module, title='Variables', description='...')
+
+    def test_start_is_one_statement_and_fills_course(self):
+        with self.assertNumQueries(1):
+            response = self.client.post(reverse('start_lesson', args=[self.lesson.id]))
+
+        self.assertEqual(response.data['lesson_title'], 'Variables')
+        progress = StudentLessonProgress.objects.get(student=self.student, lesson=self.lesson)
+        self.assertEqual(progress.course, self.course)
+        self.assertEqual(progress.started_date, response.data['started_date'])
+
+        response = self.client.post(reverse('start_lesson', args=[self.lesson.id]))
+        self.assertEqual(response.data['message'], 'Lesson already started.')
+        self.assertEqual(StudentLessonProgress.objects.get(pk=progress.pk).started_date, progress.started_date)
+
+    def test_finish_keeps_start_date_and_is_idempotent(self):
+        self.client.post(reverse('start_lesson', args=[self.lesson.id]))
+        started_date = StudentLessonProgress.objects.get().started_date
+
+        with self.assertNumQueries(1):
+            response = self.client.post(reverse('finish_lesson', args=[self.lesson.id]))
+        self.assertEqual(response.data['progress'], 'completed')
+
+        response = self.client.post(reverse('finish_lesson', args=[self.lesson.id]))
+        self.assertEqual(response.data['message'], 'Lesson already completed.')
+
+        progress = StudentLessonProgress.objects.get()
+        self.assertEqual(progress.started_date, started_date)
+        self.assertIsNotNone(progress.completed_date)
+
+    def test_finish_without_start_creates_progress(self):
+        self.client.post(reverse('finish_lesson', args=[self.lesson.id]))
+
+        progress = StudentLessonProgress.objects.get()
+        self.assertEqual(progress.started_date, progress.completed_date)
+
+    def test_unknown_lesson(self):
+        response = self.client.post(reverse('start_lesson', args=[self.lesson.id + 100]))
+
+        self.assertEqual(response.status_code, 404)
+
+
+class CompletionRollupTests(CourseTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.courses = [self.create_course(f'Course {i}') for i in range(2)]
+        self.modules = [
+            Module.objects.create(course=course, title=f'Module {i}') for course in self.courses for i in range(2)
+        ]
+        self.lessons = [
+            Lesson.objects.create(module=module, title=f'Lesson {i}', description='...')
+            for module in self.modules for i in range(3)
+        ]
+        self.students = [self.student] + [
+            User.objects.create_user(username=f'student{i}', email=f'student{i}@example.com') for i in range(3)
+        ]
+        for student in self.students:
+            for course in self.courses:
+                Enrollment.objects.create(user=student, course=course, has_access=True)
+
+    def snapshot(self):
+        return (
+            set(StudentModuleProgress.objects.values_list('student_id', 'module_id', 'completed_lessons', 'completed')),
+            set(Enrollment.objects.values_list('user_id', 'course_id', 'completed')),
+            set(StudentCourseHistory.objects.filter(completed=True).values_list('user_id', 'course_id')),
+        )
+
+    def finish(self, student, lessons):
+        with self.captureOnCommitCallbacks(execute=True):
+            for lesson in lessons:
+                StudentLessonProgressService.finish_lesson(student, lesson.id)
+
+    def apply_events(self, student, events):
+        with self.captureOnCommitCallbacks(execute=True):
+            StudentLessonProgressService.apply_events(student, events)
+
+    def test_finishing_every_lesson_completes_module_and_course(self):
+        self.finish(self.student, self.lessons[:3])
+
+        self.assertTrue(StudentModuleProgress.objects.get(student=self.student, module=self.modules[0]).completed)
+        self.assertFalse(Enrollment.objects.get(user=self.student, course=self.courses[0]).completed)
+
+        self.finish(self.student, self.lessons[3:6])
+
+        enrollment = Enrollment.objects.get(user=self.student, course=self.courses[0])
+        self.assertTrue(enrollment.completed)
+        self.assertIsNotNone(enrollment.completed_date)
+        self.assertTrue(StudentCourseHistory.objects.get(user=self.student, course=self.courses[0]).completed)
+
+    def test_rollups_run_after_commit_within_their_query_budget(self):
+        self.finish(self.student, self.lessons[:5])
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            with self.assertNumQueries(1):
+                StudentLessonProgressService.finish_lesson(self.student, self.lessons[5].id)
+        self.assertEqual(len(callbacks), 1)
+
+        # Lesson lookup; module rollup insert, increment, totals, read and completion; course totals
+        # and progress; enrollment update; history read and insert; plus the savepoint and its release.
+        # The count depends on neither the number of students nor the number of lessons.
+        with self.assertNumQueries(13):
+            callbacks[0]()
+        self.assertTrue(Enrollment.objects.get(user=self.student, course=self.courses[0]).completed)
+
+    def test_incremental_rollups_match_full_recompute(self):
+        finished = {
+            self.students[0]: self.lessons,
+            self.students[1]: self.lessons[:6],
+            self.students[2]: self.lessons[::2],
+        }
+        for student, lessons in finished.items():
+            events = [{'lesson': lesson.id, 'type': 'finish'} for lesson in lessons[1::2]]
+            self.apply_events(student, events)
+            self.finish(student, lessons[::2])
+            # Retries must not double count
+            self.apply_events(student, events)
+
+        incremental = self.snapshot()
+        StudentModuleProgress.objects.all().delete()
+        Enrollment.objects.update(completed=False)
+        StudentCourseHistory.objects.all().delete()
+        call_command('rebuild_completion_rollups', stdout=StringIO())
+
+        self.assertEqual(self.snapshot(), incremental)
+
+    def test_overlapping_batches_count_a_completion_once(self):
+        lesson = self.lessons[0]
+        events = [{'lesson': lesson.id, 'type': 'start'}, {'lesson': lesson.id, 'type': 'finish'}]
+        bulk_upsert = StudentLessonProgressService._bulk_upsert
+        overlapping = []
+
+        def upsert_after_other_batch(sql, rows):
+            # A retry of the same batch commits between this batch's lookup and its writes
+            if not overlapping:
+                overlapping.append(None)
+                overlapping[0] = StudentLessonProgressService.apply_events(self.student, events)
+            return bulk_upsert(sql, rows)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with mock.patch.object(StudentLessonProgressService, '_bulk_upsert', side_effect=upsert_after_other_batch):
+                statuses = StudentLessonProgressService.apply_events(self.student, events)
+
+        self.assertEqual(overlapping, [['started', 'completed']])
+        self.assertEqual(statuses, ['already_started', 'already_completed'])
+        self.assertEqual(
+            StudentModuleProgress.objects.get(student=self.student, module=self.modules[0]).completed_lessons, 1
+        )
+
+    def test_new_lesson_reopens_completed_module_and_keeps_completion_date(self):
+        self.finish(self.student, self.lessons[:6])
+        completed_date = Enrollment.objects.get(user=self.student, course=self.courses[0]).completed_date
+
+        with self.captureOnCommitCallbacks(execute=True):
+            extra = Lesson.objects.create(module=self.modules[0], title='Extra', description='...')
+
+        self.assertFalse(StudentModuleProgress.objects.get(student=self.student, module=self.modules[0]).completed)
+        enrollment = Enrollment.objects.get(user=self.student, course=self.courses[0])
+        self.assertFalse(enrollment.completed)
+        self.assertEqual(enrollment.completed_date, completed_date)
+        self.assertFalse(StudentCourseHistory.objects.get(user=self.student, course=self.courses[0]).completed)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            extra.delete()
+
+        enrollment = Enrollment.objects.get(user=self.student, course=self.courses[0])
+        self.assertTrue(enrollment.completed)
+        self.assertEqual(enrollment.completed_date, completed_date)
+
+    def test_deleting_the_last_unfinished_lesson_completes_module_and_course(self):
+        self.finish(self.students[1], self.lessons[:5])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lessons[2].delete()
+
+        rollup = StudentModuleProgress.objects.get(student=self.students[1], module=self.modules[0])
+        self.assertEqual(rollup.completed_lessons, 2)
+        self.assertTrue(rollup.completed)
+        self.assertFalse(Enrollment.objects.get(user=self.students[1], course=self.courses[0]).completed)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lessons[5].delete()
+
+        self.assertTrue(Enrollment.objects.get(user=self.students[1], course=self.courses[0]).completed)
+        self.assertTrue(StudentCourseHistory.objects.get(user=self.students[1], course=self.courses[0]).completed)
+        self.assert_matches_rebuild()
+
+    def test_cascade_deletes_skip_lesson_rollup_updates(self):
+        self.finish(self.student, self.lessons[:3])
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.courses[0].delete()
+        self.assertFalse(StudentModuleProgress.objects.filter(course_id=self.courses[0].id).exists())
+
+        with mock.patch('courses.services.CompletionRollupService.module_lessons_changed') as changed:
+            for callback in callbacks:
+                callback()
+        changed.assert_not_called()
+
+    def test_deleting_a_module_completes_courses_finished_without_it(self):
+        self.finish(self.student, self.lessons[:3])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.modules[1].delete()
+
+        self.assertTrue(Enrollment.objects.get(user=self.student, course=self.courses[0]).completed)
+        self.assert_matches_rebuild()
+
+    def assert_matches_rebuild(self):
+        incremental = self.snapshot()
+        call_command('rebuild_completion_rollups', stdout=StringIO())
+        self.assertEqual(self.snapshot(), incremental)
+
+
+class TeacherAnalyticsTests(CourseTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.course = self.create_course('Python')
+        self.other_course = Course.objects.create(
+            title='Other', description='', short_description='', price=0,
+            teacher=User.objects.create_user(username='other-teacher', email='ot@example.com', role=User.TEACHER)
+        )
+        module = Module.objects.create(course=self.course, title='Basics')
+        self.lessons = [Lesson.objects.create(module=module, title=f'Lesson {i}', description='...') for i in range(2)]
+
+        second = User.objects.create_user(username='second', email='second@example.com')
+        for student in (self.student, second):
+            Enrollment.objects.create(user=student, course=self.course, has_access=True)
+        with self.captureOnCommitCallbacks(execute=True):
+            for lesson in self.lessons:
+                StudentLessonProgressService.finish_lesson(self.student, lesson.id)
+        StudentLessonProgressService.start_lesson(second, self.lessons[0].id)
+
+        TestEnrollment.objects.create(
+            student=self.student, course=self.course, type=1, total_questions=10, correct_answers=4, finished=True
+        )
+        TestEnrollment.objects.create(
+            student=self.student, course=self.course, type=2, total_questions=10, correct_answers=9, finished=True
+        )
+        self.client.force_authenticate(self.teacher)
+
+    def test_dashboard_reads_only_aggregate_tables(self):
+        TeacherAnalyticsService.refresh()
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('teacher_analytics'))
+
+        self.assertEqual(response.status_code, 200)
+        for table in ('courses_enrollment', 'courses_studentlessonprogress', 'tests_testenrollment'):
+            self.assertFalse(any(table in query['sql'] for query in queries))
+
+        [course] = response.data['courses']
+        self.assertEqual(course['course'], self.course.id)
+        self.assertEqual((course['enrolled_count'], course['started_count'], course['completed_count']), (2, 2, 1))
+        self.assertEqual(course['pre_test'], {'count': 1, 'average': 40})
+        self.assertEqual(course['post_test'], {'count': 1, 'average': 90})
+        self.assertEqual(course['modules'][0]['completed_count'], 1)
+
+    def test_refresh_is_idempotent_per_day(self):
+        TeacherAnalyticsService.refresh()
+        TeacherAnalyticsService.refresh()
+
+        self.assertEqual(CourseDailyStats.objects.filter(course=self.course).count(), 1)
+
+    def test_students_are_forbidden(self):
+        self.client.force_authenticate(self.student)
+
+        self.assertEqual(self.client.get(reverse('teacher_analytics')).status_code, 403)
+
+
+class ProgressEventBufferTests(CourseTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.buffer_dir = tempfile.mkdtemp()
+        self.settings_override = override_settings(
+            PROGRESS_BUFFER_ENABLED=True, PROGRESS_BUFFER_PATH=f'{self.buffer_dir}/buffer.sqlite3'
+        )
+        self.settings_override.enable()
+        self.course = self.create_course('Python')
+        module = Module.objects.create(course=self.course, title='Basics')
+        self.lessons = [Lesson.objects.create(module=module, title=f'Lesson {i}', description='...') for i in range(3)]
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.buffer_dir, ignore_errors=True)
+
+    def test_requests_only_append_to_the_buffer(self):
+        with self.assertNumQueries(0):
+            response = self.client.post(reverse('start_lesson', args=[self.lessons[0].id]))
+        self.assertEqual(response.status_code, 202)
+
+        response = self.client.post(reverse('lesson_progress_events'), {'events': [
+            {'lesson': self.lessons[1].id, 'type': 'start'},
+            {'lesson': self.lessons[1].id, 'type': 'finish'},
+        ]}, format='json')
+        self.assertEqual([result['status'] for result in response.data['results']], ['queued', 'queued'])
+
+        self.assertFalse(StudentLessonProgress.objects.exists())
+        self.assertEqual(ProgressEventBuffer().pending(), 3)
+
+    def test_flush_applies_events_in_coalesced_batches(self):
+        self.client.post(reverse('start_lesson', args=[self.lessons[0].id]))
+        self.client.post(reverse('finish_lesson', args=[self.lessons[0].id]))
+        self.client.post(reverse('start_lesson', args=[self.lessons[1].id]))
+
+        call_command('flush_progress_buffer', batch_size=2, stdout=StringIO())
+
+        self.assertEqual(ProgressEventBuffer().pending(), 0)
+        first = StudentLessonProgress.objects.get(lesson=self.lessons[0])
+        self.assertIsNotNone(first.completed_date)
+        self.assertLessEqual(first.started_date, first.completed_date)
+        self.assertIsNone(StudentLessonProgress.objects.get(lesson=self.lessons[1]).completed_date)
+
+    def test_replaying_a_batch_is_idempotent(self):
+        buffer = ProgressEventBuffer()
+        events = [{'lesson': lesson.id, 'type': 'finish'} for lesson in self.lessons]
+        buffer.append(self.student, events)
+        with self.captureOnCommitCallbacks(execute=True):
+            buffer.drain()
+        dates = dict(StudentLessonProgress.objects.values_list('lesson_id', 'completed_date'))
+
+        # Simulate a worker that crashed after committing but before deleting the batch
+        buffer.append(self.student, events)
+        with self.captureOnCommitCallbacks(execute=True):
+            buffer.drain()
+
+        self.assertEqual(dict(StudentLessonProgress.objects.values_list('lesson_id', 'completed_date')), dates)
+        self.assertEqual(StudentModuleProgress.objects.get(student=self.student).completed_lessons, 3)
+
+    def test_flush_applies_all_students_in_one_upsert(self):
+        buffer = ProgressEventBuffer()
+        students = [
+            User.objects.create_user(username=f'student{i}', email=f'student{i}@example.com') for i in range(20)
+        ]
+        for student in students:
+            buffer.append(student, [{'lesson': self.lessons[0].id, 'type': 'start'}])
+
+        # Student lookup; savepoint, lesson lookup, one start upsert and the release
+        with self.assertNumQueries(5):
+            self.assertEqual(buffer.flush(), 20)
+
+        self.assertEqual(
+            set(StudentLessonProgress.objects.values_list('student_id', flat=True)),
+            {student.pk for student in students},
+        )
+
+    def test_rejected_events_are_moved_aside_without_blocking_the_queue(self):
+        apply_batches = StudentLessonProgressService.apply_batches
+        poisoned = self.lessons[1].id
+
+        def reject_poisoned(batches):
+            if any(event['lesson'] == poisoned for _, events in batches for event in events):
+                raise IntegrityError('insert or update violates foreign key constraint')
+            return apply_batches(batches)
+
+        classmate = User.objects.create_user(username='classmate', email='classmate@example.com')
+        buffer = ProgressEventBuffer()
+        buffer.append(self.student, [{'lesson': lesson.id, 'type': 'start'} for lesson in self.lessons])
+        buffer.append(classmate, [{'lesson': self.lessons[0].id, 'type': 'start'}])
+
+        with mock.patch.object(StudentLessonProgressService, 'apply_batches', side_effect=reject_poisoned):
+            self.assertEqual(buffer.flush(), 4)
+
+        self.assertEqual(buffer.pending(), 0)
+        self.assertEqual(buffer.failed(), 1)
+        self.assertEqual(
+            set(StudentLessonProgress.objects.values_list('student_id', 'lesson_id')),
+            {(self.student.pk, self.lessons[0].id), (self.student.pk, self.lessons[2].id),
+             (classmate.pk, self.lessons[0].id)},
+        )
+
+        buffer.append(self.student, [{'lesson': self.lessons[0].id, 'type': 'finish'}])
+        self.assertEqual(buffer.flush(), 1)
+
+    def test_buffer_file_is_set_up_once_per_process(self):
+        buffer = ProgressEventBuffer()
+        buffer.pending()
+
+        with mock.patch('courses.progress_buffer.os.makedirs') as makedirs:
+            ProgressEventBuffer().append(self.student, [{'lesson': self.lessons[0].id, 'type': 'start'}])
+
+        makedirs.assert_not_called()
+        self.assertEqual(buffer.pending(), 1)
+
+
+@mock.patch('courses.services.convert_docx_to_pdf', side_effect=lambda stream: BytesIO(b'%PDF-1.4 contract'))
+@mock.patch('courses.services.generate_contract', return_value=BytesIO(b'docx'))
+class ContractJobTests(CourseTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.course = self.create_course('Python')
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def test_registration_returns_job_without_rendering(self, generate, convert):
+        response = self.client.get(reverse('register_course', args=[self.course.id]))
+
+        self.assertEqual(response.status_code, 202)
+        generate.assert_not_called()
+        job = ContractJob.objects.get(id=response.data['job_id'])
+        self.assertEqual(job.status, ContractJob.PENDING)
+        self.assertTrue(response.data['status_url'].endswith(reverse('contract_job_status', args=[job.id])))
+
+        status_response = self.client.get(reverse('contract_job_status', args=[job.id]))
+        self.assertEqual(status_response.data['status'], ContractJob.PENDING)
+        self.assertIsNone(status_response.data['contract_url'])
+
+    def test_worker_generates_contract(self, generate, convert):
+        job_id = self.client.get(reverse('register_course', args=[self.course.id])).data['job_id']
+
+        call_command('run_contract_jobs', stdout=StringIO())
+
+        response = self.client.get(reverse('contract_job_status', args=[job_id]))
+        self.assertEqual(response.data['status'], ContractJob.DONE)
+        enrollment = Enrollment.objects.get(user=self.student, course=self.course)
+        self.assertTrue(response.data['contract_url'].endswith(enrollment.contract_file.url))
+        with enrollment.contract_file.open('rb') as f:
+            self.assertEqual(f.read(), b'%PDF-1.4 contract')
+
+    def test_finish_time_is_taken_after_the_conversion(self, generate, convert):
+        converted_at = []
+
+        def slow_conversion(stream):
+            time.sleep(0.01)
+            converted_at.append(timezone.now())
+            return BytesIO(b'%PDF-1.4 contract')
+
+        convert.side_effect = slow_conversion
+        self.client.get(reverse('register_course', args=[self.course.id]))
+
+        job, = ContractJobService.run_pending()
+
+        self.assertEqual(job.status, ContractJob.DONE)
+        self.assertLess(job.started_at, converted_at[0])
+        self.assertGreaterEqual(ContractJob.objects.get(id=job.id).finished_at, converted_at[0])
+
+    def test_failed_job_is_retried_then_given_up(self, generate, convert):
+        convert.side_effect = ConversionError('soffice crashed')
+        job_id = self.client.get(reverse('register_course', args=[self.course.id])).data['job_id']
+
+        delays = []
+        for attempt in range(1, 4):
+            processed = ContractJobService.run_pending()
+            self.assertEqual([job.attempts for job in processed], [attempt])
+            # A failed job waits out its backoff instead of being claimed again right away
+            self.assertEqual(ContractJobService.run_pending(), [])
+            job = ContractJob.objects.get(id=job_id)
+            delays.append(job.available_at - job.finished_at)
+            ContractJob.objects.filter(id=job_id).update(available_at=timezone.now())
+
+        self.assertEqual(delays[:2], [timedelta(seconds=30), timedelta(seconds=60)])
+        job = ContractJob.objects.get(id=job_id)
+        self.assertEqual((job.status, job.attempts), (ContractJob.FAILED, 3))
+        self.assertEqual(job.error, "Failed to generate contract PDF.")
+
+    def test_job_is_claimed_once(self, generate, convert):
+        self.client.get(reverse('register_course', args=[self.course.id]))
+
+        self.assertIsNotNone(ContractJobService.claim())
+        self.assertIsNone(ContractJobService.claim())
+
+    def test_stale_running_job_is_reclaimed(self, generate, convert):
+        job_id = self.client.get(reverse('register_course', args=[self.course.id])).data['job_id']
+        ContractJob.objects.filter(id=job_id).update(
+            status=ContractJob.RUNNING, attempts=1, started_at=timezone.now() - timedelta(hours=1)
+        )
+
+        self.assertEqual(ContractJobService.claim().id, job_id)
+
+    def test_status_is_private_to_the_student(self, generate, convert):
+        job_id = self.client.get(reverse('register_course', args=[self.course.id])).data['job_id']
+        self.client.force_authenticate(self.teacher)
+
+        response = self.client.get(reverse('contract_job_status', args=[job_id]))
+
+        self.assertEqual(response.status_code, 404)
+
+
+class StubListener:
+    def __init__(self, soffice, host, port, profile_dir, startup_timeout):
+        self.port = port
+        self.profile_dir = profile_dir
+        self.running = False
+        self.starts = 0
+        self.desktop = None
+        self.mode = 'ok'
+
+    def start(self):
+        self.running = True
+        self.starts += 1
+
+    def alive(self):
+        return self.running
+
+    def stop(self):
+        self.running = False
+
+    def restart(self):
+        self.stop()
+        self.start()
+
+    def ensure_running(self):
+        if not self.alive():
+            self.restart()
+
+    def convert(self, source_path, target_path, filter_data=None):
+        if self.mode == 'hang':
+            time.sleep(0.5)
+        elif self.mode == 'crash':
+            self.running = False
+            raise RuntimeError('bridge disposed')
+        with open(target_path, 'wb') as f:
+            f.write(b'%PDF-1.4 stub')
+
+
+class StubPoolConverter(SofficePoolConverter):
+    listener_class = StubListener
+
+
+class OfficeConverterTests(TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.source = f'{self.workdir}/contract.docx'
+        self.target = f'{self.workdir}/contract.pdf'
+        with open(self.source, 'wb') as f:
+            f.write(b'docx')
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    @override_settings(OFFICE_CONVERTER={'BACKEND': 'courses.converters.FakeConverter'})
+    def test_converter_is_built_from_settings(self):
+        converter = get_converter()
+
+        self.assertIsInstance(converter, FakeConverter)
+        self.assertIs(get_converter(), converter)
+        pdf = convert_docx_to_pdf(BytesIO(b'docx'))
+        self.assertTrue(pdf.read().startswith(b'%PDF'))
+        self.assertEqual(len(converter.conversions), 1)
+
+    def make_pool(self, **options):
+        pool = StubPoolConverter(profile_root=f'{self.workdir}/profiles', **options)
+        self.addCleanup(pool.close)
+        return pool
+
+    def test_listeners_start_warm(self):
+        pool = self.make_pool(size=3, base_port=2002)
+
+        self.assertEqual([listener.starts for listener in pool._listeners], [1, 1, 1])
+        self.assertEqual([listener.port for listener in pool._listeners], [2002, 2003, 2004])
+
+    def test_pools_use_os_assigned_ports_and_private_profiles(self):
+        first, second = self.make_pool(size=2), self.make_pool(size=2)
+        listeners = [
+            SofficeListener('soffice', '127.0.0.1', listener.port, listener.profile_dir, 1)
+            for listener in first._listeners + second._listeners
+        ]
+
+        with mock.patch('courses.converters.subprocess.Popen') as popen:
+            for listener in listeners:
+                listener.start()
+
+        self.assertEqual(len({listener.profile_dir for listener in listeners}), 4)
+        # No fixed port: each start binds whatever free port the OS hands out
+        self.assertTrue(all(listener.port for listener in listeners))
+        command = popen.call_args_list[0].args[0]
+        self.assertIn(f'port={listeners[0].port};', command[-1])
+
+        first.close()
+        self.assertFalse(any(os.path.exists(profile_dir) for profile_dir in first._profile_dirs))
+
+    def test_forked_process_builds_its_own_converter(self):
+        with override_settings(OFFICE_CONVERTER={'BACKEND': 'courses.converters.FakeConverter'}):
+            parent = get_converter()
+            with mock.patch('courses.converters.os.getpid', return_value=os.getpid() + 1):
+                self.assertIsNot(get_converter(), parent)
+
+    def test_crashed_listener_is_restarted(self):
+        pool = self.make_pool(size=1)
+        listener = pool._listeners[0]
+        listener.mode = 'crash'
+
+        with self.assertRaises(ConversionError):
+            pool.convert(self.source, self.target)
+        self.assertTrue(listener.alive())
+        self.assertEqual(listener.starts, 2)
+
+        listener.mode = 'ok'
+        pool.convert(self.source, self.target)
+        with open(self.target, 'rb') as f:
+            self.assertEqual(f.read(), b'%PDF-1.4 stub')
+
+    def test_hung_conversion_times_out(self):
+        pool = self.make_pool(size=1, timeout=0.05)
+        listener = pool._listeners[0]
+        listener.mode = 'hang'
+
+        with self.assertRaisesRegex(ConversionError, 'timed out'):
+            pool.convert(self.source, self.target)
+        self.assertEqual(listener.starts, 2)
+        # The listener goes back to the pool for the next conversion
+        self.assertEqual(pool._idle.qsize(), 1)
+
+    def test_unsupported_format_is_rejected(self):
+        with self.assertRaises(ConversionError):
+            self.make_pool(size=1).convert(f'{self.workdir}/notes.txt', self.target)
+
+
+@override_settings(OFFICE_CONVERTER={'BACKEND': 'courses.converters.FakeConverter', 'OPTIONS': {'delay': 0.02}})
+class ConcurrentRenderTests(TestCase):
+    def setUp(self):
+        self.temp_root = tempfile.mkdtemp()
+        self.tempdir_patch = mock.patch('tempfile.tempdir', self.temp_root)
+        self.tempdir_patch.start()
+
+    def tearDown(self):
+        self.tempdir_patch.stop()
+        shutil.rmtree(self.temp_root, ignore_errors=True)
+
+    def make_certificate_template(self):
+        presentation = Presentation()
+        slide = presentation.slides.add_slide(presentation.slide_layouts[6])
+        for placeholder in ('{{student_name}}', '{{date}}', '{{to_date}}'):
+            slide.shapes.add_textbox(0, 0, 100, 100).text_frame.text = placeholder
+        path = f'{self.temp_root}/certificate_template.pptx'
+        presentation.save(path)
+        return path
+
+    def test_parallel_contract_conversions_do_not_share_files(self):
+        documents = [f'contract {i}'.encode() for i in range(40)]
+
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            results = list(executor.map(lambda document: convert_docx_to_pdf(BytesIO(document)).read(), documents))
+
+        for document, pdf in zip(documents, results):
+            self.assertIn(hashlib.sha256(document).hexdigest().encode(), pdf)
+        self.assertEqual(os.listdir(self.temp_root), [])
+
+    @override_settings(CERTIFICATE_RENDERER='pptx')
+    def test_parallel_certificates_for_the_same_student(self):
+        template_path = self.make_certificate_template()
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(
+                lambda name: generate_certificate(name, template_path).read(), ['student', 'other'] * 10
+            ))
+
+        self.assertTrue(all(pdf.startswith(b'%PDF') for pdf in results))
+        self.assertEqual(len(get_converter().conversions), 20)
+        self.assertEqual(os.listdir(self.temp_root), ['certificate_template.pptx'])
+
+
+class TemplateRegistryTests(TestCase):
+    contract_context = {'contract_id': 7, 'day': 1, 'month': 'May', 'student_name': 'student', 'course_price': 100}
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.registry = TemplateRegistry()
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def test_relative_paths_resolve_from_base_dir(self):
+        cwd = os.getcwd()
+        os.chdir(self.workdir)
+        try:
+            entry = self.registry.get('courses/templates/contract.docx')
+        finally:
+            os.chdir(cwd)
+
+        self.assertEqual(entry.path, os.path.join(settings.BASE_DIR, 'courses', 'templates', 'contract.docx'))
+
+    def test_template_is_reloaded_when_file_changes(self):
+        path = f'{self.workdir}/template.docx'
+        with open(path, 'wb') as f:
+            f.write(b'first')
+
+        entry = self.registry.get(path)
+        self.assertIs(self.registry.get(path), entry)
+
+        with open(path, 'wb') as f:
+            f.write(b'second')
+        os.utime(path, ns=(time.time_ns(), entry.mtime_ns + 10 ** 9))
+
+        self.assertEqual(self.registry.get(path).data, b'second')
+
+    def test_each_render_gets_its_own_document(self):
+        first = self.registry.docx('courses/templates/contract.docx')
+        second = self.registry.docx('courses/templates/contract.docx')
+
+        first.render(self.contract_context)
+
+        self.assertIsNot(first.docx, second.docx)
+        self.assertFalse(second.is_rendered)
+
+    def test_cached_render_matches_plain_docxtpl(self):
+        plain = DocxTemplate(self.registry.resolve('courses/templates/contract.docx'))
+        plain.render(self.contract_context)
+
+        for _ in range(2):
+            cached = self.registry.docx('courses/templates/contract.docx')
+            cached.render(self.contract_context)
+            self.assertEqual(cached.docx.element.xml, plain.docx.element.xml)
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command('benchmark_templates', repeat=1, stdout=out)
+
+        self.assertIn('contract.docx', out.getvalue())
+
+
+class StoredDocumentTests(CourseTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        course = self.create_course('Python')
+        self.enrollments = [
+            Enrollment.objects.create(user=user, course=course) for user in (self.student, self.teacher)
+        ]
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def age(self, name, days=2):
+        past = (timezone.now() - timedelta(days=days)).timestamp()
+        os.utime(default_storage.path(name), (past, past))
+        StoredDocument.objects.filter(name=name).update(last_stored_at=timezone.now() - timedelta(days=days))
+
+    def test_identical_documents_are_stored_once(self):
+        first = attach_document(self.enrollments[0], 'contract_file', b'%PDF same')
+        second = attach_document(self.enrollments[1], 'contract_file', b'%PDF same')
+
+        self.assertEqual(first, second)
+        self.assertEqual(first, f"documents/{first.split('/')[1]}/{hashlib.sha256(b'%PDF same').hexdigest()}.pdf")
+        self.assertEqual(default_storage.listdir(os.path.dirname(first))[1], [os.path.basename(first)])
+        self.assertEqual(StoredDocument.objects.get().size, len(b'%PDF same'))
+
+    def test_pdfs_differing_only_in_render_metadata_are_stored_once(self):
+        def office_pdf(created, document_id):
+            return (
+                b"%PDF-1.4\n1 0 obj\n<</Producer(LibreOffice 7.6)/CreationDate(D:" + created + b"+02'00')>>\nendobj\n"
+                b"trailer\n<</Size 2/Info 1 0 R/ID [ <" + document_id + b"> <" + document_id + b"> ]>>\n%%EOF\n"
+            )
+        first_render = office_pdf(b'20261016101500', b'3F2A' * 8)
+        second_render = office_pdf(b'20261016101501', b'9C07' * 8)
+
+        first = store_document(first_render)
+        second = store_document(second_render)
+
+        self.assertEqual(first, second)
+        stored = StoredDocument.objects.get()
+        # Same-length replacements keep the xref offsets valid
+        self.assertEqual(stored.size, len(first_render))
+        with default_storage.open(first, 'rb') as f:
+            content = f.read()
+        self.assertIn(b'/CreationDate(D:19700101000000Z)', content)
+        self.assertIn(b'<' + b'0' * 32 + b'>', content)
+
+    def test_gc_deletes_only_unreferenced_old_documents(self):
+        kept = attach_document(self.enrollments[0], 'contract_file', b'%PDF kept')
+        replaced = attach_document(self.enrollments[1], 'contract_file', b'%PDF old')
+        attach_document(self.enrollments[1], 'contract_file', b'%PDF new')
+        recent = store_document(b'%PDF just stored')
+        for name in (kept, replaced):
+            self.age(name)
+
+        out = StringIO()
+        call_command('gc_documents', stdout=out)
+
+        self.assertIn("Deleted 1 unreferenced documents.", out.getvalue())
+        self.assertFalse(default_storage.exists(replaced))
+        self.assertFalse(StoredDocument.objects.filter(name=replaced).exists())
+        self.assertTrue(default_storage.exists(kept))
+        self.assertTrue(default_storage.exists(recent))
+
+    def test_gc_collects_files_without_index_row(self):
+        name = store_document(b'%PDF orphan')
+        StoredDocument.objects.all().delete()
+        self.age(name)
+
+        call_command('gc_documents', dry_run=True, stdout=StringIO())
+        self.assertTrue(default_storage.exists(name))
+
+        call_command('gc_documents', stdout=StringIO())
+        self.assertFalse(default_storage.exists(name))
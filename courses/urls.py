@@ -1,16 +1,19 @@
 from django.urls import path
 from .views import (
-    CourseListView, CoursesAllListView, CourseDetailView,
+    ContractJobStatusView, CourseListView, CourseSearchView, CoursesAllListView, CourseDetailView, CourseOutlineView,
     ModuleListByCourseView, AllModuleListByCourseView, ModuleDetailView,
-    LessonListByModuleView, RegisterCourseView, StatsView, 
-    LessonDetailView, StudentLessonStartView, StudentLessonFinishView,
+    LessonListByModuleView, RegisterCourseView, StatsView, TeacherAnalyticsView,
+    LessonDetailView, LessonFileView, LessonProgressEventsView, LessonProgressSnapshotView,
+    StudentLessonStartView, StudentLessonFinishView,
     ChatListView, SendMessageView
 )
 
 urlpatterns = [
     path('', CourseListView.as_view(), name='course_list'),
+    path('search/', CourseSearchView.as_view(), name='course_search'),
     path('all/', CoursesAllListView.as_view(), name='courses_all'),
     path('<int:id>/', CourseDetailView.as_view(), name='course_detail'),
+    path('<int:id>/outline/', CourseOutlineView.as_view(), name='course_outline'),
 
     path('modules/', ModuleListByCourseView.as_view(), name='module_list_by_course'),
     path('modules-all/', AllModuleListByCourseView.as_view(), name='all_module_list_by_course'),
@@ -20,10 +23,15 @@ urlpatterns = [
     path('modules/<int:module_id>/send-message/', SendMessageView.as_view(), name='send_message'),
 
     path('register/<int:course_id>/', RegisterCourseView.as_view(), name='register_course'),
+    path('contracts/jobs/<int:id>/', ContractJobStatusView.as_view(), name='contract_job_status'),
     path('stats/', StatsView.as_view(), name='stats'),
+    path('teacher/analytics/', TeacherAnalyticsView.as_view(), name='teacher_analytics'),
     
     path('lessons/', LessonListByModuleView.as_view(), name='lesson_list_by_module'),
     path('lessons/<int:id>/', LessonDetailView.as_view(), name='lesson_detail'),
+    path('lessons/<int:id>/<str:field>/', LessonFileView.as_view(), name='lesson_file'),
+    path('lessons/progress/', LessonProgressSnapshotView.as_view(), name='lesson_progress_snapshot'),
+    path('lessons/progress/events/', LessonProgressEventsView.as_view(), name='lesson_progress_events'),
     path('lessons/start/<int:lesson_id>/', StudentLessonStartView.as_view(), name='start_lesson'),
     path('lessons/finish/<int:lesson_id>/', StudentLessonFinishView.as_view(), name='finish_lesson'),
 ]
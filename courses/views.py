@@ -1,32 +1,45 @@
 from django.http import Http404
 from django.conf import settings
-from django.db.models import Q
-from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
 from rest_framework import generics, status
+from rest_framework.exceptions import PermissionDenied
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
 from django.shortcuts import get_object_or_404
-from .models import ChatMessage, Course, Lesson, Module
+from django.urls import reverse
+from .cache import CatalogCacheMixin, ConditionalGetMixin
+from .media import serve_protected_file
+from .pagination import ChatCursorPagination
+from .permissions import IsTeacher
+from .progress_buffer import ProgressEventBuffer
+from .models import ChatMessage, ContractJob, Course, Enrollment, Lesson, Module
 from .serializers import (
-    ChatMessageSerializer, CourseDetailSerializer, CourseListSerializer, 
-    CourseWithAccessSerializer, LessonDetailSerializer, 
-    LessonSerializer, ModuleListSerializer, ModuleSummarySerializer
+    ChatMessageSerializer, ContractJobSerializer, CourseDetailSerializer, CourseListSerializer, CourseOutlineSerializer,
+    CourseSearchResultSerializer, CourseWithAccessSerializer, LessonDetailSerializer, 
+    LessonProgressEventSerializer, LessonSerializer, ModuleListSerializer, ModuleSummarySerializer
+)
+from .services import (
+    CourseOutlineService, CourseSearchService, EnrollmentService, LessonAccessService,
+    StudentLessonProgressService, StatsService, ChatService, TeacherAnalyticsService
 )
-from .services import ContractService, EnrollmentService, StudentLessonProgressService, StatsService, ChatService
 
 
 class CourseListView(generics.ListAPIView):
-    queryset = Course.objects.all().prefetch_related('modules')
+    queryset = Course.objects.all()
     serializer_class = CourseWithAccessSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
         title = self.request.query_params.get('title')
         price = self.request.query_params.get('price')
-        queryset = super().get_queryset()
+        queryset = super().get_queryset().annotate(
+            user_has_access=Exists(
+                Enrollment.objects.filter(course=OuterRef('pk'), user=self.request.user, has_access=True)
+            )
+        )
 
         if title:
             queryset = queryset.filter(title__icontains=title)
@@ -35,20 +48,45 @@ class CourseListView(generics.ListAPIView):
         return queryset
 
 
-class CoursesAllListView(generics.ListAPIView):
+class CourseSearchView(CourseListView):
+    serializer_class = CourseSearchResultSerializer
+
+    def get_queryset(self):
+        query = self.request.query_params.get('q', '')
+        return CourseSearchService.search(super().get_queryset(), query)
+
+
+class CoursesAllListView(CatalogCacheMixin, ConditionalGetMixin, generics.ListAPIView):
     queryset = Course.objects.all()
     serializer_class = CourseListSerializer
     permission_classes = [AllowAny]
 
 
-class CourseDetailView(generics.RetrieveAPIView):
+class CourseDetailView(CatalogCacheMixin, ConditionalGetMixin, generics.RetrieveAPIView):
     queryset = Course.objects.all().prefetch_related('modules')
     serializer_class = CourseDetailSerializer
     permission_classes = [IsAuthenticated]
     lookup_field = 'id'
 
 
-class ModuleListByCourseView(generics.ListAPIView):
+class CourseOutlineView(generics.RetrieveAPIView):
+    serializer_class = CourseOutlineSerializer
+    permission_classes = [IsAuthenticated]
+    lookup_field = 'id'
+
+    def include_descriptions(self):
+        return self.request.query_params.get('include_descriptions', '').lower() in ('1', 'true', 'yes')
+
+    def get_queryset(self):
+        return CourseOutlineService.get_queryset(self.request.user, self.include_descriptions())
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['include_descriptions'] = self.include_descriptions()
+        return context
+
+
+class ModuleListByCourseView(ConditionalGetMixin, generics.ListAPIView):
     serializer_class = ModuleListSerializer
     permission_classes = [IsAuthenticated]
 
@@ -59,7 +97,7 @@ class ModuleListByCourseView(generics.ListAPIView):
         return Module.objects.filter(course_id=course_id).select_related('course')
 
 
-class AllModuleListByCourseView(generics.ListAPIView):
+class AllModuleListByCourseView(ConditionalGetMixin, generics.ListAPIView):
     serializer_class = ModuleListSerializer
     permission_classes = [AllowAny]
 
@@ -70,14 +108,14 @@ class AllModuleListByCourseView(generics.ListAPIView):
         return Module.objects.filter(course_id=course_id).select_related('course')
 
 
-class ModuleDetailView(generics.RetrieveAPIView):
+class ModuleDetailView(ConditionalGetMixin, generics.RetrieveAPIView):
     queryset = Module.objects.all().select_related('course')
     serializer_class = ModuleSummarySerializer
     permission_classes = [IsAuthenticated]
     lookup_field = 'id'
 
 
-class LessonListByModuleView(generics.ListAPIView):
+class LessonListByModuleView(ConditionalGetMixin, generics.ListAPIView):
     serializer_class = LessonSerializer
     permission_classes = [IsAuthenticated]
 
@@ -92,18 +130,28 @@ class RegisterCourseView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, course_id):
-        enrollment, contract_filename = EnrollmentService.register_user_for_course(request.user, course_id)
+        enrollment, job, message = EnrollmentService.register_user_for_course(request.user, course_id)
 
-        if contract_filename:
-            contract_url = request.build_absolute_uri(f"{settings.MEDIA_URL}course_files/{contract_filename}")
+        if job:
             return Response({
                 "message": "Student registered successfully.",
-                "contract_url": contract_url
-            }, status=status.HTTP_200_OK)
+                "job_id": job.id,
+                "status": job.status,
+                "status_url": request.build_absolute_uri(reverse('contract_job_status', args=[job.id])),
+            }, status=status.HTTP_202_ACCEPTED)
 
         return Response({"message": "You are already registered for this course."}, status=status.HTTP_200_OK)
 
 
+class ContractJobStatusView(generics.RetrieveAPIView):
+    serializer_class = ContractJobSerializer
+    permission_classes = [IsAuthenticated]
+    lookup_field = 'id'
+
+    def get_queryset(self):
+        return ContractJob.objects.filter(enrollment__user=self.request.user).select_related('enrollment')
+
+
 class StatsView(APIView):
     permission_classes = [AllowAny]
 
@@ -112,30 +160,127 @@ class StatsView(APIView):
         return Response(stats)
 
 
-class LessonDetailView(generics.RetrieveAPIView):
+class TeacherAnalyticsView(APIView):
+    permission_classes = [IsTeacher]
+
+    def get(self, request, *args, **kwargs):
+        try:
+            days = min(int(request.query_params.get('days', 1)), 365)
+        except ValueError:
+            return Response({"error": "days must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(TeacherAnalyticsService.get_dashboard(request.user, days))
+
+
+class LessonDetailView(ConditionalGetMixin, generics.RetrieveAPIView):
     queryset = Lesson.objects.all().select_related('module')
     serializer_class = LessonDetailSerializer
     lookup_field = 'id'
 
 
+class LessonFileView(APIView):
+    permission_classes = [IsAuthenticated]
+    file_fields = ('pdf', 'presentation')
+
+    def perform_content_negotiation(self, request, force=False):
+        # PDF viewers send Accept headers no renderer matches; the body is never rendered anyway
+        return super().perform_content_negotiation(request, force=True)
+
+    def get(self, request, id, field):
+        if field not in self.file_fields:
+            raise Http404("Unknown lesson file.")
+
+        lesson = get_object_or_404(Lesson.objects.select_related('module__course'), id=id)
+        if not LessonAccessService.can_access(request.user, lesson):
+            raise PermissionDenied("You do not have access to this course.")
+
+        field_file = getattr(lesson, field)
+        if not field_file:
+            raise Http404("This lesson has no such file.")
+
+        return serve_protected_file(request, field_file)
+
+
+class LessonProgressSnapshotView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        module_id = request.query_params.get('module_id')
+        course_id = request.query_params.get('course_id')
+        if not module_id and not course_id:
+            return Response({"error": "module_id or course_id parameter is required."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            module_id = int(module_id) if module_id else None
+            course_id = int(course_id) if course_id else None
+        except ValueError:
+            return Response(
+                {"error": "module_id and course_id must be integers."}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        snapshot = StudentLessonProgressService.get_snapshot(request.user, module_id=module_id, course_id=course_id)
+        return Response(snapshot, status=status.HTTP_200_OK)
+
+
+class LessonProgressEventsView(APIView):
+    permission_classes = [IsAuthenticated]
+    max_events = 500
+
+    def post(self, request):
+        events = request.data.get('events')
+        if not isinstance(events, list) or not events:
+            return Response({"error": "A non-empty list of events is required."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(events) > self.max_events:
+            return Response(
+                {"error": f"At most {self.max_events} events can be sent at once."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        results = [None] * len(events)
+        valid_events, valid_positions = [], []
+        for position, event in enumerate(events):
+            serializer = LessonProgressEventSerializer(data=event)
+            if serializer.is_valid():
+                valid_events.append(serializer.validated_data)
+                valid_positions.append(position)
+            else:
+                results[position] = {"status": "invalid", "errors": serializer.errors}
+
+        if ProgressEventBuffer.enabled():
+            ProgressEventBuffer().append(request.user, valid_events)
+            for position in valid_positions:
+                results[position] = {"lesson": events[position].get('lesson'), "status": "queued"}
+            return Response({"results": results}, status=status.HTTP_202_ACCEPTED)
+
+        statuses = StudentLessonProgressService.apply_events(request.user, valid_events) if valid_events else []
+        for position, event_status in zip(valid_positions, statuses):
+            results[position] = {"lesson": events[position].get('lesson'), "status": event_status}
+
+        return Response({"results": results}, status=status.HTTP_200_OK)
+
+
 class StudentLessonStartView(APIView):
     permission_classes = [IsAuthenticated]
 
-    @transaction.atomic
     def post(self, request, lesson_id):
+        if ProgressEventBuffer.enabled():
+            ProgressEventBuffer().append(request.user, [{'lesson': lesson_id, 'type': 'start'}])
+            return Response({
+                "message": "Lesson start queued.",
+                "lesson": lesson_id,
+                "progress": "queued"
+            }, status=status.HTTP_202_ACCEPTED)
+
         try:
-            lesson = Lesson.objects.get(id=lesson_id)
-            progress = StudentLessonProgressService.start_lesson(request.user, lesson_id)
+            progress, lesson_title = StudentLessonProgressService.start_lesson(request.user, lesson_id)
             
             if progress is None:
                 return Response({
                     "message": "Lesson already started.",
-                    "lesson_title": lesson.title
+                    "lesson_title": lesson_title
                 }, status=status.HTTP_200_OK)
 
             return Response({
                 "message": "Lesson started successfully.",
-                "lesson_title": lesson.title,
+                "lesson_title": lesson_title,
                 "started_date": progress.started_date,
                 "progress": "in progress"
             }, status=status.HTTP_200_OK)
@@ -150,21 +295,27 @@ class StudentLessonStartView(APIView):
 class StudentLessonFinishView(APIView):
     permission_classes = [IsAuthenticated]
 
-    @transaction.atomic
     def post(self, request, lesson_id):
+        if ProgressEventBuffer.enabled():
+            ProgressEventBuffer().append(request.user, [{'lesson': lesson_id, 'type': 'finish'}])
+            return Response({
+                "message": "Lesson finish queued.",
+                "lesson": lesson_id,
+                "progress": "queued"
+            }, status=status.HTTP_202_ACCEPTED)
+
         try:
-            lesson = Lesson.objects.get(id=lesson_id)
-            progress = StudentLessonProgressService.finish_lesson(request.user, lesson_id)
+            progress, lesson_title = StudentLessonProgressService.finish_lesson(request.user, lesson_id)
             
             if progress is None:
                 return Response({
                     "message": "Lesson already completed.",
-                    "lesson_title": lesson.title
+                    "lesson_title": lesson_title
                 }, status=status.HTTP_200_OK)
 
             return Response({
                 "message": "Lesson completed successfully.",
-                "lesson_title": lesson.title,
+                "lesson_title": lesson_title,
                 "completed_date": progress.completed_date,
                 "progress": "completed"
             }, status=status.HTTP_200_OK)
@@ -219,17 +370,18 @@ class SendMessageView(generics.CreateAPIView):
 class ChatListView(generics.ListAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = ChatMessageSerializer
+    pagination_class = ChatCursorPagination
 
     def get_queryset(self):
         module_id = self.kwargs.get('module_id')
-        module = get_object_or_404(Module, id=module_id)
+        module = get_object_or_404(Module.objects.select_related('course'), id=module_id)
 
         second_user = self.request.query_params.get('student')
         if not second_user:
-            second_user = module.course.teacher
+            second_user = module.course.teacher_id
 
         return ChatMessage.objects.filter(
             module_id=module_id
         ).filter(
             Q(user=self.request.user) | Q(user=second_user)
-        ).select_related('module', 'user').order_by('date')
+        ).select_related('module', 'user', 'reply')
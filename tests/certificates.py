@@ -0,0 +1,224 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from functools import lru_cache
+from io import BytesIO
+
+from django.conf import settings
+from PIL import Image, ImageDraw, ImageFont
+from pptx import Presentation
+from pptx.enum.shapes import MSO_SHAPE_TYPE
+from pptx.enum.text import MSO_ANCHOR, PP_ALIGN
+
+from courses.converters import get_converter
+from courses.template_registry import template_registry
+
+EMU_PER_POINT = 12700
+DEFAULT_CERTIFICATE_RENDER_DPI = 300
+# Pillow stamps the current time into every PDF; a fixed one keeps equal certificates byte-identical
+PDF_TIMESTAMP = time.gmtime(0)
+
+# Font size in points and italic flag, matching what the PPTX renderer applies
+PLACEHOLDER_STYLES = {
+    '{{student_name}}': (32, False),
+    '{{date}}': (18, True),
+    '{{to_date}}': (14, True),
+}
+
+DEFAULT_CERTIFICATE_FONTS = {
+    'regular': ['times.ttf', 'Times New Roman.ttf', 'LiberationSerif-Regular.ttf', 'DejaVuSerif.ttf'],
+    'italic': ['timesi.ttf', 'Times New Roman Italic.ttf', 'LiberationSerif-Italic.ttf', 'DejaVuSerif-Italic.ttf'],
+}
+
+# Text box of one placeholder shape; the geometry is in fractions of the slide size
+Placeholder = namedtuple('Placeholder', 'text left top width height size italic align anchor')
+CertificateLayout = namedtuple('CertificateLayout', 'background placeholders points_wide')
+
+
+class CertificateRenderError(Exception):
+    pass
+
+
+@lru_cache(maxsize=32)
+def _font(size, italic):
+    fonts = getattr(settings, 'CERTIFICATE_FONTS', DEFAULT_CERTIFICATE_FONTS)
+    for name in fonts['italic' if italic else 'regular']:
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            continue
+    return ImageFont.load_default(size=size)
+
+
+def _identity(left, top, width, height):
+    return left, top, width, height
+
+
+def _group_transform(group, outer):
+    """
+    Map boxes from a group's child coordinate space to the coordinates the group itself lives in.
+    """
+    xfrm = group._element.grpSpPr.xfrm
+    if xfrm is None or xfrm.chExt is None or not xfrm.chExt.cx or not xfrm.chExt.cy:
+        return outer
+    scale_x, scale_y = xfrm.ext.cx / xfrm.chExt.cx, xfrm.ext.cy / xfrm.chExt.cy
+
+    def transform(left, top, width, height):
+        return outer(
+            xfrm.off.x + (left - xfrm.chOff.x) * scale_x,
+            xfrm.off.y + (top - xfrm.chOff.y) * scale_y,
+            width * scale_x,
+            height * scale_y,
+        )
+    return transform
+
+
+def _text_shapes(shapes, transform=_identity):
+    """
+    Yield (shape, slide box) for every text shape, including those nested in groups.
+    """
+    for shape in shapes:
+        if shape.shape_type == MSO_SHAPE_TYPE.GROUP:
+            yield from _text_shapes(shape.shapes, _group_transform(shape, transform))
+        elif shape.has_text_frame:
+            yield shape, transform(shape.left, shape.top, shape.width, shape.height)
+
+
+def _read_placeholders(presentation):
+    # Only the first slide is exported as the background, so anything on later slides would be lost
+    if len(presentation.slides) != 1:
+        raise CertificateRenderError("The fast renderer only supports single-slide certificate templates.")
+
+    slide_width, slide_height = presentation.slide_width, presentation.slide_height
+    placeholders = []
+    for shape, (left, top, width, height) in _text_shapes(presentation.slides[0].shapes):
+        for token, (size, italic) in PLACEHOLDER_STYLES.items():
+            if token not in shape.text_frame.text:
+                continue
+            align = PP_ALIGN.CENTER if token == '{{student_name}}' else shape.text_frame.paragraphs[0].alignment
+            placeholders.append(Placeholder(
+                text=shape.text_frame.text,
+                left=left / slide_width,
+                top=top / slide_height,
+                width=width / slide_width,
+                height=height / slide_height,
+                size=size,
+                italic=italic,
+                align=align,
+                anchor=shape.text_frame.vertical_anchor,
+            ))
+            shape.text_frame.text = ''
+            break
+    return placeholders
+
+
+class FastCertificateRenderer:
+    """
+    Renders certificates without an office conversion per document.
+
+    The template is converted once, with its placeholders blanked out, into a background
+    image that is cached on disk (shared between processes) and in memory together with the
+    placeholder text boxes. Each certificate is then the background with the texts drawn
+    on top, saved by Pillow straight to PDF. The result is a raster PDF, exported at
+    CERTIFICATE_RENDER_DPI so that it prints sharply.
+    """
+    _layouts = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def get_layout(cls, template_path):
+        template = template_registry.get(template_path)
+        key = (template.path, template.mtime_ns, template.size)
+        layout = cls._layouts.get(key)
+        if layout is None:
+            with cls._lock:
+                layout = cls._layouts.get(key)
+                if layout is None:
+                    layout = cls._build_layout(template.data)
+                    cls._layouts = {k: v for k, v in cls._layouts.items() if k[0] != template.path}
+                    cls._layouts[key] = layout
+        return layout
+
+    @staticmethod
+    def _build_layout(template):
+        presentation = Presentation(BytesIO(template))
+        placeholders = _read_placeholders(presentation)
+        if not any('{{student_name}}' in placeholder.text for placeholder in placeholders):
+            raise CertificateRenderError("Certificate template has no {{student_name}} placeholder.")
+
+        dpi = getattr(settings, 'CERTIFICATE_RENDER_DPI', DEFAULT_CERTIFICATE_RENDER_DPI)
+        points_wide = presentation.slide_width / EMU_PER_POINT
+        points_high = presentation.slide_height / EMU_PER_POINT
+        # Without explicit pixel dimensions LibreOffice exports at screen resolution
+        filter_data = {'PixelWidth': round(points_wide / 72 * dpi), 'PixelHeight': round(points_high / 72 * dpi)}
+
+        cache_dir = getattr(settings, 'CERTIFICATE_RENDER_CACHE_DIR', None) or tempfile.gettempdir()
+        os.makedirs(cache_dir, exist_ok=True)
+        background_path = os.path.join(
+            cache_dir, f'certificate_{hashlib.sha256(template).hexdigest()}_{dpi}dpi.png'
+        )
+
+        if not os.path.exists(background_path):
+            # Work next to the cache so the final rename stays on one filesystem
+            with tempfile.TemporaryDirectory(prefix='render-', dir=cache_dir) as workspace:
+                blank_path = os.path.join(workspace, 'certificate.pptx')
+                image_path = os.path.join(workspace, 'certificate.png')
+                presentation.save(blank_path)
+                get_converter().convert(blank_path, image_path, filter_data)
+                # Publish atomically so concurrent workers never read a partial file
+                os.replace(image_path, background_path)
+
+        with Image.open(background_path) as image:
+            background = image.convert('RGB')
+        return CertificateLayout(background, placeholders, points_wide)
+
+    @classmethod
+    def render(cls, values, template_path):
+        """
+        ``values`` maps placeholder tokens to their text. Returns the PDF as a BytesIO.
+        """
+        layout = cls.get_layout(template_path)
+        image = layout.background.copy()
+        draw = ImageDraw.Draw(image)
+        pixels_per_point = image.width / layout.points_wide
+
+        for placeholder in layout.placeholders:
+            text = placeholder.text
+            for token, value in values.items():
+                text = text.replace(token, value)
+            font = _font(max(1, round(placeholder.size * pixels_per_point)), placeholder.italic)
+            cls._draw_text(draw, image.size, placeholder, text, font)
+
+        pdf_stream = BytesIO()
+        dpi = image.width / (layout.points_wide / 72)
+        image.save(pdf_stream, 'PDF', resolution=dpi, creationDate=PDF_TIMESTAMP, modDate=PDF_TIMESTAMP)
+        pdf_stream.seek(0)
+        return pdf_stream
+
+    @staticmethod
+    def _draw_text(draw, image_size, placeholder, text, font):
+        image_width, image_height = image_size
+        left, top = placeholder.left * image_width, placeholder.top * image_height
+        width, height = placeholder.width * image_width, placeholder.height * image_height
+
+        text_left, text_top, text_right, text_bottom = draw.multiline_textbbox((0, 0), text, font=font)
+        text_width, text_height = text_right - text_left, text_bottom - text_top
+
+        if placeholder.align == PP_ALIGN.CENTER:
+            x = left + (width - text_width) / 2
+        elif placeholder.align == PP_ALIGN.RIGHT:
+            x = left + width - text_width
+        else:
+            x = left
+        if placeholder.anchor == MSO_ANCHOR.MIDDLE:
+            y = top + (height - text_height) / 2
+        elif placeholder.anchor == MSO_ANCHOR.BOTTOM:
+            y = top + height - text_height
+        else:
+            y = top
+
+        align = {PP_ALIGN.CENTER: 'center', PP_ALIGN.RIGHT: 'right'}.get(placeholder.align, 'left')
+        draw.multiline_text((x - text_left, y - text_top), text, font=font, fill='black', align=align)
@@ -0,0 +1,65 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from tests.services import CertificateService
+
+
+def _generate(enrollment_id):
+    try:
+        return enrollment_id, CertificateService.generate_missing(enrollment_id), None
+    except Exception as e:
+        return enrollment_id, None, str(e)
+
+
+def _generate_in_thread(enrollment_id):
+    try:
+        return _generate(enrollment_id)
+    finally:
+        # Each worker thread opens its own connection
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = (
+        "Pre-generate certificates for finished test enrollments that don't have one yet. "
+        "Each certificate is saved on its own, so an interrupted run can simply be started again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=getattr(settings, 'CERTIFICATE_WORKERS', 2),
+            help="Number of worker threads; 1 renders in the main thread."
+        )
+        parser.add_argument('--limit', type=int, default=None, help="Stop after this many enrollments.")
+
+    def handle(self, *args, **options):
+        enrollment_ids = list(CertificateService.pending_ids()[:options['limit']])
+        if not enrollment_ids:
+            self.stdout.write("No certificates to generate.")
+            return
+
+        if options['workers'] <= 1:
+            results = map(_generate, enrollment_ids)
+            generated, failed = self._report(results)
+        else:
+            # Threads share this process's office converter pool, whose size bounds the soffice
+            # processes; separate worker processes would each start a pool of their own
+            with ThreadPoolExecutor(max_workers=options['workers'], thread_name_prefix='certificates') as executor:
+                futures = [executor.submit(_generate_in_thread, enrollment_id) for enrollment_id in enrollment_ids]
+                generated, failed = self._report(future.result() for future in as_completed(futures))
+
+        style = self.style.SUCCESS if not failed else self.style.WARNING
+        self.stdout.write(style(f"Generated {generated} certificates; {failed} failed."))
+
+    def _report(self, results):
+        generated = failed = 0
+        for enrollment_id, name, error in results:
+            if error:
+                failed += 1
+                self.stderr.write(f"Test enrollment {enrollment_id}: {error}")
+            elif name:
+                generated += 1
+        return generated, failed
@@ -0,0 +1,33 @@
+# Generated by Django 5.0.7 on 2026-10-16 23:20
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def backfill_versions(apps, schema_editor):
+    Model = apps.get_model('tests', 'TestQuestion')
+    for instance in Model.objects.exclude(image='').exclude(image__isnull=True).iterator():
+        digest = hashlib.sha256()
+        try:
+            for chunk in instance.image.chunks():
+                digest.update(chunk)
+        except (OSError, ValueError):
+            continue
+        Model.objects.filter(pk=instance.pk).update(image_version=digest.hexdigest()[:16])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tests', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='testquestion',
+            name='image_version',
+            field=models.CharField(blank=True, editable=False, max_length=16),
+        ),
+        migrations.RunPython(backfill_versions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-16 23:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tests', '0002_testquestion_image_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='testenrollment',
+            name='certificate_claimed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -37,6 +37,8 @@ class TestQuestion(models.Model):
     question_text = models.TextField()
     question_type = models.IntegerField(choices=TYPE_CHOICES, default=1)
     image = models.ImageField(blank=True, null=True, upload_to='test_question_images/')
+    # Content hash of ``image`` for its cache-busting URL, kept up to date by tests.signals
+    image_version = models.CharField(max_length=16, blank=True, editable=False)
 
     def clean(self):
         if not self.question_text and not self.image:
@@ -67,6 +69,8 @@ class TestEnrollment(models.Model):
     questions = models.ManyToManyField('TestQuestion', related_name='enrollments')
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='test_enrollments')
     certificate_file = models.FileField(blank=True, null=True, upload_to='course_certificate_files/')
+    # Set by the worker rendering the certificate, so no other worker renders it too
+    certificate_claimed_at = models.DateTimeField(null=True, blank=True, editable=False)
 
     def clean(self):
         if self.finished and not self.started_at:
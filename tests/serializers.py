@@ -1,35 +1,6 @@
 from rest_framework import serializers
 from .models import TestEnrollment, TestQuestion, TestAnswer, Feedback
-import base64
-from django.core.files.base import ContentFile
-from urllib.parse import urljoin
-from django.conf import settings
-from courses.serializers import CourseListSerializer
-
-
-class Base64ImageWithURLField(serializers.ImageField):
-    def to_representation(self, value):
-        if value:
-            try:
-                request = self.context.get('request')
-                full_url = urljoin(request.build_absolute_uri('/'), value.url) if request else f"{settings.MEDIA_URL}{value.name}"
-                return {
-                    "base64": f"data:image/{value.name.split('.')[-1]};base64,{base64.b64encode(value.read()).decode()}",
-                    "src": full_url
-                }
-            except Exception:
-                raise serializers.ValidationError("Error processing image.")
-        return None
-
-    def to_internal_value(self, data):
-        if isinstance(data, dict) and 'base64' in data:
-            try:
-                format, imgstr = data['base64'].split(';base64,')
-                ext = format.split('/')[-1]
-                data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
-            except (TypeError, ValueError):
-                raise serializers.ValidationError("Invalid base64 image format.")
-        return super().to_internal_value(data)
+from courses.serializers import Base64ImageWithURLField, CourseListSerializer
 
 
 class TestAnswerSerializer(serializers.ModelSerializer):
@@ -42,7 +13,7 @@ class TestAnswerSerializer(serializers.ModelSerializer):
 
 class TestQuestionDetailSerializer(serializers.ModelSerializer):
     answers = TestAnswerSerializer(many=True, required=False)
-    image = Base64ImageWithURLField(required=True)  # Base64 required as per request
+    image = Base64ImageWithURLField(mode='url', required=True)
 
     class Meta:
         model = TestQuestion
@@ -58,7 +29,7 @@ class TestEnrollmentDetailSerializer(serializers.ModelSerializer):
 
 
 class TestQuestionSerializer(serializers.ModelSerializer):
-    image = Base64ImageWithURLField(required=True)  # Base64 required
+    image = Base64ImageWithURLField(mode='url', required=True)
 
     class Meta:
         model = TestQuestion
@@ -1,28 +1,104 @@
 from .models import Course, StudentAnswer, TestAnswer, TestQuestion, TestEnrollment
 from django.shortcuts import get_object_or_404
 from rest_framework.exceptions import NotFound, ValidationError
-from django.db import transaction
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Prefetch, Q
+from django.utils import timezone
+from datetime import timedelta
+from courses.documents import attach_document
+from courses.template_registry import template_registry
 from .utils import generate_certificate
-from django.core.files.base import ContentFile
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 class CertificateService:
+    TEMPLATE_PATH = 'tests/templates/Sertifikat na\'muna.pptx'
+    _executor = None
+    _executor_lock = threading.Lock()
+
     @staticmethod
     def create_certificate(test_enrollment):
         if test_enrollment.certificate_file:
             return test_enrollment.certificate_file.name
 
-        template_path = 'tests/templates/Sertifikat na\'muna.pptx'
-        if not os.path.exists(template_path):
+        template_path = CertificateService.TEMPLATE_PATH
+        if not os.path.exists(template_registry.resolve(template_path)):
             raise ValidationError("Certificate template not found.")
 
         pdf_stream = generate_certificate(test_enrollment.student.username, template_path)
 
-        filename = f'certificate_{test_enrollment.id}.pdf'
-        test_enrollment.certificate_file.save(filename, ContentFile(pdf_stream.getvalue()))
-        test_enrollment.save()
+        return attach_document(test_enrollment, 'certificate_file', pdf_stream.getvalue())
+
+    @staticmethod
+    def claim(enrollment_id):
+        """
+        Atomically mark a finished enrollment without a certificate as being rendered. The
+        conditional UPDATE lets exactly one caller win; a claim older than
+        CERTIFICATE_CLAIM_STALE_AFTER seconds belongs to a worker that died and can be taken over.
+        Returns the claim time, or None if there is nothing to render or someone else is on it.
+        """
+        stale_after = getattr(settings, 'CERTIFICATE_CLAIM_STALE_AFTER', 10 * 60)
+        now = timezone.now()
+        claimed = TestEnrollment.objects.filter(
+            Q(certificate_file__isnull=True) | Q(certificate_file=''),
+            Q(certificate_claimed_at__isnull=True) | Q(certificate_claimed_at__lt=now - timedelta(seconds=stale_after)),
+            id=enrollment_id,
+            finished=True,
+        ).update(certificate_claimed_at=now)
+        return now if claimed else None
+
+    @staticmethod
+    def generate_missing(enrollment_id):
+        """
+        Create the certificate of a finished enrollment unless it already has one.
+        Safe to call repeatedly and from several processes: only the caller that claims the
+        enrollment renders it. Returns the file name, or None if there was nothing to do.
+        """
+        claimed_at = CertificateService.claim(enrollment_id)
+        if claimed_at is None:
+            return None
+        enrollment = TestEnrollment.objects.select_related('student').get(id=enrollment_id)
+        try:
+            CertificateService.create_certificate(enrollment)
+        except BaseException:
+            # Let the next run retry right away instead of waiting for the claim to go stale
+            TestEnrollment.objects.filter(id=enrollment_id, certificate_claimed_at=claimed_at).update(
+                certificate_claimed_at=None
+            )
+            raise
+        return enrollment.certificate_file.name
+
+    @staticmethod
+    def pending_ids():
+        return TestEnrollment.objects.filter(
+            finished=True
+        ).filter(
+            Q(certificate_file__isnull=True) | Q(certificate_file='')
+        ).order_by('id').values_list('id', flat=True)
 
-        return filename
+    @staticmethod
+    def schedule(enrollment_id):
+        """
+        Generate a certificate in a background thread so the submitting request doesn't wait for it.
+        """
+        with CertificateService._executor_lock:
+            if CertificateService._executor is None:
+                CertificateService._executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'CERTIFICATE_WORKERS', 2), thread_name_prefix='certificates'
+                )
+        return CertificateService._executor.submit(CertificateService._generate_in_background, enrollment_id)
+
+    @staticmethod
+    def _generate_in_background(enrollment_id):
+        try:
+            return CertificateService.generate_missing(enrollment_id)
+        except Exception as e:
+            print(f"Error generating certificate for test enrollment {enrollment_id}: {str(e)}")
+        finally:
+            # Each background thread opens its own connection
+            connection.close()
 
 
 class TestSubmissionService:
@@ -34,12 +110,15 @@ class TestSubmissionService:
         if enrollment.finished:
             raise ValidationError("Test has already been submitted.")
 
-        correct_answers_count = TestSubmissionService._process_answers(student, answers_data)
+        correct_answers_count = TestSubmissionService._process_answers(enrollment, student, answers_data)
 
         enrollment.correct_answers = correct_answers_count
         enrollment.finished = True
         enrollment.save()
 
+        if getattr(settings, 'CERTIFICATE_PREGENERATE_ON_SUBMIT', False):
+            transaction.on_commit(lambda: CertificateService.schedule(enrollment.id))
+
         return enrollment
 
     @staticmethod
@@ -47,36 +126,79 @@ class TestSubmissionService:
         return get_object_or_404(TestEnrollment.objects.select_for_update(), id=enrollment_id, student=student)
 
     @staticmethod
-    def _process_answers(student, answers_data):
+    def _process_answers(enrollment, student, answers_data):
         question_ids = [answer_data.get('question') for answer_data in answers_data]
 
-        correct_answers = TestAnswer.objects.filter(question_id__in=question_ids, correct_answer=True)
-        correct_answers_dict = {answer.question_id: answer.id for answer in correct_answers}
+        # One query validates every selected option and tells which ones are correct
+        options = {
+            answer_id: (question_id, correct)
+            for answer_id, question_id, correct in TestAnswer.objects.filter(
+                question_id__in=question_ids
+            ).values_list('id', 'question_id', 'correct_answer')
+        }
+        already_answered = set(
+            StudentAnswer.objects.filter(student=student, question_id__in=question_ids).values_list(
+                'question_id', flat=True
+            )
+        )
 
         correct_answers_count = 0
+        student_answers = []
         for answer_data in answers_data:
             question_id = answer_data.get('question')
             selected_option = answer_data.get('option')
 
-            if correct_answers_dict.get(question_id) == selected_option:
+            if question_id in already_answered:
+                raise ValidationError(f"Answer for question {question_id} already submitted.")
+            already_answered.add(question_id)
+
+            option_question_id, correct = options.get(selected_option, (None, False))
+            if option_question_id != question_id:
+                raise ValidationError(f"Option {selected_option} is not an answer to question {question_id}.")
+            if correct:
                 correct_answers_count += 1
 
-            TestSubmissionService._save_student_answer(student, question_id, selected_option)
+            student_answers.append(StudentAnswer(
+                answer_id=selected_option,
+                question_id=question_id,
+                student=student,
+                test_enrollment=enrollment
+            ))
+
+        try:
+            StudentAnswer.objects.bulk_create(student_answers)
+        except IntegrityError as e:
+            raise ValidationError(f"Error saving student answer: {str(e)}")
 
         return correct_answers_count
 
+
+class TestDeliveryService:
     @staticmethod
-    def _save_student_answer(student, question_id, selected_option):
-        if StudentAnswer.objects.filter(student=student, question_id=question_id).exists():
-            raise ValidationError(f"Answer for question {question_id} already submitted.")
-        try:
-            StudentAnswer.objects.create(
-                answer_id=selected_option,
-                question_id=question_id,
-                student=student
-            )
-        except Exception as e:
-            raise ValidationError(f"Error saving student answer: {str(e)}")
+    def start_test(enrollment_id, student):
+        """
+        Load a test enrollment with its questions and their answers, marking it started on first access.
+        """
+        enrollment = get_object_or_404(TestDeliveryService.delivery_queryset(), id=enrollment_id, student=student)
+        if enrollment.started_at is None:
+            now = timezone.now()
+            # Conditional so concurrent first requests can't move started_at
+            if TestEnrollment.objects.filter(id=enrollment.id, started_at__isnull=True).update(started_at=now):
+                enrollment.started_at = now
+            else:
+                enrollment.started_at = (
+                    TestEnrollment.objects.values_list('started_at', flat=True).get(id=enrollment.id)
+                )
+        return enrollment
+
+    @staticmethod
+    def delivery_queryset():
+        """
+        Everything TestEnrollmentDetailSerializer reads, in three queries regardless of the test size.
+        """
+        return TestEnrollment.objects.prefetch_related(
+            Prefetch('questions', queryset=TestQuestion.objects.prefetch_related('answers'))
+        )
 
 
 class TestGenerationService:
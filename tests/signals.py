@@ -0,0 +1,4 @@
+from courses.images import track_file_versions
+from .models import TestQuestion
+
+track_file_versions(TestQuestion, 'image')
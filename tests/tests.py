@@ -1,3 +1,511 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from pptx import Presentation
+from pptx.util import Inches
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient
+
+from courses.converters import get_converter
+from courses.documents import store_document
+from courses.media import serve_media
+from courses.models import Course, StoredDocument
+from .certificates import FastCertificateRenderer
+from .models import StudentAnswer, TestAnswer, TestEnrollment, TestQuestion
+from .serializers import TestEnrollmentDetailSerializer
+from .services import CertificateService, TestSubmissionService
+from .utils import generate_certificate
+
+User = get_user_model()
+
+
+class CertificateTestMixin:
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(
+            MEDIA_ROOT=self.media_root,
+            CERTIFICATE_RENDER_CACHE_DIR=f'{self.media_root}/cache',
+            OFFICE_CONVERTER={'BACKEND': 'courses.converters.FakeConverter'},
+        )
+        self.settings_override.enable()
+        self.template_path = self.make_template(f'{self.media_root}/template.pptx')
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def make_template(self, path, texts=('{{student_name}}', 'Issued {{date}}', 'Valid until {{to_date}}')):
+        presentation = Presentation()
+        slide = presentation.slides.add_slide(presentation.slide_layouts[6])
+        for i, text in enumerate(texts):
+            box = slide.shapes.add_textbox(Inches(1), Inches(1 + 2 * i), Inches(8), Inches(1))
+            box.text_frame.text = text
+        presentation.save(path)
+        return path
+
+
+class FastCertificateRendererTests(CertificateTestMixin, TestCase):
+    def test_template_is_converted_once(self):
+        for name in ['alice', 'bob', 'carol']:
+            pdf = generate_certificate(name, self.template_path)
+            self.assertTrue(pdf.read().startswith(b'%PDF'))
+
+        conversions = get_converter().conversions
+        self.assertEqual([source for source, _ in conversions], ['certificate.pptx'])
+
+    def test_placeholder_positions_are_read_from_template(self):
+        layout = FastCertificateRenderer.get_layout(self.template_path)
+
+        self.assertEqual(
+            [(placeholder.text, placeholder.size, placeholder.italic) for placeholder in layout.placeholders],
+            [('{{student_name}}', 32, False), ('Issued {{date}}', 18, True), ('Valid until {{to_date}}', 14, True)]
+        )
+        self.assertAlmostEqual(layout.placeholders[1].top, 3 / 7.5)
+        self.assertAlmostEqual(layout.placeholders[1].left, 0.1)
+
+    def test_background_is_rebuilt_when_template_changes(self):
+        generate_certificate('alice', self.template_path)
+        self.make_template(self.template_path, texts=('Awarded to {{student_name}}',))
+        os.utime(self.template_path, ns=(time.time_ns(), time.time_ns() + 10 ** 9))
+
+        layout = FastCertificateRenderer.get_layout(self.template_path)
+
+        self.assertEqual([placeholder.text for placeholder in layout.placeholders], ['Awarded to {{student_name}}'])
+        self.assertEqual(len(get_converter().conversions), 2)
+
+    @override_settings(CERTIFICATE_RENDER_DPI=300)
+    def test_background_is_exported_at_render_dpi(self):
+        layout = FastCertificateRenderer.get_layout(self.template_path)
+
+        # The default template slide is 10 x 7.5 inches
+        self.assertEqual(layout.background.size, (3000, 2250))
+        self.assertEqual(layout.points_wide, 720)
+
+    def test_placeholders_inside_groups_are_positioned_on_the_slide(self):
+        presentation = Presentation()
+        slide = presentation.slides.add_slide(presentation.slide_layouts[6])
+        group = slide.shapes.add_group_shape()
+        box = group.shapes.add_textbox(Inches(2), Inches(2), Inches(4), Inches(1))
+        box.text_frame.text = '{{student_name}}'
+        # The group shows its children at half size, moved one inch to the right
+        xfrm = group._element.grpSpPr.get_or_add_xfrm()
+        xfrm.off.x, xfrm.off.y = Inches(1), 0
+        xfrm.ext.cx, xfrm.ext.cy = Inches(5), Inches(3.75)
+        xfrm.chOff.x, xfrm.chOff.y = 0, 0
+        xfrm.chExt.cx, xfrm.chExt.cy = Inches(10), Inches(7.5)
+        presentation.save(self.template_path)
+
+        placeholder, = FastCertificateRenderer.get_layout(self.template_path).placeholders
+
+        self.assertEqual(placeholder.text, '{{student_name}}')
+        self.assertAlmostEqual(placeholder.left, 0.2)
+        self.assertAlmostEqual(placeholder.top, 1 / 7.5)
+        self.assertAlmostEqual(placeholder.width, 0.2)
+        self.assertAlmostEqual(placeholder.height, 0.5 / 7.5)
+
+    def test_multi_slide_template_falls_back_to_pptx_conversion(self):
+        presentation = Presentation(self.template_path)
+        presentation.slides.add_slide(presentation.slide_layouts[6])
+        presentation.save(self.template_path)
+
+        pdf = generate_certificate('alice', self.template_path)
+
+        self.assertTrue(pdf.read().startswith(b'%PDF'))
+        self.assertEqual([source for source, _ in get_converter().conversions], ['certificate.pptx'])
+
+    def test_renders_of_the_same_certificate_are_stored_once(self):
+        # Every call to the clock Pillow stamps PDFs with is a second later than the last
+        clock = iter(range(1_790_000_000, 1_800_000_000))
+        real_gmtime = time.gmtime
+
+        with mock.patch('time.gmtime', side_effect=lambda *args: real_gmtime(*args or (next(clock),))):
+            first = generate_certificate('alice', self.template_path).read()
+            second = generate_certificate('alice', self.template_path).read()
+
+        self.assertEqual(first, second)
+        self.assertEqual(store_document(first), store_document(second))
+        self.assertEqual(StoredDocument.objects.count(), 1)
+
+    def test_falls_back_to_pptx_conversion(self):
+        template_path = self.make_template(f'{self.media_root}/plain.pptx', texts=('No placeholders here',))
+
+        pdf = generate_certificate('alice', template_path)
+
+        self.assertTrue(pdf.read().startswith(b'%PDF'))
+        self.assertEqual(get_converter().conversions[0][0], 'certificate.pptx')
+        self.assertEqual(len(get_converter().conversions), 1)
+
+
+class CertificatePregenerationTests(CertificateTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.template_patch = mock.patch.object(CertificateService, 'TEMPLATE_PATH', self.template_path)
+        self.template_patch.start()
+
+        teacher = User.objects.create_user(
+            username='teacher', email='teacher@example.com', password='password', role=User.TEACHER
+        )
+        self.course = Course.objects.create(
+            title='Python', description='<p>Python</p>', short_description='Python', price=100, teacher=teacher
+        )
+
+    def tearDown(self):
+        self.template_patch.stop()
+        super().tearDown()
+
+    def create_enrollment(self, username, finished=True, test_type=1):
+        student, _ = User.objects.get_or_create(username=username, defaults={'email': f'{username}@example.com'})
+        return TestEnrollment.objects.create(
+            student=student, course=self.course, type=test_type, finished=finished,
+            started_at=timezone.now() if finished else None
+        )
+
+    def test_command_generates_missing_certificates_only(self):
+        finished = [self.create_enrollment(f'student{i}') for i in range(3)]
+        unfinished = self.create_enrollment('pending', finished=False)
+        done = self.create_enrollment('done')
+        done.certificate_file.save('existing.pdf', ContentFile(b'%PDF existing'))
+
+        out = StringIO()
+        call_command('generate_certificates', workers=1, stdout=out)
+
+        self.assertIn("Generated 3 certificates; 0 failed.", out.getvalue())
+        for enrollment in finished:
+            enrollment.refresh_from_db()
+            self.assertTrue(enrollment.certificate_file.name.startswith('documents/'))
+        unfinished.refresh_from_db()
+        self.assertFalse(unfinished.certificate_file)
+        done.refresh_from_db()
+        self.assertEqual(done.certificate_file.name, 'course_certificate_files/existing.pdf')
+        self.assertFalse(CertificateService.pending_ids().exists())
+
+    def test_workers_share_this_processs_converter(self):
+        for i in range(4):
+            self.create_enrollment(f'student{i}')
+        converters = set()
+
+        def generate_missing(enrollment_id):
+            converters.add(id(get_converter()))
+            return f'documents/{enrollment_id}.pdf'
+
+        with mock.patch.object(CertificateService, 'generate_missing', side_effect=generate_missing):
+            out = StringIO()
+            call_command('generate_certificates', workers=3, stdout=out)
+
+        self.assertIn("Generated 4 certificates; 0 failed.", out.getvalue())
+        self.assertEqual(converters, {id(get_converter())})
+
+    def test_rerun_after_crash_leaves_no_duplicates(self):
+        enrollment = self.create_enrollment('student')
+        # A previous run stored the PDF but died before saving the row
+        with mock.patch.object(TestEnrollment, 'save', side_effect=RuntimeError('worker killed')):
+            call_command('generate_certificates', workers=1, stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(StoredDocument.objects.count(), 1)
+
+        call_command('generate_certificates', workers=1, stdout=StringIO())
+
+        enrollment.refresh_from_db()
+        self.assertEqual(enrollment.certificate_file.name, StoredDocument.objects.get().name)
+        with enrollment.certificate_file.open('rb') as f:
+            self.assertTrue(f.read().startswith(b'%PDF'))
+
+    def test_enrollment_is_rendered_by_one_caller_only(self):
+        enrollment = self.create_enrollment('student')
+        create_certificate = CertificateService.create_certificate
+        overlapping = []
+
+        def render_while_hook_runs(test_enrollment):
+            # The post-submit hook reaches the same enrollment while this render is in progress
+            overlapping.append(CertificateService.generate_missing(test_enrollment.id))
+            return create_certificate(test_enrollment)
+
+        with mock.patch.object(CertificateService, 'create_certificate', side_effect=render_while_hook_runs) as render:
+            name = CertificateService.generate_missing(enrollment.id)
+
+        self.assertEqual(render.call_count, 1)
+        self.assertEqual(overlapping, [None])
+        enrollment.refresh_from_db()
+        self.assertEqual(enrollment.certificate_file.name, name)
+
+    def test_stale_claim_is_taken_over(self):
+        enrollment = self.create_enrollment('student')
+        self.assertIsNotNone(CertificateService.claim(enrollment.id))
+        self.assertIsNone(CertificateService.generate_missing(enrollment.id))
+
+        TestEnrollment.objects.filter(id=enrollment.id).update(
+            certificate_claimed_at=timezone.now() - timedelta(hours=1)
+        )
+
+        self.assertIsNotNone(CertificateService.generate_missing(enrollment.id))
+
+    def test_failures_are_reported_and_left_pending(self):
+        enrollment = self.create_enrollment('student')
+        err = StringIO()
+
+        with mock.patch.object(CertificateService, 'TEMPLATE_PATH', f'{self.media_root}/missing.pptx'):
+            call_command('generate_certificates', workers=1, stdout=StringIO(), stderr=err)
+
+        self.assertIn(f"Test enrollment {enrollment.id}", err.getvalue())
+        self.assertEqual(list(CertificateService.pending_ids()), [enrollment.id])
+
+    @override_settings(CERTIFICATE_PREGENERATE_ON_SUBMIT=True)
+    def test_submit_schedules_certificate_after_commit(self):
+        enrollment = self.create_enrollment('student', finished=False)
+        question = TestQuestion.objects.create(course=self.course, question_text='2 + 2?')
+        answer = TestAnswer.objects.create(question=question, answer='4', correct_answer=True)
+        enrollment.questions.add(question)
+
+        with mock.patch.object(CertificateService, 'schedule') as schedule:
+            with self.captureOnCommitCallbacks(execute=True):
+                TestSubmissionService.submit_test(
+                    enrollment.id, enrollment.student, [{'question': question.id, 'option': answer.id}]
+                )
+
+        schedule.assert_called_once_with(enrollment.id)
+
+
+class TestSubmissionServiceTests(TestCase):
+    def setUp(self):
+        teacher = User.objects.create_user(
+            username='teacher', email='teacher@example.com', password='password', role=User.TEACHER
+        )
+        self.student = User.objects.create_user(username='student', email='student@example.com', password='password')
+        self.course = Course.objects.create(
+            title='Python', description='<p>Python</p>', short_description='Python', price=100, teacher=teacher
+        )
+
+    def create_test(self, question_count, test_type=1):
+        enrollment = TestEnrollment.objects.create(student=self.student, course=self.course, type=test_type)
+        answers = []
+        for i in range(question_count):
+            question = TestQuestion.objects.create(course=self.course, question_text=f'Question {i}')
+            right = TestAnswer.objects.create(question=question, answer='right', correct_answer=True)
+            wrong = TestAnswer.objects.create(question=question, answer='wrong')
+            enrollment.questions.add(question)
+            answers.append({'question': question.id, 'option': right.id if i % 2 == 0 else wrong.id})
+        return enrollment, answers
+
+    def submit(self, enrollment, answers):
+        return TestSubmissionService.submit_test(enrollment.id, self.student, answers)
+
+    def test_answers_are_saved_with_their_enrollment(self):
+        enrollment, answers = self.create_test(5)
+
+        self.submit(enrollment, answers)
+
+        enrollment.refresh_from_db()
+        self.assertTrue(enrollment.finished)
+        self.assertEqual(enrollment.correct_answers, 3)
+        self.assertEqual(
+            list(StudentAnswer.objects.order_by('question_id').values_list('test_enrollment_id', flat=True)),
+            [enrollment.id] * 5
+        )
+
+    def test_query_count_does_not_grow_with_question_count(self):
+        small, small_answers = self.create_test(5, test_type=1)
+        large, large_answers = self.create_test(50, test_type=2)
+
+        with CaptureQueriesContext(connection) as small_queries:
+            self.submit(small, small_answers)
+        with CaptureQueriesContext(connection) as large_queries:
+            self.submit(large, large_answers)
+
+        self.assertEqual(len(small_queries), len(large_queries))
+        self.assertLessEqual(len(large_queries), 8)
+
+    def test_previously_answered_question_is_rejected(self):
+        enrollment, answers = self.create_test(3)
+        question_id = answers[1]['question']
+        StudentAnswer.objects.create(student=self.student, question_id=question_id, answer_id=answers[1]['option'])
+
+        with self.assertRaisesMessage(ValidationError, f"Answer for question {question_id} already submitted."):
+            self.submit(enrollment, answers)
+        self.assertEqual(StudentAnswer.objects.count(), 1)
+
+    def test_duplicate_answer_in_submission_is_rejected(self):
+        enrollment, answers = self.create_test(2)
+
+        with self.assertRaises(ValidationError):
+            self.submit(enrollment, answers + answers[:1])
+        self.assertFalse(StudentAnswer.objects.exists())
+
+    def test_option_from_another_question_is_rejected(self):
+        enrollment, answers = self.create_test(2)
+        answers[0]['option'] = answers[1]['option']
+
+        with self.assertRaises(ValidationError):
+            self.submit(enrollment, answers)
+
+
+class QuestionImageRepresentationTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        cache.clear()
+
+        teacher = User.objects.create_user(
+            username='teacher', email='teacher@example.com', password='password', role=User.TEACHER
+        )
+        self.student = User.objects.create_user(username='student', email='student@example.com', password='password')
+        course = Course.objects.create(
+            title='Python', description='<p>Python</p>', short_description='Python', price=100, teacher=teacher
+        )
+        self.enrollment = TestEnrollment.objects.create(student=self.student, course=course, type=1)
+        image = BytesIO()
+        Image.new('RGB', (40, 30), 'red').save(image, 'PNG')
+        self.question = TestQuestion.objects.create(course=course, question_text='Which colour?')
+        self.question.image.save('colour.png', ContentFile(image.getvalue()))
+        self.enrollment.questions.add(self.question)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def image_representation(self, image_mode=None):
+        data = TestEnrollmentDetailSerializer(self.enrollment, context={'image_mode': image_mode}).data
+        return data['questions'][0]['image']
+
+    def test_test_delivery_sends_versioned_url_only(self):
+        with mock.patch('django.core.files.storage.FileSystemStorage.open') as storage_open, \
+                mock.patch('django.core.files.storage.FileSystemStorage.get_modified_time') as modified_time:
+            image = self.image_representation()
+
+        storage_open.assert_not_called()
+        modified_time.assert_not_called()
+        self.assertEqual(list(image), ['src'])
+        self.assertEqual(image['src'], f'/media/{self.question.image.name}?v={self.question.image_version}')
+        self.assertRegex(self.question.image_version, r'^[0-9a-f]{16}$')
+
+    def test_new_image_gets_a_new_version(self):
+        version = self.question.image_version
+        image = BytesIO()
+        Image.new('RGB', (40, 30), 'blue').save(image, 'PNG')
+
+        self.question.image.save('colour.png', ContentFile(image.getvalue()))
+
+        self.question.refresh_from_db()
+        self.assertNotEqual(self.question.image_version, version)
+        self.assertTrue(self.image_representation()['src'].endswith(f'?v={self.question.image_version}'))
+
+    def test_version_is_appended_to_urls_with_a_query_string(self):
+        signed = 'https://bucket.example.com/colour.png?X-Amz-Signature=abc'
+        with mock.patch('django.core.files.storage.FileSystemStorage.url', return_value=signed):
+            image = self.image_representation()
+
+        self.assertEqual(image['src'], f'{signed}&v={self.question.image_version}')
+
+    def test_base64_mode_inlines_image(self):
+        image = self.image_representation('base64')
+
+        self.assertTrue(image['base64'].startswith('data:image/png;base64,iVBOR'))
+
+    def test_cached_base64_mode_reads_file_once(self):
+        first = self.image_representation('cached_base64')
+        with mock.patch('django.core.files.storage.FileSystemStorage.open') as storage_open:
+            second = self.image_representation('cached_base64')
+
+        storage_open.assert_not_called()
+        self.assertEqual(first, second)
+        self.assertEqual(first['base64'], self.image_representation('base64')['base64'])
+
+    def test_view_rejects_unknown_image_mode(self):
+        client = APIClient()
+        client.force_authenticate(self.student)
+
+        response = client.get(reverse('start-test-enrollment'), {'test_id': self.enrollment.id, 'image_mode': 'raw'})
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_versioned_images_are_served_with_long_lived_cache_headers(self):
+        request = RequestFactory().get(f'/media/{self.question.image.name}', {'v': '1'})
+
+        response = serve_media(request, self.question.image.name, document_root=self.media_root)
+
+        self.assertIn('max-age=31536000', response['Cache-Control'])
+        self.assertIn('immutable', response['Cache-Control'])
+
+        unversioned = RequestFactory().get(f'/media/{self.question.image.name}')
+        response = serve_media(unversioned, self.question.image.name, document_root=self.media_root)
+        self.assertFalse(response.has_header('Cache-Control'))
+
+
+class StartTestEnrollmentViewTests(TestCase):
+    def setUp(self):
+        teacher = User.objects.create_user(
+            username='teacher', email='teacher@example.com', password='password', role=User.TEACHER
+        )
+        self.student = User.objects.create_user(username='student', email='student@example.com', password='password')
+        self.course = Course.objects.create(
+            title='Python', description='<p>Python</p>', short_description='Python', price=100, teacher=teacher
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def create_test(self, question_count, test_type=1):
+        enrollment = TestEnrollment.objects.create(
+            student=self.student, course=self.course, type=test_type, total_questions=question_count
+        )
+        questions = TestQuestion.objects.bulk_create(
+            TestQuestion(course=self.course, question_text=f'Question {i}') for i in range(question_count)
+        )
+        TestAnswer.objects.bulk_create(
+            TestAnswer(question=question, answer=answer, correct_answer=answer == 'right')
+            for question in questions for answer in ('right', 'wrong', 'other')
+        )
+        enrollment.questions.set(questions)
+        return enrollment
+
+    def start(self, enrollment):
+        return self.client.get(reverse('start-test-enrollment'), {'test_id': enrollment.id})
+
+    def test_hundred_question_test_is_delivered_in_fixed_number_of_queries(self):
+        enrollment = self.create_test(100)
+
+        # Enrollment, questions, answers and the started_at update
+        with self.assertNumQueries(4):
+            response = self.start(enrollment)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['questions']), 100)
+        self.assertTrue(all(len(question['answers']) == 3 for question in response.data['questions']))
+
+    def test_started_at_is_set_once(self):
+        enrollment = self.create_test(2)
+
+        first = self.start(enrollment)
+        with self.assertNumQueries(3):
+            second = self.start(enrollment)
+
+        enrollment.refresh_from_db()
+        self.assertIsNotNone(enrollment.started_at)
+        self.assertEqual(first.data['started_at'], second.data['started_at'])
+
+    def test_concurrent_start_keeps_first_started_at(self):
+        enrollment = self.create_test(1)
+        started_at = timezone.now() - timedelta(minutes=5)
+        stale = TestEnrollment.objects.get(id=enrollment.id)
+        TestEnrollment.objects.filter(id=enrollment.id).update(started_at=started_at)
+
+        # Simulate a request that loaded the enrollment before another one set started_at
+        with mock.patch('tests.services.get_object_or_404', return_value=stale):
+            self.start(enrollment)
+
+        enrollment.refresh_from_db()
+        self.assertEqual(enrollment.started_at, started_at)
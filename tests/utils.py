@@ -1,16 +1,32 @@
-import os
-import tempfile
-import subprocess
-from pptx import Presentation
 from pptx.util import Pt
 from pptx.enum.text import PP_ALIGN
 from datetime import datetime
 from io import BytesIO
+from django.conf import settings
+from courses.converters import ConversionError, convert_stream_to_pdf
+from courses.template_registry import template_registry
+from .certificates import CertificateRenderError, FastCertificateRenderer
 
-def generate_certificate(student_name, template_path):
-    prs = Presentation(template_path)
+def certificate_dates():
     today = datetime.now().strftime('%Y-%m-%d')
     to_date = (datetime.now().replace(year=datetime.now().year + 3)).strftime('%Y-%m-%d')
+    return today, to_date
+
+def generate_certificate(student_name, template_path):
+    if getattr(settings, 'CERTIFICATE_RENDERER', 'fast') == 'fast':
+        today, to_date = certificate_dates()
+        try:
+            return FastCertificateRenderer.render(
+                {'{{student_name}}': student_name, '{{date}}': today, '{{to_date}}': to_date}, template_path
+            )
+        except (CertificateRenderError, ConversionError) as e:
+            print(f"Fast certificate rendering failed, using the PPTX renderer: {str(e)}")
+
+    return generate_pptx_certificate(student_name, template_path)
+
+def generate_pptx_certificate(student_name, template_path):
+    prs = template_registry.presentation(template_path)
+    today, to_date = certificate_dates()
     
     for slide in prs.slides:
         for shape in slide.shapes:
@@ -37,28 +53,11 @@ def generate_certificate(student_name, template_path):
                         paragraph.font.size = Pt(14)
                         paragraph.font.italic = True
 
-    temp_pptx_path = os.path.join(tempfile.gettempdir(), f'temp_certificate_{student_name}.pptx')
-    prs.save(temp_pptx_path)
-
-    temp_pdf_path = os.path.join(tempfile.gettempdir(), f'certificate_{student_name}.pdf')
-    pdf_stream = convert_pptx_to_pdf(temp_pptx_path, temp_pdf_path)
-
-    cleanup_temp_files([temp_pptx_path, temp_pdf_path])
-
-    return pdf_stream
-
-def convert_pptx_to_pdf(pptx_path, pdf_path):
-    try:
-        command = ['python', 'C:\\scripts\\unoconv\\unoconv', '-f', 'pdf', '-o', pdf_path, pptx_path]
-        subprocess.run(command, check=True)
-
-        with open(pdf_path, 'rb') as pdf_file:
-            return BytesIO(pdf_file.read())
+    pptx_stream = BytesIO()
+    prs.save(pptx_stream)
+    pptx_stream.seek(0)
 
-    except subprocess.CalledProcessError as e:
-        raise RuntimeError(f"Error converting PPTX to PDF: {str(e)}")
+    return convert_pptx_to_pdf(pptx_stream)
 
-def cleanup_temp_files(file_paths):
-    for file_path in file_paths:
-        if os.path.exists(file_path):
-            os.remove(file_path)
+def convert_pptx_to_pdf(pptx_stream):
+    return convert_stream_to_pdf(pptx_stream, 'certificate.pptx')
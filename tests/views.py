@@ -1,4 +1,3 @@
-from datetime import timezone
 from django.http import FileResponse
 from rest_framework import generics, status
 from rest_framework.views import APIView
@@ -7,7 +6,9 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.exceptions import NotFound, ValidationError
 from django.shortcuts import get_object_or_404
 from courses.models import Course, Enrollment
-from tests.services import CertificateService, TestGenerationService, TestSubmissionService
+from courses.pagination import KeysetPagination
+from courses.serializers import IMAGE_REPRESENTATION_MODES
+from tests.services import CertificateService, TestDeliveryService, TestGenerationService, TestSubmissionService
 from .models import Feedback, TestEnrollment
 from .serializers import (
     FeedbackSerializer,
@@ -25,6 +26,7 @@ class RetrieveObjectMixin:
 class StudentResultsView(generics.ListAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = TestEnrollmentSerializer
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         return TestEnrollment.objects.filter(student=self.request.user)
@@ -52,7 +54,8 @@ class StudentResultsDetailView(RetrieveObjectMixin, generics.RetrieveAPIView):
     @staticmethod
     def _serve_certificate(instance):
         response = FileResponse(instance.certificate_file, content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename={instance.certificate_file.name}'
+        # Stored under a content hash; give the download a readable name
+        response['Content-Disposition'] = f'attachment; filename=certificate_{instance.id}.pdf'
         return response
 
 
@@ -77,6 +80,7 @@ class SubmitTestView(APIView):
 class FeedbackListView(generics.ListAPIView):
     queryset = Feedback.objects.all()
     serializer_class = FeedbackSerializer
+    pagination_class = KeysetPagination
 
 
 class GiveFeedbackView(generics.CreateAPIView):
@@ -102,13 +106,18 @@ class StartTestEnrollmentView(APIView):
         if not test_id:
             return Response({'error': 'Test ID is required.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        test_enrollment = get_object_or_404(TestEnrollment, id=test_id, student=request.user)
-
-        if not test_enrollment.started_at:
-            test_enrollment.started_at = timezone.now()
-            test_enrollment.save()
-
-        serializer = TestEnrollmentDetailSerializer(test_enrollment)
+        # Question images are sent as URLs unless the client asks for them inlined
+        image_mode = request.query_params.get('image_mode')
+        if image_mode and image_mode not in IMAGE_REPRESENTATION_MODES:
+            return Response(
+                {'error': f"image_mode must be one of: {', '.join(IMAGE_REPRESENTATION_MODES)}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        test_enrollment = TestDeliveryService.start_test(test_id, request.user)
+        serializer = TestEnrollmentDetailSerializer(
+            test_enrollment, context={'request': request, 'image_mode': image_mode}
+        )
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 